@@ -0,0 +1 @@
+"""Benchmarks against fakes of Dockhand and the Bot API: python -m bench.<name>"""
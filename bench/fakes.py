@@ -0,0 +1,240 @@
+"""Fake Dockhand and Telegram Bot API servers for load tests.
+
+Both listen on loopback in a child process (``FakeServers``), so the
+benchmarked process measures only the bot: its own RSS, CPU and event
+loop, talking real HTTP to both ends.
+
+- Dockhand serves ``/api/stacks``, ``/api/stacks/{name}`` and the
+  action POSTs for ``stacks`` stacks of ``containers`` containers each,
+  after ``latency`` seconds, failing a fraction ``error_rate`` of calls
+  with a 503. It counts calls per endpoint.
+- The Bot API (``base_url`` for PTB) answers every method after
+  ``latency`` seconds and records when each callback query was answered
+  and when each chat was sent a message.
+
+Times are ``time.monotonic()``, which on Linux and macOS is the same
+clock in every process.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Any
+
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+TOKEN = "1:bench"
+
+
+@dataclass(frozen=True)
+class FakeOptions:
+    stacks: int = 30
+    containers: int = 3
+    dockhand_latency: float = 0.02
+    error_rate: float = 0.0
+    telegram_latency: float = 0.02
+    seed: int = 0
+
+
+def stack_names(count: int) -> list[str]:
+    return [f"stack-{i:03d}" for i in range(count)]
+
+
+def callback_update(update_id: int, chat_id: int, data: str) -> dict[str, Any]:
+    """A button tap on a bot message; the callback query id is the
+    update id."""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(chat_id),
+            "chat_instance": str(chat_id),
+            "message": _message(1, chat_id, "stacks", bot=True),
+            "data": data,
+        },
+    }
+
+
+def command_update(update_id: int, chat_id: int, command: str) -> dict[str, Any]:
+    """``command`` (e.g. "/docker") typed in a private chat."""
+    message = _message(update_id, chat_id, command)
+    message["entities"] = [
+        {"type": "bot_command", "offset": 0, "length": len(command.split()[0])}
+    ]
+    return {"update_id": update_id, "message": message}
+
+
+def _user(user_id: int, bot: bool = False) -> dict[str, Any]:
+    return {"id": user_id, "is_bot": bot, "first_name": "bench"}
+
+
+def _message(
+    message_id: int, chat_id: int, text: str, bot: bool = False
+) -> dict[str, Any]:
+    return {
+        "message_id": message_id,
+        "date": 0,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": _user(1 if bot else chat_id, bot),
+        "text": text,
+    }
+
+
+class _Dockhand(RequestHandler):
+    def initialize(self, state: _State) -> None:
+        self.state = state
+
+    async def get(self, name: str | None = None, verb: str | None = None) -> None:
+        await self._answer("GET", name, verb)
+
+    async def post(self, name: str | None = None, verb: str | None = None) -> None:
+        await self._answer("POST", name, verb)
+
+    async def _answer(self, method: str, name: str | None, verb: str | None) -> None:
+        state = self.state
+        endpoint = "/api/stacks" + ("/{name}" if name else "")
+        endpoint += f"/{verb}" if verb else ""
+        state.calls[f"{method} {endpoint}"] += 1
+        await asyncio.sleep(state.options.dockhand_latency)
+        if state.rng.random() < state.options.error_rate:
+            state.errors += 1
+            self.set_status(503)
+            return
+        self.set_header("Content-Type", "application/json")
+        if name is None:
+            self.write(state.listing)
+        elif name not in state.entries:
+            self.set_status(404)
+        elif verb is None:
+            self.write(state.entries[name])
+
+
+class _BotAPI(RequestHandler):
+    def initialize(self, state: _State) -> None:
+        self.state = state
+
+    async def post(self, method: str) -> None:
+        state = self.state
+        params = {k: self.get_body_argument(k) for k in self.request.body_arguments}
+        result: object = True
+        if method == "getMe":
+            result = _user(1, bot=True) | {"username": "bench_bot"}
+        else:
+            await asyncio.sleep(state.options.telegram_latency)
+        now = time.monotonic()
+        if method == "answerCallbackQuery":
+            state.answered[params["callback_query_id"]] = now
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            if method == "sendMessage":
+                state.sent.setdefault(chat_id, []).append(now)
+            message_id = int(params.get("message_id", 1))
+            result = _message(message_id, chat_id, params.get("text", ""), bot=True)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({"ok": True, "result": result}))
+
+
+class _Stats(RequestHandler):
+    def initialize(self, state: _State) -> None:
+        self.state = state
+
+    def get(self) -> None:
+        state = self.state
+        self.write(
+            {
+                "calls": dict(state.calls),
+                "errors": state.errors,
+                "answered": state.answered,
+                "sent": {str(k): v for k, v in state.sent.items()},
+            }
+        )
+
+
+class _State:
+    def __init__(self, options: FakeOptions) -> None:
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.calls: Counter[str] = Counter()
+        self.errors = 0
+        self.answered: dict[str, float] = {}
+        self.sent: dict[int, list[float]] = {}
+        self.entries: dict[str, bytes] = {}
+        entries = []
+        for name in stack_names(options.stacks):
+            containers = [
+                {"name": f"{name}-{i}", "state": "running"}
+                for i in range(options.containers)
+            ]
+            entry = {"name": name, "status": "running", "containerDetails": containers}
+            self.entries[name] = json.dumps(entry).encode()
+            entries.append(entry)
+        self.listing = json.dumps(entries).encode()
+
+
+async def _serve(options: FakeOptions, conn: Connection) -> None:
+    state = _State(options)
+    kwargs = {"state": state}
+    dockhand = Application(
+        [
+            (r"/api/stacks/?", _Dockhand, kwargs),
+            (r"/api/stacks/([^/]+)", _Dockhand, kwargs),
+            (r"/api/stacks/([^/]+)/([a-z]+)", _Dockhand, kwargs),
+        ]
+    )
+    bot_api = Application(
+        [
+            (rf"/bot{TOKEN}/(\w+)", _BotAPI, kwargs),
+            (r"/_bench/stats", _Stats, kwargs),
+        ]
+    )
+    ports = []
+    for app in (dockhand, bot_api):
+        sockets = bind_sockets(0, "127.0.0.1")
+        HTTPServer(app).add_sockets(sockets)
+        ports.append(sockets[0].getsockname()[1])
+    conn.send(ports)
+    await asyncio.Event().wait()  # until terminated
+
+
+def _run(options: FakeOptions, conn: Connection) -> None:
+    logging.getLogger("tornado.access").disabled = True  # injected 503s
+    asyncio.run(_serve(options, conn))
+
+
+class FakeServers:
+    """Both fakes in a child process, for ``with FakeServers(...) as f``."""
+
+    def __init__(self, options: FakeOptions) -> None:
+        self.options = options
+        self.dockhand_url = ""
+        self.bot_api_url = ""  # PTB's base_url: the token is appended
+        self.stats_url = ""
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(
+            target=_run, args=(options, child), name="bench-fakes", daemon=True
+        )
+
+    def __enter__(self) -> FakeServers:
+        self._process.start()
+        if not self._conn.poll(30):
+            self._process.terminate()
+            raise RuntimeError("fake servers did not start")
+        dockhand, bot_api = self._conn.recv()
+        self.dockhand_url = f"http://127.0.0.1:{dockhand}"
+        self.bot_api_url = f"http://127.0.0.1:{bot_api}/bot"
+        self.stats_url = f"http://127.0.0.1:{bot_api}/_bench/stats"
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._process.terminate()
+        self._process.join(5)
@@ -0,0 +1,312 @@
+"""Throughput and latency of the real handler path under load.
+
+    uv run python -m bench.load --chats 50 --updates 20 --out run.json
+    uv run python -m bench.load --baseline run.json
+
+Runs the application from build_application against the fake Dockhand
+and Bot API servers of bench.fakes, over real HTTP. Each of ``--chats``
+chats sends ``--updates`` updates, ``--interval`` seconds apart on
+average: ``/docker`` commands, Restart taps and otherwise taps on a
+stack's detail view, in the proportions given. An update counts as
+answered when the fake Bot API receives its answerCallbackQuery, or
+for a command its reply.
+
+Prints one JSON document: updates/s, p50/p99 latency from queueing the
+update to its answer (overall and per kind), peak RSS and CPU time of
+this process, and Dockhand calls per update. ``--out`` also writes it
+to a file; ``--baseline`` compares with an earlier file, one line per
+figure on stderr.
+
+Telegram's flood limits are off unless ``--paced``: with them, sends
+and edits are capped at Telegram's rates and dominate the figures.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import logging
+import math
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+from telegram import Update
+
+from bench.fakes import (
+    TOKEN,
+    FakeOptions,
+    FakeServers,
+    callback_update,
+    command_update,
+    stack_names,
+)
+from bot.app import build_application
+from bot.config import Config
+from bot.dockhand import DockhandClient
+from bot.keyboards import Action, encode
+from bot.outbox import Outbox
+
+_KINDS = ("docker", "show", "restart")
+_POLL_EVERY = 0.05  # seconds between checks for the last answer
+
+
+def _workload(args: argparse.Namespace) -> list[list[tuple[str, dict[str, Any]]]]:
+    """Per chat, its updates in order as (kind, update JSON)."""
+    rng = random.Random(args.seed)
+    names = stack_names(args.stacks)
+    chats = []
+    for chat_id in range(1, args.chats + 1):
+        updates = []
+        for n in range(args.updates):
+            update_id = chat_id * 100_000 + n
+            roll = rng.random()
+            if roll < args.commands:
+                kind, data = "docker", command_update(update_id, chat_id, "/docker")
+            else:
+                restart = roll < args.commands + args.restarts
+                kind = "restart" if restart else "show"
+                action = Action.RESTART if restart else Action.SHOW
+                tapped = encode(action, rng.choice(names))
+                data = callback_update(update_id, chat_id, tapped)
+            updates.append((kind, data))
+        chats.append(updates)
+    return chats
+
+
+def _config(args: argparse.Namespace, dockhand_url: str) -> Config:
+    return Config.from_env(
+        {
+            "TELEGRAM_BOT_TOKEN": TOKEN,
+            "DOCKHAND_URL": dockhand_url,
+            "DOCKHAND_API_TOKEN": "bench",
+            "ALLOWED_CHAT_IDS": ",".join(str(c) for c in range(1, args.chats + 1)),
+            "ALLOWED_STACKS": ",".join(stack_names(args.stacks)),
+            "DOCKHAND_ENV": "1",
+            "STACK_CACHE_TTL": str(args.cache_ttl),
+            "UPDATE_WORKERS": str(args.workers),
+        }
+    )
+
+
+def _quantiles(latencies: list[float]) -> dict[str, float] | None:
+    if not latencies:
+        return None
+    ms = sorted(x * 1000 for x in latencies)
+    if len(ms) == 1:
+        ms *= 2  # quantiles needs two points
+    cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49], 2),
+        "p99": round(cuts[98], 2),
+        "max": round(ms[-1], 2),
+    }
+
+
+def _rss_peak_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def _run(args: argparse.Namespace, fakes: FakeServers) -> dict[str, Any]:
+    config = _config(args, fakes.dockhand_url)
+    client = DockhandClient(
+        config.dockhand_url, config.dockhand_api_token, config.dockhand_env
+    )
+    app = build_application(config, client, base_url=fakes.bot_api_url)
+    if not args.paced:
+        app.bot_data["outbox"] = Outbox(math.inf, math.inf, math.inf)
+    chats = _workload(args)
+    expected = sum(len(updates) for updates in chats)
+    queued: dict[tuple[int, int], float] = {}  # (chat, n) -> when
+    rng = random.Random(args.seed + 1)
+
+    async def chat(chat_id: int, updates: list[tuple[str, dict[str, Any]]]) -> None:
+        for n, (_, data) in enumerate(updates):
+            if args.interval:
+                await asyncio.sleep(rng.expovariate(1 / args.interval))
+            queued[chat_id, n] = time.monotonic()
+            await app.update_queue.put(Update.de_json(data, app.bot))
+
+    async with httpx.AsyncClient() as stats_http:
+
+        async def stats() -> dict[str, Any]:
+            resp = await stats_http.get(fakes.stats_url)
+            resp.raise_for_status()
+            return resp.json()
+
+        async with app:
+            await app.start()
+            cpu = _cpu_seconds()
+            started = time.monotonic()
+            await asyncio.gather(*(chat(i + 1, u) for i, u in enumerate(chats)))
+            async with asyncio.timeout(args.timeout):
+                while True:
+                    seen = await stats()
+                    done = len(seen["answered"]) + sum(map(len, seen["sent"].values()))
+                    if done >= expected:
+                        break
+                    await asyncio.sleep(_POLL_EVERY)
+            await app.bot_data["executor"].join()  # restarts still settling
+            cpu = _cpu_seconds() - cpu
+            await app.stop()
+            await app.bot_data["executor"].aclose()
+            await app.bot_data["outbox"].aclose()
+            await client.aclose()
+        seen = await stats()
+
+    latencies: dict[str, list[float]] = {kind: [] for kind in _KINDS}
+    finished = started
+    for chat_id, updates in enumerate(chats, 1):
+        replies = iter(seen["sent"].get(str(chat_id), ()))
+        for n, (kind, data) in enumerate(updates):
+            if kind == "docker":
+                # Each chat's updates run in order, and only /docker
+                # sends: its k-th message answers its k-th command.
+                answered = next(replies)
+            else:
+                answered = seen["answered"][data["callback_query"]["id"]]
+            latencies[kind].append(answered - queued[chat_id, n])
+            finished = max(finished, answered)
+    elapsed = finished - started
+    every = [x for kind in _KINDS for x in latencies[kind]]
+    calls = seen["calls"]
+    return {
+        "updates": expected,
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(expected / elapsed, 1),
+        "latency_ms": _quantiles(every),
+        "latency_ms_by_kind": {
+            kind: _quantiles(latencies[kind]) for kind in _KINDS if latencies[kind]
+        },
+        "dockhand_calls": dict(sorted(calls.items())),
+        "dockhand_calls_per_update": round(sum(calls.values()) / expected, 3),
+        "dockhand_errors_injected": seen["errors"],
+        "rss_peak_mb": _rss_peak_mb(),
+        "cpu_seconds": round(cpu, 3),
+    }
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _figures(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    """Numeric results flattened to dotted keys."""
+    flat: dict[str, float] = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat |= _figures(value, f"{prefix}{key}.")
+        elif isinstance(value, int | float):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    """One line per figure in both runs' results: old -> new (change)."""
+    old, new = _figures(baseline["results"]), _figures(current["results"])
+    keys = sorted(new.keys() & old.keys())
+    width = max(map(len, keys), default=0)
+    lines = []
+    for key in keys:
+        before, after = old[key], new[key]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        lines.append(f"{key:<{width}} {before:>10g} -> {after:>10g} ({change})")
+    if baseline["params"] != current["params"]:
+        lines.append("note: the runs used different parameters")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=20, help="per chat")
+    parser.add_argument(
+        "--interval", type=float, default=0.1, help="mean seconds between a "
+        "chat's updates; 0 queues them all at once"
+    )
+    parser.add_argument("--commands", type=float, default=0.2, help="share of /docker")
+    parser.add_argument("--restarts", type=float, default=0.05, help="share of Restart")
+    parser.add_argument("--stacks", type=int, default=30)
+    parser.add_argument("--containers", type=int, default=3, help="per stack")
+    parser.add_argument("--dockhand-latency", type=float, default=0.02)
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of Dockhand calls "
+        "answered 503"
+    )
+    parser.add_argument("--workers", type=int, default=8, help="UPDATE_WORKERS")
+    parser.add_argument("--cache-ttl", type=float, default=5.0, help="STACK_CACHE_TTL")
+    parser.add_argument("--paced", action="store_true", help="Telegram flood limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument(
+        "--log-level", default="CRITICAL", help="the bot's, e.g. ERROR to see "
+        "handler failures"
+    )
+    parser.add_argument("--out", type=Path, help="also write the JSON here")
+    parser.add_argument("--baseline", type=Path, help="earlier --out to compare")
+    args = parser.parse_args()
+    if args.commands + args.restarts > 1:
+        parser.error("--commands plus --restarts must be at most 1")
+    logging.basicConfig(level=args.log_level.upper())
+
+    options = FakeOptions(
+        stacks=args.stacks,
+        containers=args.containers,
+        dockhand_latency=args.dockhand_latency,
+        error_rate=args.error_rate,
+        telegram_latency=args.telegram_latency,
+        seed=args.seed,
+    )
+    with FakeServers(options) as fakes:
+        results = asyncio.run(_run(args, fakes))
+    params = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ("out", "baseline", "log_level")
+    }
+    report = {
+        "benchmark": "bench.load",
+        "at": dt.datetime.now(dt.UTC).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text + "\n")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        for line in compare(baseline, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Cold start time of the entrypoint's paths, each in fresh interpreters.
+
+    uv run python -m bench.startup --runs 10
+
+Times, from spawning the interpreter to its exit:
+- a bare interpreter, as the floor;
+- a misconfigured start, which must fail before any heavy import;
+- each stage's imports: the entrypoint, what --check-config adds, and
+  the full Telegram application.
+
+One line of median/min per case. ``--profile`` also prints the
+per-module breakdown of the full application import.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bot.startup import format_profile, profile_imports
+
+CASES = {
+    "interpreter": ["-c", "pass"],
+    "config error": ["-m", "bot.main"],
+    "import bot.main": ["-c", "import bot.main"],
+    "import bot.startup": ["-c", "import bot.startup"],
+    "import bot.app": ["-c", "import bot.app"],
+}
+
+
+def measure(args: list[str], runs: int) -> list[float]:
+    # No bot settings at all, so "config error" fails on the first check.
+    env = {k: v for k, v in os.environ.items() if k in ("PATH", "HOME")}
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], env=env, capture_output=True, check=False
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="per case")
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+    for name, case in CASES.items():
+        times = measure(case, args.runs)
+        print(
+            f"{name:<20} median={statistics.median(times) * 1000:7.1f}ms "
+            f"min={min(times) * 1000:7.1f}ms"
+        )
+    if args.profile:
+        print()
+        print(format_profile(profile_imports("bot.app"), "bot.app"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Tap-to-answer latency under many chats tapping at once.
+
+    uv run python -m bench.updates --chats 20 --taps 5 --workers 1,8
+
+Runs the real application from build_application against a fake
+Dockhand and a fake Bot API, each answering after a fixed latency, with
+the stack cache off so every tap reaches Dockhand. Every chat taps one
+stack's detail view ``--taps`` times; the latency is from putting the
+update on the queue to the fake Bot API receiving its
+answerCallbackQuery. One line of p50/p99 per worker count.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Any
+
+import httpx
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from bench.fakes import callback_update
+from bot.app import build_application
+from bot.config import Config
+from bot.dockhand import DockhandClient
+from bot.keyboards import Action, encode
+
+STACKS = ("media", "vpn", "nextcloud")
+
+
+class FakeBotAPI(BaseRequest):
+    """Answers every Bot API call after ``latency`` seconds and records
+    when each callback query was answered."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.answered: dict[str, float] = {}
+        self.everyone_answered = asyncio.Event()
+        self.expected = 0
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout: Any = None,
+        write_timeout: Any = None,
+        connect_timeout: Any = None,
+        pool_timeout: Any = None,
+    ) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        result: object = True
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "b"}
+        else:
+            await asyncio.sleep(self.latency)
+        if endpoint == "answerCallbackQuery" and request_data is not None:
+            params = request_data.parameters
+            self.answered[str(params["callback_query_id"])] = time.perf_counter()
+            if len(self.answered) >= self.expected:
+                self.everyone_answered.set()
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def fake_dockhand(latency: float) -> httpx.MockTransport:
+    def entry(name: str) -> dict[str, Any]:
+        container = {"name": f"{name}-app", "state": "running"}
+        return {"name": name, "status": "running", "containerDetails": [container]}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        path = request.url.path.removeprefix("/api/stacks").strip("/")
+        if path:
+            return httpx.Response(200, json=entry(path))
+        return httpx.Response(200, json=[entry(n) for n in STACKS])
+
+    return httpx.MockTransport(handle)
+
+
+def tap(update_id: int, chat_id: int, stack: str) -> dict[str, Any]:
+    return callback_update(update_id, chat_id, encode(Action.SHOW, stack))
+
+
+async def run(args: argparse.Namespace, workers: int) -> list[float]:
+    chat_ids = range(1, args.chats + 1)
+    config = Config.from_env(
+        {
+            "TELEGRAM_BOT_TOKEN": "1:bench",
+            "DOCKHAND_URL": "http://dockhand",
+            "DOCKHAND_API_TOKEN": "bench",
+            "ALLOWED_CHAT_IDS": ",".join(map(str, chat_ids)),
+            "ALLOWED_STACKS": ",".join(STACKS),
+            "DOCKHAND_ENV": "1",
+            "STACK_CACHE_TTL": "0",
+            "UPDATE_WORKERS": str(workers),
+        }
+    )
+    client = DockhandClient(
+        config.dockhand_url,
+        config.dockhand_api_token,
+        config.dockhand_env,
+        transport=fake_dockhand(args.dockhand_latency),
+    )
+    bot_api = FakeBotAPI(args.telegram_latency)
+    bot_api.expected = args.chats * args.taps
+    app = build_application(config, client, request=bot_api)
+    rng = random.Random(0)
+    queued: dict[str, float] = {}
+
+    async def chat(chat_id: int) -> None:
+        for n in range(args.taps):
+            await asyncio.sleep(rng.expovariate(1 / args.interval))
+            update_id = chat_id * 1000 + n
+            data = tap(update_id, chat_id, rng.choice(STACKS))
+            update = Update.de_json(data, app.bot)
+            queued[str(update_id)] = time.perf_counter()
+            await app.update_queue.put(update)
+
+    async with app:
+        await app.start()
+        await asyncio.gather(*(chat(c) for c in chat_ids))
+        await bot_api.everyone_answered.wait()
+        await app.stop()
+        await app.bot_data["executor"].aclose()
+        await app.bot_data["outbox"].aclose()
+        await client.aclose()
+    return [bot_api.answered[q] - queued[q] for q in queued]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--taps", type=int, default=5, help="per chat")
+    parser.add_argument(
+        "--interval", type=float, default=0.5, help="mean seconds between taps"
+    )
+    parser.add_argument("--workers", default="1,8", help="comma-separated counts")
+    parser.add_argument("--dockhand-latency", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    print(f"{args.chats} chats x {args.taps} taps")
+    for workers in (int(w) for w in args.workers.split(",")):
+        latencies = asyncio.run(run(args, workers))
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(
+            f"workers={workers:<3} p50={cuts[49] * 1000:7.1f}ms "
+            f"p99={cuts[98] * 1000:7.1f}ms max={max(latencies) * 1000:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
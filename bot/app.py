@@ -0,0 +1,352 @@
+"""The Telegram application: handlers, background tasks and serving.
+
+Imported by bot.main only once the configuration is valid, since the
+Telegram stack is most of the bot's startup time.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from collections.abc import Callable, Mapping
+
+from telegram import Update
+from telegram.ext import (
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    TypeHandler,
+)
+from telegram.request import BaseRequest
+from tornado.httpserver import HTTPServer
+
+from bot.auth import make_auth_gate
+from bot.breaker import CircuitBreaker
+from bot.cache import TTLCache
+from bot.config import Config, Webhook
+from bot.dockhand import DockhandClient
+from bot.events import StackEvents
+from bot.executor import ActionExecutor
+from bot.handlers import (
+    cmd_docker,
+    cmd_history,
+    cmd_logs,
+    cmd_ping,
+    cmd_schedule,
+    fetch_index,
+    fetch_snapshot,
+    on_callback,
+    on_error,
+    report_missed,
+    run_scheduled,
+)
+from bot.history import HistoryStore
+from bot.ingress import UpdateIngress
+from bot.keyboards import Allowlist
+from bot.metrics import REGISTRY
+from bot.outbox import Outbox
+from bot.poller import StackPoller
+from bot.render import RenderCache
+from bot.scheduler import Scheduler, ScheduleStore
+from bot.server import make_web_app
+from bot.stacks import Stack
+from bot.updates import ChatOrderedProcessor
+from bot.watcher import StatusWatcher
+
+log = logging.getLogger(__name__)
+
+_ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+
+async def _post_init(app: Application) -> None:
+    history: HistoryStore | None = app.bot_data.get("history")
+    if history is not None:
+        await history.start()
+    scheduler: Scheduler | None = app.bot_data.get("scheduler")
+    if scheduler is not None:
+        await scheduler.start()
+    poller: StackPoller | None = app.bot_data.get("poller")
+    if poller is not None:
+        poller.start()
+    events: StackEvents | None = app.bot_data.get("events")
+    if events is not None:
+        events.start()
+    config: Config = app.bot_data["config"]
+    if config.metrics_enabled and config.webhook is None:
+        server = HTTPServer(make_web_app(metrics=True))
+        server.listen(config.metrics_port)
+        app.bot_data["metrics_server"] = server
+        log.info("Metrics on :%d/metrics", config.metrics_port)
+
+
+async def _post_shutdown(app: Application) -> None:
+    server: HTTPServer | None = app.bot_data.get("metrics_server")
+    if server is not None:
+        server.stop()
+    poller: StackPoller | None = app.bot_data.get("poller")
+    if poller is not None:
+        await poller.stop()
+    events: StackEvents | None = app.bot_data.get("events")
+    if events is not None:
+        await events.stop()
+    watcher: StatusWatcher | None = app.bot_data.get("watcher")
+    if watcher is not None:
+        await watcher.aclose()
+    scheduler: Scheduler | None = app.bot_data.get("scheduler")
+    if scheduler is not None:
+        await scheduler.aclose()
+    await app.bot_data["executor"].aclose()
+    history: HistoryStore | None = app.bot_data.get("history")
+    if history is not None:
+        await history.aclose()
+    await app.bot_data["outbox"].aclose()
+    await app.bot_data["client"].aclose()
+
+
+def build_application(
+    config: Config,
+    client: DockhandClient,
+    *,
+    request: BaseRequest | None = None,
+    base_url: str | None = None,
+) -> Application:
+    """``request`` replaces PTB's HTTP transport to the Bot API, and
+    ``base_url`` its address (benchmarks)."""
+    updates = ChatOrderedProcessor(config.update_workers)
+    builder = (
+        Application.builder()
+        .token(config.telegram_bot_token)
+        .concurrent_updates(updates)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    if base_url is not None:
+        builder = builder.base_url(base_url)
+    app = builder.build()
+    app.bot_data["config"] = config
+    app.bot_data["client"] = client
+    app.bot_data["allowlist"] = Allowlist(config.stack_keys)
+    app.bot_data["cache"] = TTLCache(config.snapshot_ttl)
+    app.bot_data["stats"] = TTLCache(config.stats_cache_ttl)
+    app.bot_data["renders"] = RenderCache()
+    app.bot_data["outbox"] = outbox = Outbox()
+    app.bot_data["executor"] = ActionExecutor(client, config.action_timeout)
+    app.bot_data["follows"] = {}
+    if config.notify_changes:
+        app.bot_data["watcher"] = StatusWatcher(
+            app.bot, config.allowed_chat_ids, config.notify_debounce, outbox=outbox
+        )
+    history = None
+    if config.history_db:
+        app.bot_data["history"] = history = HistoryStore(
+            config.history_db, config.history_retention_days
+        )
+    if config.schedule_db:
+        app.bot_data["scheduler"] = _make_scheduler(app, config)
+    if config.webhook is not None:
+        app.bot_data["ingress"] = UpdateIngress(app, config.webhook.max_pending)
+    if config.dockhand_events:
+        app.bot_data["events"] = StackEvents(
+            client,
+            {"": config.allowed_stacks, **dict(config.extra_envs)},
+            lambda env: fetch_index(app.bot_data, env=env, fresh=True),
+            on_change=history.record_states if history is not None else None,
+        )
+    _register_sampled(app, updates)
+    if config.poll_interval:
+        app.bot_data["poller"] = StackPoller(
+            lambda: fetch_snapshot(app.bot_data, fresh=True),
+            config.poll_interval,
+            on_snapshot=_snapshot_listener(app),
+        )
+    # Group -1 runs before all default-group handlers, for every update type.
+    app.add_handler(
+        TypeHandler(Update, make_auth_gate(config.allowed_chat_ids)), group=-1
+    )
+    app.add_handler(CommandHandler("ping", cmd_ping))
+    app.add_handler(CommandHandler("docker", cmd_docker))
+    app.add_handler(CommandHandler("logs", cmd_logs))
+    app.add_handler(CommandHandler("history", cmd_history))
+    app.add_handler(CommandHandler("schedule", cmd_schedule))
+    app.add_handler(CallbackQueryHandler(on_callback))
+    app.add_error_handler(on_error)
+    return app
+
+
+def _make_scheduler(app: Application, config: Config) -> Scheduler:
+    """Due schedules run as executor jobs, so shutdown cancels them."""
+    executor: ActionExecutor = app.bot_data["executor"]
+    return Scheduler(
+        ScheduleStore(config.schedule_db),
+        on_due=lambda s: executor.spawn(
+            run_scheduled(app.bot_data, app.bot, s), name=f"schedule-{s.id}"
+        ),
+        on_missed=lambda s, late: executor.spawn(
+            report_missed(app.bot_data, app.bot, s, late)
+        ),
+        grace=config.schedule_misfire_grace,
+    )
+
+
+def _snapshot_listener(
+    app: Application,
+) -> Callable[[Mapping[str, Stack]], None] | None:
+    """What each polled snapshot goes to: change notifications, state
+    history, both or neither."""
+    listeners: list[Callable[[Mapping[str, Stack]], None]] = []
+    watcher: StatusWatcher | None = app.bot_data.get("watcher")
+    if watcher is not None:
+        listeners.append(watcher.observe)
+    history: HistoryStore | None = app.bot_data.get("history")
+    if history is not None:
+        listeners.append(history.record_states)
+    if len(listeners) <= 1:
+        return listeners[0] if listeners else None
+
+    def observe(snapshot: Mapping[str, Stack]) -> None:
+        for listener in listeners:
+            listener(snapshot)
+
+    return observe
+
+
+def _register_sampled(app: Application, updates: ChatOrderedProcessor) -> None:
+    """Expose counters kept by the cache and executor objects themselves."""
+    cache: TTLCache = app.bot_data["cache"]
+    stats: TTLCache = app.bot_data["stats"]
+    executor: ActionExecutor = app.bot_data["executor"]
+    renders: RenderCache = app.bot_data["renders"]
+    outbox: Outbox = app.bot_data["outbox"]
+    REGISTRY.sampled(
+        "tgops_stack_cache_requests_total",
+        "Stack snapshot cache lookups by outcome.",
+        "counter",
+        lambda: {
+            ("hit",): cache.hits,
+            ("miss",): cache.misses,
+            ("coalesced",): cache.coalesced,
+        },
+        ("result",),
+    )
+    REGISTRY.sampled(
+        "tgops_container_stats_cache_requests_total",
+        "Container stats cache lookups by outcome.",
+        "counter",
+        lambda: {
+            ("hit",): stats.hits,
+            ("miss",): stats.misses,
+            ("coalesced",): stats.coalesced,
+        },
+        ("result",),
+    )
+    REGISTRY.sampled(
+        "tgops_actions_coalesced_total",
+        "Stack actions that attached to an identical action in flight.",
+        "counter",
+        lambda: {(): executor.coalesced},
+    )
+    REGISTRY.sampled(
+        "tgops_render_cache_requests_total",
+        "Rendered-view cache lookups by outcome.",
+        "counter",
+        lambda: {("hit",): renders.hits, ("miss",): renders.misses},
+        ("result",),
+    )
+    REGISTRY.sampled(
+        "tgops_outbox_queued",
+        "Telegram calls waiting in the outbound queue.",
+        "gauge",
+        lambda: {(): outbox.depth()},
+    )
+    history: HistoryStore | None = app.bot_data.get("history")
+    if history is not None:
+        REGISTRY.sampled(
+            "tgops_history_queued",
+            "Audit/state history rows waiting for the writer thread.",
+            "gauge",
+            lambda: {(): history.depth()},
+        )
+    scheduler: Scheduler | None = app.bot_data.get("scheduler")
+    if scheduler is not None:
+        REGISTRY.sampled(
+            "tgops_schedules",
+            "Stored schedules.",
+            "gauge",
+            lambda: {(): len(scheduler)},
+        )
+    ingress: UpdateIngress | None = app.bot_data.get("ingress")
+    if ingress is not None:
+        REGISTRY.sampled(
+            "tgops_webhook_pending",
+            "Webhook updates admitted and not yet handled.",
+            "gauge",
+            lambda: {(): ingress.pending},
+        )
+    events: StackEvents | None = app.bot_data.get("events")
+    if events is not None:
+        REGISTRY.sampled(
+            "tgops_event_streams_live",
+            "Dockhand envs whose event stream is up and whose stacks are "
+            "served from it.",
+            "gauge",
+            lambda: {(): events.live},
+        )
+    REGISTRY.sampled(
+        "tgops_updates_in_progress",
+        "Updates being handled, by state (running, or waiting for their chat "
+        "or a worker).",
+        "gauge",
+        lambda: {("running",): updates.running, ("waiting",): updates.waiting()},
+        ("state",),
+    )
+
+
+async def _serve_webhook(app: Application, webhook: Webhook, metrics: bool) -> None:
+    """Webhook mode on our own server, so /metrics can share the port."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    server = HTTPServer(
+        make_web_app(app.bot_data["ingress"], webhook, metrics=metrics)
+    )
+    async with app:  # initialize() ... shutdown()
+        await _post_init(app)
+        await app.start()
+        server.listen(webhook.port, address="0.0.0.0")
+        log.info("Webhook mode: listening on :%d", webhook.port)
+        await app.bot.set_webhook(
+            webhook.url,
+            secret_token=webhook.secret,
+            allowed_updates=_ALLOWED_UPDATES,
+            drop_pending_updates=True,
+        )
+        try:
+            await stop.wait()
+        finally:
+            server.stop()
+            await app.stop()
+            await _post_shutdown(app)
+
+
+def run(config: Config) -> None:
+    """Serve until stopped, by polling or on the webhook."""
+    client = DockhandClient(
+        config.dockhand_url,
+        config.dockhand_api_token,
+        config.dockhand_env,
+        retries=config.dockhand_retries,
+        breaker=CircuitBreaker(config.breaker_threshold, config.breaker_cooldown),
+    )
+    app = build_application(config, client)
+    log.info(
+        "Bot starting: %d allowed chat(s), stacks: %s",
+        len(config.allowed_chat_ids),
+        ", ".join(config.stack_keys),
+    )
+    if config.webhook is None:
+        app.run_polling(allowed_updates=_ALLOWED_UPDATES, drop_pending_updates=True)
+    else:
+        asyncio.run(_serve_webhook(app, config.webhook, config.metrics_enabled))
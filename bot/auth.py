@@ -11,6 +11,8 @@ import logging
 from telegram import Update
 from telegram.ext import ApplicationHandlerStop, ContextTypes
 
+from bot.metrics import AUTH_DENIED
+
 log = logging.getLogger(__name__)
 
 
@@ -23,6 +25,7 @@ def make_auth_gate(allowed_chat_ids: frozenset[int]):
     async def gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if not is_authorized(update, allowed_chat_ids):
             chat = update.effective_chat
+            AUTH_DENIED.inc()
             log.warning("Denied update from chat_id=%s", chat.id if chat else "<none>")
             raise ApplicationHandlerStop
 
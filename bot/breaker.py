@@ -0,0 +1,105 @@
+"""Circuit breaker for Dockhand calls.
+
+After ``threshold`` failures in a row (unreachable, or a gateway error)
+the breaker opens: calls fail at once with a fixed "Dockhand down since
+HH:MM" instead of each waiting out a connect timeout against a dead
+host. While open, one background probe retries Dockhand, backing off
+with jitter; the breaker is half-open while a probe is in flight and
+closes on the first success, the probe's or any other call's.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from enum import StrEnum
+
+from bot.metrics import DOCKHAND_BREAKER_STATE, DOCKHAND_BREAKER_TRIPS
+
+log = logging.getLogger(__name__)
+
+
+class BreakerState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    JITTER = 0.1  # +/- fraction of each probe delay
+    MAX_COOLDOWN = 300.0  # seconds between probes, at most
+
+    def __init__(self, threshold: int = 5, cooldown: float = 10.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0  # in a row
+        self.message = ""  # why calls fail while open
+        self._probe: asyncio.Task[None] | None = None
+        self._set(BreakerState.CLOSED)
+
+    @property
+    def closed(self) -> bool:
+        return self.state is BreakerState.CLOSED
+
+    def success(self) -> None:
+        self.failures = 0
+        if self.closed:
+            return
+        log.info("Dockhand is reachable again; closing the circuit")
+        self._set(BreakerState.CLOSED)
+        if self._probe is not None and self._probe is not asyncio.current_task():
+            self._probe.cancel()
+        self._probe = None
+
+    def failure(self, probe: Callable[[], Awaitable[object]]) -> None:
+        """Count a failed call; at ``threshold`` open and start probing
+        with ``probe``, which raises while Dockhand is still down."""
+        self.failures += 1
+        if not self.closed or self.failures < self.threshold:
+            return
+        since = datetime.now()
+        self.message = f"Dockhand down since {since:%H:%M}"
+        log.warning(
+            "Dockhand failed %d times in a row; failing fast until a probe "
+            "succeeds",
+            self.failures,
+        )
+        DOCKHAND_BREAKER_TRIPS.inc()
+        self._set(BreakerState.OPEN)
+        self._probe = asyncio.create_task(self._run_probe(probe), name="dockhand-probe")
+
+    async def aclose(self) -> None:
+        if self._probe is None:
+            return
+        self._probe.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._probe
+        self._probe = None
+
+    def next_delay(self, attempt: int) -> float:
+        base = min(self.cooldown * 2**attempt, self.MAX_COOLDOWN)
+        return base * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    async def _run_probe(self, probe: Callable[[], Awaitable[object]]) -> None:
+        attempt = 0
+        while not self.closed:
+            await asyncio.sleep(self.next_delay(attempt))
+            if self.closed:  # another call got through meanwhile
+                return
+            self._set(BreakerState.HALF_OPEN)
+            try:
+                await probe()
+            except Exception as exc:
+                log.info("Dockhand probe failed: %s", exc)
+                self._set(BreakerState.OPEN)
+                attempt += 1
+            else:
+                self.success()
+
+    def _set(self, state: BreakerState) -> None:
+        self.state = state
+        for each in BreakerState:
+            DOCKHAND_BREAKER_STATE.set(int(each is state), state=each)
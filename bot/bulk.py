@@ -0,0 +1,83 @@
+"""Fan one stack action out over many stacks with bounded concurrency.
+
+Dependencies order the fan-out: a stack waits for those of its
+dependencies that are part of the same batch, and is skipped if one of
+them failed. For "stop" the order is reversed, so dependents go down
+before what they depend on.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+
+from bot.dockhand import DockhandError
+
+
+@dataclass(frozen=True)
+class BulkResult:
+    name: str
+    error: str | None = None
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def dependency_map(pairs: Iterable[tuple[str, str]]) -> dict[str, frozenset[str]]:
+    """(dependent, dependency) pairs -> dependent: its dependencies."""
+    deps: dict[str, set[str]] = {}
+    for dependent, dependency in pairs:
+        deps.setdefault(dependent, set()).add(dependency)
+    return {name: frozenset(d) for name, d in deps.items()}
+
+
+async def run_bulk(
+    names: Sequence[str],
+    action: Callable[[str], Awaitable[None]],
+    *,
+    concurrency: int,
+    dependencies: Mapping[str, frozenset[str]] | None = None,
+    reverse: bool = False,
+    on_result: Callable[[BulkResult], None] | None = None,
+) -> list[BulkResult]:
+    """Run ``action`` on every name; results come back in ``names`` order.
+
+    ``dependencies`` must be acyclic (Config validates this).
+    """
+    batch = set(names)
+    waits_for: dict[str, set[str]] = {name: set() for name in names}
+    for dependent, deps in (dependencies or {}).items():
+        for dependency in deps:
+            if dependent in batch and dependency in batch:
+                if reverse:
+                    waits_for[dependency].add(dependent)
+                else:
+                    waits_for[dependent].add(dependency)
+
+    done = {name: asyncio.Event() for name in names}
+    results: dict[str, BulkResult] = {}
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(name: str) -> None:
+        for other in waits_for[name]:
+            await done[other].wait()
+        failed = sorted(o for o in waits_for[name] if not results[o].ok)
+        if failed:
+            result = BulkResult(name, f"{', '.join(failed)} failed", skipped=True)
+        else:
+            async with slots:
+                try:
+                    await action(name)
+                except DockhandError as exc:
+                    result = BulkResult(name, str(exc))
+                else:
+                    result = BulkResult(name)
+        results[name] = result
+        done[name].set()
+        if on_result is not None:
+            on_result(result)
+
+    await asyncio.gather(*(one(name) for name in names))
+    return [results[name] for name in names]
@@ -0,0 +1,126 @@
+"""TTL cache with single-flight loading, and a bounded LRU map.
+
+Concurrent misses for the same key share one in-flight load instead of
+each calling Dockhand. ``force=True`` skips a fresh entry but still joins
+a load already in flight. A tuple key ``(scope, ...)`` belongs to
+``scope``: invalidating the scope drops it too. Expired entries are swept
+at most once per TTL, when an entry is stored, so keys that are never
+read again do not pile up.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+
+class TTLCache[K: Hashable, V]:
+    def __init__(
+        self, ttl: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: dict[K, tuple[float, V]] = {}
+        self._inflight: dict[K, asyncio.Task[V]] = {}
+        self._swept = clock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        """Entries held, fresh or not yet swept."""
+        return len(self._entries)
+
+    async def get(
+        self, key: K, load: Callable[[], Awaitable[V]], *, force: bool = False
+    ) -> V:
+        if not force and (entry := self._fresh(key)) is not None:
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, load))
+            # Retrieve the exception even if every waiter was cancelled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # shield: one cancelled caller must not cancel the shared load
+        return await asyncio.shield(task)
+
+    def peek(self, key: K) -> V | None:
+        """The fresh value for ``key``, or None; never loads."""
+        entry = self._fresh(key)
+        return None if entry is None else entry[1]
+
+    def _fresh(self, key: K) -> tuple[float, V] | None:
+        entry = self._entries.get(key)
+        if entry is None or self._clock() - entry[0] >= self.ttl:
+            return None
+        self.hits += 1
+        return entry
+
+    def invalidate(self, key: K) -> None:
+        """Drop ``key`` and every ``(key, ...)`` key (e.g. an env's
+        snapshot and its narrowed views)."""
+        scoped = [
+            k
+            for k in self._entries.keys() | self._inflight.keys()
+            if isinstance(k, tuple) and k and k[0] == key
+        ]
+        for k in (key, *scoped):
+            self._entries.pop(k, None)
+            self._inflight.pop(k, None)
+
+    async def _load(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        # invalidate() unregisters the load: one that started before an
+        # invalidation must not store its (possibly stale) result.
+        task = asyncio.current_task()
+        try:
+            value = await load()
+        finally:
+            current = self._inflight.get(key) is task
+            if current:
+                del self._inflight[key]
+        if current:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: K, value: V) -> None:
+        now = self._clock()
+        if now - self._swept >= self.ttl:
+            self._swept = now
+            for k, (at, _) in list(self._entries.items()):
+                if now - at >= self.ttl:
+                    del self._entries[k]
+        self._entries[key] = (now, value)
+
+
+class LRU[K: Hashable, V]:
+    """Mapping capped at ``maxsize`` entries; the least recently used
+    entry goes first."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return None
+        return self._entries[key]
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
@@ -8,9 +8,11 @@ from dataclasses import dataclass
 from enum import StrEnum
 from urllib.parse import urlsplit
 
-# Telegram callback_data is capped at 64 bytes; longest action prefix is
-# "restart|" (8 bytes), so stack names must fit in the remainder.
-_MAX_STACK_NAME_BYTES = 55
+from bot.stacks import ENV_SEP, stack_key
+
+_MAX_PAGE_SIZE = 90
+MAX_LOG_TAIL = 1000  # lines LOGS_TAIL and /logs may ask for
+_MAX_RETRIES = 10
 
 _REQUIRED = (
     "TELEGRAM_BOT_TOKEN",
@@ -43,6 +45,8 @@ class Webhook:
     url: str
     secret: str
     port: int = 5555
+    # Admitted updates not yet handled; further deliveries get a 503.
+    max_pending: int = 1000
 
     @property
     def path(self) -> str:
@@ -55,11 +59,79 @@ class Config:
     dockhand_url: str
     dockhand_api_token: str
     allowed_chat_ids: frozenset[int]
+    # Stacks of the default (first) Dockhand env, and that env's id
     allowed_stacks: tuple[str, ...]
     dockhand_env: str
     log_level: str
     # None selects polling mode; a Webhook selects webhook mode.
     webhook: Webhook | None = None
+    # Seconds a /api/stacks snapshot is reused; 0 still coalesces
+    # concurrent fetches but never serves a stored snapshot.
+    stack_cache_ttl: float = 5.0
+    # Seconds a container's resource stats are reused by its view.
+    stats_cache_ttl: float = 5.0
+    # Background polling (0 = off). While on, the snapshot TTL becomes
+    # poll_max_staleness: handlers fetch only if polling fell that far behind.
+    poll_interval: float = 0.0
+    poll_max_staleness: float = 0.0
+    # Follow Dockhand's event stream: while it is up, views read stack
+    # state kept current from it instead of fetching /api/stacks.
+    dockhand_events: bool = False
+    # Push status changes to allowed chats (needs polling); a change must
+    # hold this long before it is reported.
+    notify_changes: bool = False
+    notify_debounce: float = 60.0
+    # Bulk actions: parallel Dockhand calls, and (dependent, dependency)
+    # pairs that order them.
+    bulk_concurrency: int = 3
+    stack_dependencies: tuple[tuple[str, str], ...] = ()
+    # Stacks per /docker list page.
+    list_page_size: int = 10
+    # Updates handled at once; each chat's updates still run in order.
+    update_workers: int = 8
+    # Log lines /logs and the Logs button show by default, and how long
+    # a followed log keeps updating.
+    logs_tail: int = 100
+    logs_follow_seconds: float = 120.0
+    # Seconds an action may take to settle before it is reported as stuck.
+    action_timeout: float = 300.0
+    # /metrics: on the webhook port in webhook mode, else on metrics_port.
+    metrics_enabled: bool = False
+    metrics_port: int = 5555
+    # Further Dockhand envs as (env id, allowlist); listing fans out to all
+    # envs, each bounded by env_timeout seconds.
+    extra_envs: tuple[tuple[str, tuple[str, ...]], ...] = ()
+    env_timeout: float = 10.0
+    # Retries of a failed Dockhand call (GETs; POSTs only if never sent),
+    # and the circuit breaker: it opens after this many failures in a row
+    # and probes Dockhand, first after breaker_cooldown seconds.
+    dockhand_retries: int = 2
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 10.0
+    # SQLite file for the action audit log and state history ("" = off),
+    # and how many days of it are kept.
+    history_db: str = ""
+    history_retention_days: float = 90.0
+    # SQLite file for /schedule ("" = off), and how late a due run may
+    # still start; runs overdue by more (bot down) are reported missed.
+    schedule_db: str = ""
+    schedule_misfire_grace: float = 300.0
+
+    @property
+    def environments(self) -> dict[str, tuple[str, ...]]:
+        """Env id -> allowlist, default env first."""
+        return {self.dockhand_env: self.allowed_stacks, **dict(self.extra_envs)}
+
+    @property
+    def stack_keys(self) -> tuple[str, ...]:
+        """Every controllable stack as its callback key (see stack_key)."""
+        return self.allowed_stacks + tuple(
+            stack_key(name, env) for env, names in self.extra_envs for name in names
+        )
+
+    @property
+    def snapshot_ttl(self) -> float:
+        return self.poll_max_staleness if self.poll_interval else self.stack_cache_ttl
 
     @classmethod
     def from_env(cls, env: Mapping[str, str] | None = None) -> Config:
@@ -72,15 +144,50 @@ class Config:
                 "missing required environment variables: " + ", ".join(missing)
             )
 
+        poll_interval, poll_max_staleness = _parse_polling(env)
+        environments = _parse_environments(env)
+        default_env, allowed_stacks = next(iter(environments.items()))
+        every_stack = tuple(
+            dict.fromkeys(n for names in environments.values() for n in names)
+        )
         return cls(
             telegram_bot_token=env["TELEGRAM_BOT_TOKEN"].strip(),
             dockhand_url=env["DOCKHAND_URL"].strip().rstrip("/"),
             dockhand_api_token=env["DOCKHAND_API_TOKEN"].strip(),
             allowed_chat_ids=_parse_chat_ids(env["ALLOWED_CHAT_IDS"]),
-            allowed_stacks=_parse_stacks(env["ALLOWED_STACKS"]),
-            dockhand_env=_parse_dockhand_env(env["DOCKHAND_ENV"]),
+            allowed_stacks=allowed_stacks,
+            dockhand_env=default_env,
             log_level=env.get("LOG_LEVEL", "").strip().upper() or "INFO",
             webhook=_parse_webhook(env),
+            stack_cache_ttl=_parse_seconds(env, "STACK_CACHE_TTL", 5.0),
+            stats_cache_ttl=_parse_seconds(env, "STATS_CACHE_TTL", 5.0),
+            poll_interval=poll_interval,
+            poll_max_staleness=poll_max_staleness,
+            dockhand_events=_parse_bool(env, "DOCKHAND_EVENTS"),
+            notify_changes=_parse_notify(env, poll_interval),
+            notify_debounce=_parse_seconds(env, "NOTIFY_DEBOUNCE", 60.0),
+            bulk_concurrency=_parse_positive_int(env, "BULK_CONCURRENCY", 3),
+            stack_dependencies=_parse_dependencies(
+                env.get("STACK_DEPENDENCIES", ""), every_stack
+            ),
+            list_page_size=_parse_page_size(env),
+            update_workers=_parse_positive_int(env, "UPDATE_WORKERS", 8),
+            logs_tail=_parse_logs_tail(env),
+            logs_follow_seconds=_parse_follow_seconds(env),
+            action_timeout=_parse_action_timeout(env),
+            metrics_enabled=_parse_bool(env, "METRICS_ENABLED"),
+            metrics_port=_parse_port(env, "METRICS_PORT"),
+            extra_envs=tuple(environments.items())[1:],
+            env_timeout=_parse_env_timeout(env),
+            dockhand_retries=_parse_retries(env),
+            breaker_threshold=_parse_positive_int(
+                env, "DOCKHAND_BREAKER_THRESHOLD", 5
+            ),
+            breaker_cooldown=_parse_breaker_cooldown(env),
+            history_db=_parse_db_path(env, "HISTORY_DB"),
+            history_retention_days=_parse_retention_days(env),
+            schedule_db=_parse_db_path(env, "SCHEDULE_DB"),
+            schedule_misfire_grace=_parse_seconds(env, "SCHEDULE_MISFIRE_GRACE", 300.0),
         )
 
 
@@ -96,15 +203,67 @@ def _parse_chat_ids(raw: str) -> frozenset[int]:
 
 
 def _parse_stacks(raw: str) -> tuple[str, ...]:
+    """Allowlist for one env."""
     stacks = tuple(dict.fromkeys(_split(raw)))
     for name in stacks:
-        if "|" in name:
-            raise ConfigError(f"stack name may not contain '|': {name!r}")
-        if len(name.encode()) > _MAX_STACK_NAME_BYTES:
+        for forbidden in ("|", ENV_SEP):
+            if forbidden in name:
+                raise ConfigError(
+                    f"stack name may not contain {forbidden!r}: {name!r}"
+                )
+    return stacks
+
+
+def _parse_environments(env: Mapping[str, str]) -> dict[str, tuple[str, ...]]:
+    """DOCKHAND_ENV ids (first = default) -> allowlist: ALLOWED_STACKS_<id>
+    if set, else ALLOWED_STACKS."""
+    ids = [_parse_dockhand_env(part) for part in _split(env["DOCKHAND_ENV"])]
+    if not ids:
+        raise ConfigError("DOCKHAND_ENV must list at least one environment id")
+    environments: dict[str, tuple[str, ...]] = {}
+    for env_id in dict.fromkeys(ids):
+        raw = env.get(f"ALLOWED_STACKS_{env_id}", "").strip() or env["ALLOWED_STACKS"]
+        environments[env_id] = _parse_stacks(raw)
+    return environments
+
+
+def _parse_dependencies(
+    raw: str, allowed_stacks: tuple[str, ...]
+) -> tuple[tuple[str, str], ...]:
+    """``dependent:dependency`` pairs, e.g. ``nextcloud:postgres``."""
+    pairs: list[tuple[str, str]] = []
+    for part in _split(raw):
+        dependent, sep, dependency = (p.strip() for p in part.partition(":"))
+        if not sep or not dependent or not dependency:
             raise ConfigError(
-                f"stack name too long (max {_MAX_STACK_NAME_BYTES} bytes): {name!r}"
+                f"STACK_DEPENDENCIES entries must be dependent:dependency, got {part!r}"
             )
-    return stacks
+        for name in (dependent, dependency):
+            if name not in allowed_stacks:
+                raise ConfigError(f"STACK_DEPENDENCIES names unknown stack {name!r}")
+        pairs.append((dependent, dependency))
+    _check_acyclic(pairs)
+    return tuple(dict.fromkeys(pairs))
+
+
+def _check_acyclic(pairs: list[tuple[str, str]]) -> None:
+    graph: dict[str, list[str]] = {}
+    for dependent, dependency in pairs:
+        graph.setdefault(dependent, []).append(dependency)
+    done: set[str] = set()
+
+    def visit(name: str, path: tuple[str, ...]) -> None:
+        if name in path:
+            cycle = " -> ".join((*path[path.index(name) :], name))
+            raise ConfigError(f"STACK_DEPENDENCIES has a cycle: {cycle}")
+        if name in done:
+            return
+        for dependency in graph.get(name, ()):
+            visit(dependency, (*path, name))
+        done.add(name)
+
+    for name in graph:
+        visit(name, ())
 
 
 def _parse_dockhand_env(raw: str) -> str:
@@ -117,6 +276,136 @@ def _parse_dockhand_env(raw: str) -> str:
     return value
 
 
+def _parse_seconds(env: Mapping[str, str], name: str, default: float) -> float:
+    raw = env.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError as exc:
+        raise ConfigError(f"{name} must be a number of seconds") from exc
+    if not 0 <= value < float("inf"):
+        raise ConfigError(f"{name} must be a non-negative number of seconds")
+    return value
+
+
+def _parse_polling(env: Mapping[str, str]) -> tuple[float, float]:
+    """(interval, max staleness); (0, 0) when polling is off."""
+    interval = _parse_seconds(env, "POLL_INTERVAL", 0.0)
+    if not interval:
+        return 0.0, 0.0
+    staleness = _parse_seconds(env, "POLL_MAX_STALENESS", 3 * interval)
+    if staleness < interval:
+        raise ConfigError("POLL_MAX_STALENESS must be at least POLL_INTERVAL")
+    return interval, staleness
+
+
+def _parse_notify(env: Mapping[str, str], poll_interval: float) -> bool:
+    notify = _parse_bool(env, "NOTIFY_CHANGES")
+    if notify and not poll_interval:
+        raise ConfigError("NOTIFY_CHANGES requires POLL_INTERVAL")
+    return notify
+
+
+def _parse_env_timeout(env: Mapping[str, str]) -> float:
+    timeout = _parse_seconds(env, "ENV_TIMEOUT", 10.0)
+    if not timeout:
+        raise ConfigError("ENV_TIMEOUT must be greater than 0")
+    return timeout
+
+
+def _parse_action_timeout(env: Mapping[str, str]) -> float:
+    timeout = _parse_seconds(env, "ACTION_TIMEOUT", 300.0)
+    if not timeout:
+        raise ConfigError("ACTION_TIMEOUT must be greater than 0")
+    return timeout
+
+
+def _parse_breaker_cooldown(env: Mapping[str, str]) -> float:
+    cooldown = _parse_seconds(env, "DOCKHAND_BREAKER_COOLDOWN", 10.0)
+    if not cooldown:
+        raise ConfigError("DOCKHAND_BREAKER_COOLDOWN must be greater than 0")
+    return cooldown
+
+
+def _parse_db_path(env: Mapping[str, str], name: str) -> str:
+    path = env.get(name, "").strip()
+    if path and not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+        raise ConfigError(f"{name} directory does not exist: {path!r}")
+    return path
+
+
+def _parse_retention_days(env: Mapping[str, str]) -> float:
+    raw = env.get("HISTORY_RETENTION_DAYS", "").strip()
+    if not raw:
+        return 90.0
+    try:
+        days = float(raw)
+    except ValueError as exc:
+        raise ConfigError("HISTORY_RETENTION_DAYS must be a number of days") from exc
+    if not 0 < days < float("inf"):
+        raise ConfigError("HISTORY_RETENTION_DAYS must be greater than 0")
+    return days
+
+
+def _parse_retries(env: Mapping[str, str]) -> int:
+    raw = env.get("DOCKHAND_RETRIES", "").strip()
+    if not raw:
+        return 2
+    try:
+        retries = int(raw)
+    except ValueError as exc:
+        raise ConfigError("DOCKHAND_RETRIES must be an integer") from exc
+    if not 0 <= retries <= _MAX_RETRIES:
+        raise ConfigError(f"DOCKHAND_RETRIES must be between 0 and {_MAX_RETRIES}")
+    return retries
+
+
+def _parse_positive_int(env: Mapping[str, str], name: str, default: int) -> int:
+    raw = env.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise ConfigError(f"{name} must be an integer") from exc
+    if value < 1:
+        raise ConfigError(f"{name} must be at least 1")
+    return value
+
+
+def _parse_page_size(env: Mapping[str, str]) -> int:
+    size = _parse_positive_int(env, "LIST_PAGE_SIZE", 10)
+    # Telegram allows 100 buttons per keyboard; navigation, filters and
+    # the bulk row take up to 10.
+    if size > _MAX_PAGE_SIZE:
+        raise ConfigError(f"LIST_PAGE_SIZE must be at most {_MAX_PAGE_SIZE}")
+    return size
+
+
+def _parse_logs_tail(env: Mapping[str, str]) -> int:
+    tail = _parse_positive_int(env, "LOGS_TAIL", 100)
+    if tail > MAX_LOG_TAIL:
+        raise ConfigError(f"LOGS_TAIL must be at most {MAX_LOG_TAIL}")
+    return tail
+
+
+def _parse_follow_seconds(env: Mapping[str, str]) -> float:
+    seconds = _parse_seconds(env, "LOGS_FOLLOW_SECONDS", 120.0)
+    if not seconds:
+        raise ConfigError("LOGS_FOLLOW_SECONDS must be greater than 0")
+    return seconds
+
+
+def _parse_bool(env: Mapping[str, str], name: str) -> bool:
+    raw = env.get(name, "").strip().lower()
+    if raw in ("", "0", "false", "no", "off"):
+        return False
+    if raw in ("1", "true", "yes", "on"):
+        return True
+    raise ConfigError(f"{name} must be true or false, got {raw!r}")
+
+
 def _parse_webhook(env: Mapping[str, str]) -> Webhook | None:
     raw_mode = env.get("BOT_MODE", "").strip().lower() or BotMode.POLLING.value
     try:
@@ -139,15 +428,20 @@ def _parse_webhook(env: Mapping[str, str]) -> Webhook | None:
     if not _SECRET_RE.match(secret):
         raise ConfigError("WEBHOOK_SECRET must be 1-256 chars of A-Za-z0-9_-")
 
-    return Webhook(url=url, secret=secret, port=_parse_port(env))
+    return Webhook(
+        url=url,
+        secret=secret,
+        port=_parse_port(env, "WEBHOOK_PORT"),
+        max_pending=_parse_positive_int(env, "WEBHOOK_MAX_PENDING", 1000),
+    )
 
 
-def _parse_port(env: Mapping[str, str]) -> int:
-    raw = env.get("WEBHOOK_PORT", "").strip() or "5555"
+def _parse_port(env: Mapping[str, str], name: str) -> int:
+    raw = env.get(name, "").strip() or "5555"
     try:
         port = int(raw)
     except ValueError as exc:
-        raise ConfigError("WEBHOOK_PORT must be an integer") from exc
+        raise ConfigError(f"{name} must be an integer") from exc
     if not 1 <= port <= 65535:
-        raise ConfigError("WEBHOOK_PORT must be between 1 and 65535")
+        raise ConfigError(f"{name} must be between 1 and 65535")
     return port
@@ -0,0 +1,153 @@
+"""Cron expressions: the five standard fields, in the host's local time.
+
+    minute hour day-of-month month day-of-week
+
+A field is ``*``, a number, a range ``a-b``, a step ``*/n``, ``a-b/n``
+or ``a/n``, or a comma list of those; months and weekdays also take
+names (``jan``, ``mon``), and Sunday is 0 or 7. As in Vixie cron, when
+both day fields are restricted a day matches if either does.
+``@hourly``, ``@daily``, ``@weekly``, ``@monthly`` and ``@yearly`` are
+shorthands.
+"""
+from __future__ import annotations
+
+import calendar
+import datetime as dt
+from dataclasses import dataclass
+
+# name, lowest, highest
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+_NAMES = {
+    3: {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name},
+    4: {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6},
+}
+_MACROS = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+# Longest stretch without a matching day: 29 February, 8 years apart
+# across a skipped leap year (2096 -> 2104).
+_HORIZON = dt.timedelta(days=366 * 8)
+_MINUTE = dt.timedelta(minutes=1)
+_DAYS_IN = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)  # most, per month
+
+
+class CronError(ValueError):
+    """Invalid cron expression."""
+
+
+@dataclass(frozen=True)
+class Cron:
+    expr: str  # as given, for display and storage
+    minutes: tuple[int, ...]
+    hours: tuple[int, ...]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]  # 0 = Sunday
+    any_day: bool  # day of month is "*" (or "*/n")
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expr: str) -> Cron:
+        text = " ".join(expr.split())
+        fields = _MACROS.get(text.lower(), text).split()
+        if len(fields) != len(_FIELDS):
+            raise CronError(
+                f"cron expression needs 5 fields (minute hour day month weekday), "
+                f"got {text!r}"
+            )
+        minutes, hours, days, months, weekdays = (
+            _field(f, i) for i, f in enumerate(fields)
+        )
+        cron = cls(
+            expr=text,
+            minutes=tuple(sorted(minutes)),
+            hours=tuple(sorted(hours)),
+            days=frozenset(days),
+            months=frozenset(months),
+            weekdays=frozenset(d % 7 for d in weekdays),
+            # Vixie cron: "*/2" counts as unrestricted here too
+            any_day=fields[2].startswith("*"),
+            any_weekday=fields[4].startswith("*"),
+        )
+        if not cron.any_day and cron.any_weekday and min(days) > max(
+            _DAYS_IN[m - 1] for m in months
+        ):
+            raise CronError(f"cron expression never matches: {text!r}")
+        return cron
+
+    def next_after(self, at: float) -> float:
+        """Unix time of the first matching minute after ``at``."""
+        start = dt.datetime.fromtimestamp(at).replace(second=0, microsecond=0)
+        while True:
+            start = self._next_local(start + _MINUTE)
+            # Across a DST change local times repeat or do not exist;
+            # skip any that do not land after ``at``.
+            ts = start.timestamp()
+            if ts > at:
+                return ts
+
+    def _next_local(self, start: dt.datetime) -> dt.datetime:
+        """The first matching local time at or after ``start``."""
+        day = start.date()
+        end = day + _HORIZON
+        while day < end:
+            if day.month in self.months and self._day_matches(day):
+                today = day == start.date()
+                for hour in self.hours:
+                    if today and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if today and hour == start.hour and minute < start.minute:
+                            continue
+                        return dt.datetime(day.year, day.month, day.day, hour, minute)
+            day += dt.timedelta(days=1)
+        raise CronError(f"cron expression never matches: {self.expr!r}")
+
+    def _day_matches(self, day: dt.date) -> bool:
+        dom = day.day in self.days
+        dow = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return dom and dow
+        return dom or dow
+
+
+def _field(text: str, index: int) -> set[int]:
+    name, lo, hi = _FIELDS[index]
+    values: set[int] = set()
+    for part in text.lower().split(","):
+        base, slash, step_text = part.partition("/")
+        step = 1
+        if slash:
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise CronError(f"bad step in the {name} field: {part!r}")
+            step = int(step_text)
+        if base == "*":
+            first, last = lo, hi
+        else:
+            a, dash, b = base.partition("-")
+            first = _value(a, index)
+            last = _value(b, index) if dash else hi if slash else first
+        if not lo <= first <= last <= hi:
+            raise CronError(f"the {name} field takes {lo}-{hi}, got {part!r}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+def _value(text: str, index: int) -> int:
+    if text.isdigit():
+        return int(text)
+    if text in _NAMES.get(index, {}):
+        return _NAMES[index][text]
+    raise CronError(f"bad value in the {_FIELDS[index][0]} field: {text!r}")
@@ -1,69 +1,432 @@
-"""Thin blocking client for the Dockhand REST API.
+"""Async client for the Dockhand REST API, built on httpx.
 
-Callers in async code must wrap calls in ``asyncio.to_thread``.
+List and action traffic use separate connection pools: a slow image pull
+on an action can never starve the quick list calls of connections.
+
+Calls ride out a brief Dockhand restart: GETs are retried with jittered
+exponential backoff on connect errors, timeouts and gateway errors
+(502/503/504); POSTs only when the connection was never made, since
+Dockhand may already be running the action. Failures feed a shared
+circuit breaker (see bot.breaker) that fails calls fast while Dockhand
+stays down.
+
+Event subscriptions (``events``) are held open indefinitely, so they get
+a pool of their own and never take a list connection.
 """
 from __future__ import annotations
 
+import asyncio
+import copy
+import json
 import logging
+import random
+import time
+from collections.abc import AsyncGenerator, Collection
+from typing import Any
 from urllib.parse import quote
 
-import requests
+import httpx
+
+from bot.breaker import CircuitBreaker
+from bot.jsonstream import ArraySplitter
+from bot.logs import split_lines
+from bot.metrics import DOCKHAND_RETRIES, DOCKHAND_SECONDS
+from bot.sse import ServerEvent, parse_events
 
 log = logging.getLogger(__name__)
 
+# What a proxy in front of Dockhand answers while Dockhand is restarting.
+_UNAVAILABLE = frozenset({502, 503, 504})
+# The request never reached Dockhand, so even a POST is safe to resend.
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout)
+
 
 class DockhandError(Exception):
     """A Dockhand API call failed."""
 
 
+class DockhandDown(DockhandError):
+    """Dockhand kept failing; calls fail fast until it answers again."""
+
+
+class EventsUnsupported(DockhandError):
+    """This Dockhand build has no event stream endpoint."""
+
+
+class EventStream:
+    """An open event subscription: ``async for`` its events until the
+    connection ends, then aclose() it."""
+
+    def __init__(self, resp: httpx.Response, path: str) -> None:
+        self._resp = resp
+        self._path = path
+
+    async def __aiter__(self) -> AsyncGenerator[ServerEvent]:
+        try:
+            async for event in parse_events(self._resp.aiter_lines()):
+                yield event
+        except httpx.HTTPError as exc:
+            raise _unreachable("GET", self._path, exc) from exc
+
+    async def aclose(self) -> None:
+        await self._resp.aclose()
+
+
 class DockhandClient:
-    # (connect, read) timeouts: listing is quick; actions may pull images.
-    LIST_TIMEOUT = (5, 15)
-    ACTION_TIMEOUT = (5, 180)
+    # Listing is quick; actions may pull images. The pool timeout bounds
+    # how long a call waits for a free keep-alive connection.
+    LIST_TIMEOUT = httpx.Timeout(15, connect=5)
+    ACTION_TIMEOUT = httpx.Timeout(180, connect=5)
+    LIST_LIMITS = httpx.Limits(
+        max_connections=8, max_keepalive_connections=4, keepalive_expiry=30
+    )
+    ACTION_LIMITS = httpx.Limits(
+        max_connections=4, max_keepalive_connections=2, keepalive_expiry=30
+    )
+    # A followed log may stay quiet for long; its reader sets the deadline.
+    FOLLOW_TIMEOUT = httpx.Timeout(15, connect=5, read=None)
+    # Event streams: one held open per env, quiet while nothing changes
+    # (they use FOLLOW_TIMEOUT too).
+    EVENTS_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=0)
+    # Seconds before the first retry, doubling per retry up to the cap;
+    # each delay is drawn uniformly below that ("full jitter").
+    RETRY_BACKOFF = 0.5
+    MAX_RETRY_BACKOFF = 4.0
 
-    def __init__(self, base_url: str, token: str, env: str | None = None):
-        self._base = base_url.rstrip("/")
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        env: str | None = None,
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+        retries: int = 2,
+        breaker: CircuitBreaker | None = None,
+    ):
         self._env = env
-        self._session = requests.Session()
-        self._session.headers["Authorization"] = f"Bearer {token}"
-        self._session.headers["Accept"] = "application/json"
+        self._retries = retries
+        self._breaker = breaker or CircuitBreaker()  # shared by all views
+        # Whether Dockhand serves GET /api/stacks/{name}; None until probed.
+        self._stack_endpoint: bool | None = None
+        self._views: dict[str, DockhandClient] = {}  # shared by all views
+        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
 
-    def list_stacks(self) -> list[dict]:
-        resp = self._request("GET", "/api/stacks", self.LIST_TIMEOUT)
+        def pool(limits: httpx.Limits, timeout: httpx.Timeout) -> httpx.AsyncClient:
+            return httpx.AsyncClient(
+                base_url=base_url.rstrip("/"),
+                headers=headers,
+                limits=limits,
+                timeout=timeout,
+                follow_redirects=True,
+                transport=transport,
+            )
+
+        self._list_http = pool(self.LIST_LIMITS, self.LIST_TIMEOUT)
+        self._action_http = pool(self.ACTION_LIMITS, self.ACTION_TIMEOUT)
+        self._events_http = pool(self.EVENTS_LIMITS, self.FOLLOW_TIMEOUT)
+
+    def for_env(self, env: str) -> DockhandClient:
+        """This client scoped to another Dockhand env. Views share the
+        connection pools; closing any of them closes all."""
+        if env == self._env:
+            return self
+        view = self._views.get(env)
+        if view is None:
+            view = self._views[env] = copy.copy(self)
+            view._env = env
+        return view
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+
+    async def aclose(self) -> None:
+        await self._breaker.aclose()
+        await self._list_http.aclose()
+        await self._action_http.aclose()
+        await self._events_http.aclose()
+
+    async def list_stacks(self, names: Collection[str] | None = None) -> list[dict]:
+        """All /api/stacks entries, or only those named in ``names``.
+
+        With ``names`` the body is parsed as it streams in: other entries
+        are never decoded, and reading stops as soon as every name has been
+        seen (first entry wins on duplicates).
+        """
+        if names is None:
+            resp = await self._request(self._list_http, "GET", "/api/stacks")
+            return _json(resp)
+
+        remaining = set(names)
+        splitter = ArraySplitter(remaining.__contains__)
+        entries: list[dict] = []
+        resp = await self._request(
+            self._list_http, "GET", "/api/stacks", stream=True
+        )
         try:
-            return resp.json()
+            async for chunk in resp.aiter_bytes():
+                for name, raw in splitter.feed(chunk):
+                    entries.append(json.loads(raw))
+                    remaining.discard(name)
+                if not remaining:
+                    return entries
+            splitter.close()
         except ValueError as exc:
             raise DockhandError("Dockhand returned invalid JSON") from exc
+        except httpx.HTTPError as exc:
+            raise _unreachable("GET", "/api/stacks", exc) from exc
+        finally:
+            await resp.aclose()
+        return entries
 
-    def stack_action(self, name: str, action: str) -> None:
+    async def get_stack(self, name: str) -> dict | None:
+        """One /api/stacks entry, or None if Dockhand has no such stack.
+
+        Uses GET /api/stacks/{name} when the server has it. Builds without
+        that route answer 404/405 (or not a stack entry); once that happens
+        for a stack the full list does contain, the client stops probing
+        and picks the entry out of GET /api/stacks instead.
+        """
+        if self._stack_endpoint is not False:
+            resp = await self._request(
+                self._list_http,
+                "GET",
+                f"/api/stacks/{quote(name, safe='')}",
+                passthrough=(404, 405),
+                endpoint="/api/stacks/{name}",
+            )
+            if resp.status_code == 404 and self._stack_endpoint:
+                return None
+            if resp.is_success:
+                try:
+                    entry = resp.json()
+                except ValueError:
+                    entry = None
+                if isinstance(entry, dict) and entry.get("name") == name:
+                    self._stack_endpoint = True
+                    return entry
+
+        entries = await self.list_stacks([name])
+        entry = entries[0] if entries else None
+        if entry is not None and self._stack_endpoint is None:
+            log.info("Dockhand has no single-stack endpoint; using /api/stacks")
+            self._stack_endpoint = False
+        return entry
+
+    async def container_stats(self, container: str) -> tuple[dict, dict | None]:
+        """Docker inspect and one-shot stats of a container (id or name),
+        fetched concurrently; stats are None when Dockhand has none for it
+        (stopped containers)."""
+        path = f"/api/containers/{quote(container, safe='')}"
+        inspect, stats = await asyncio.gather(
+            self._request(
+                self._list_http, "GET", path, endpoint="/api/containers/{id}"
+            ),
+            self._request(
+                self._list_http,
+                "GET",
+                f"{path}/stats",
+                passthrough=(404, 409),
+                endpoint="/api/containers/{id}/stats",
+            ),
+        )
+        payload = _json(inspect)
+        if not stats.is_success:
+            return payload, None
+        return payload, _json(stats)
+
+    async def container_logs(
+        self, container: str, tail: int, *, follow: bool = False
+    ) -> AsyncGenerator[str]:
+        """The last ``tail`` lines of a container's stdout and stderr,
+        yielded as they stream in (see split_lines). With ``follow`` new
+        lines keep coming until the caller stops; it must then aclose()
+        the generator to release the connection."""
+        path = f"/api/containers/{quote(container, safe='')}/logs"
+        params = {"tail": str(tail), "stdout": "true", "stderr": "true"}
+        if follow:
+            params["follow"] = "true"
+        resp = await self._request(
+            self._list_http,
+            "GET",
+            path,
+            stream=True,
+            endpoint="/api/containers/{id}/logs",
+            params=params,
+            timeout=self.FOLLOW_TIMEOUT if follow else None,
+        )
+        try:
+            async for line in split_lines(resp.aiter_text()):
+                yield line
+        except httpx.HTTPError as exc:
+            raise _unreachable("GET", path, exc) from exc
+        finally:
+            await resp.aclose()
+
+    async def events(self, last_id: str | None = None) -> EventStream:
+        """Subscribe to Dockhand's Docker event stream (GET /api/events,
+        server-sent events); returns once Dockhand has accepted it.
+
+        ``last_id`` is sent as Last-Event-ID, so a Dockhand that keeps
+        recent events can replay those after it. Raises EventsUnsupported
+        if this Dockhand has no such endpoint (404/405).
+        """
+        headers = {"Accept": "text/event-stream"}
+        if last_id is not None:
+            headers["Last-Event-ID"] = last_id
+        resp = await self._request(
+            self._events_http,
+            "GET",
+            "/api/events",
+            passthrough=(404, 405),
+            stream=True,
+            headers=headers,
+        )
+        if resp.status_code in (404, 405):
+            await resp.aclose()
+            raise EventsUnsupported(
+                f"Dockhand has no /api/events (HTTP {resp.status_code})"
+            )
+        return EventStream(resp, "/api/events")
+
+    async def stack_action(self, name: str, action: str) -> None:
         """Run "start", "stop" or "restart" on a stack.
 
         The body is never read: only the status code carries the outcome,
         and Dockhand may answer with no body at all.
         """
-        self._request(
+        await self._request(
+            self._action_http,
             "POST",
             f"/api/stacks/{quote(name, safe='')}/{action}",
-            self.ACTION_TIMEOUT,
+            endpoint=f"/api/stacks/{{name}}/{action}",
         )
 
-    def _request(
-        self, method: str, path: str, timeout: tuple[int, int]
-    ) -> requests.Response:
-        url = f"{self._base}{path}"
-        params = {"env": self._env} if self._env else None
-        try:
-            resp = self._session.request(method, url, params=params, timeout=timeout)
-        except requests.RequestException as exc:
-            log.error("%s %s failed: %s", method, url, exc)
-            raise DockhandError(
-                f"Dockhand unreachable ({exc.__class__.__name__})"
-            ) from exc
+    async def _request(
+        self,
+        http: httpx.AsyncClient,
+        method: str,
+        path: str,
+        passthrough: tuple[int, ...] = (),
+        *,
+        stream: bool = False,
+        endpoint: str | None = None,
+        params: dict[str, str] | None = None,
+        timeout: httpx.Timeout | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        """Send a request; non-2xx raises unless listed in ``passthrough``.
+
+        A ``stream`` response is returned unread; the caller must close it.
+        ``endpoint`` is the path template used as the latency metric label
+        (stack names would make the label set unbounded). ``timeout``
+        overrides the pool's, and ``headers`` add to its. Retries as
+        described in the module docstring; raises DockhandDown without
+        sending while the breaker is open.
+        """
+        request = self._build(http, method, path, params, timeout, headers)
+        attempt = 0
+        while True:
+            if not self._breaker.closed:
+                raise DockhandDown(self._breaker.message)
+            retry = attempt < self._retries
+            try:
+                resp = await self._send(http, request, stream, endpoint or path)
+            except httpx.TransportError as exc:
+                self._breaker.failure(self._probe)
+                if not retry or not (method == "GET" or isinstance(exc, _NOT_SENT)):
+                    raise _unreachable(method, path, exc) from exc
+                reason = exc.__class__.__name__
+            except httpx.HTTPError as exc:
+                raise _unreachable(method, path, exc) from exc
+            else:
+                if resp.status_code not in _UNAVAILABLE:
+                    self._breaker.success()
+                    break
+                self._breaker.failure(self._probe)
+                if not retry or method != "GET":
+                    break
+                await resp.aclose()
+                reason = f"HTTP {resp.status_code}"
+            await self._backoff(method, path, attempt, reason)
+            attempt += 1
+        if resp.is_success or resp.status_code in passthrough:
+            return resp
+        if stream:
+            await resp.aclose()
         if resp.status_code == 401:
             raise DockhandError("Dockhand rejected the API token (401)")
-        if not resp.ok:
-            log.error(
-                "%s %s -> HTTP %s: %s", method, url, resp.status_code, resp.text[:200]
+        log.error(
+            "%s %s -> HTTP %s: %s",
+            method,
+            path,
+            resp.status_code,
+            "<streamed>" if stream else resp.text[:200],
+        )
+        raise DockhandError(f"Dockhand returned HTTP {resp.status_code}")
+
+    def _build(
+        self,
+        http: httpx.AsyncClient,
+        method: str,
+        path: str,
+        params: dict[str, str] | None = None,
+        timeout: httpx.Timeout | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> httpx.Request:
+        params = dict(params or {})
+        if self._env:
+            params["env"] = self._env
+        return http.build_request(
+            method,
+            path,
+            params=params or None,
+            headers=headers,
+            timeout=timeout or http.timeout,
+        )
+
+    @staticmethod
+    async def _send(
+        http: httpx.AsyncClient, request: httpx.Request, stream: bool, endpoint: str
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            resp = await http.send(request, stream=stream)
+            status = str(resp.status_code)
+            return resp
+        finally:
+            DOCKHAND_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                endpoint=endpoint,
+                status=status,
             )
+
+    async def _backoff(self, method: str, path: str, attempt: int, reason: str) -> None:
+        cap = min(self.RETRY_BACKOFF * 2**attempt, self.MAX_RETRY_BACKOFF)
+        delay = random.uniform(0, cap)
+        log.info("%s %s: %s, retrying in %.2fs", method, path, reason, delay)
+        DOCKHAND_RETRIES.inc(method=method)
+        await asyncio.sleep(delay)
+
+    async def _probe(self) -> None:
+        """GET /api/stacks past the breaker, without reading the list;
+        raises while Dockhand is still down."""
+        request = self._build(self._list_http, "GET", "/api/stacks")
+        resp = await self._send(self._list_http, request, True, "/api/stacks")
+        await resp.aclose()
+        if resp.status_code in _UNAVAILABLE:
             raise DockhandError(f"Dockhand returned HTTP {resp.status_code}")
-        return resp
+
+
+def _unreachable(method: str, path: str, exc: httpx.HTTPError) -> DockhandError:
+    log.error("%s %s failed: %s", method, path, exc)
+    return DockhandError(f"Dockhand unreachable ({exc.__class__.__name__})")
+
+
+def _json(resp: httpx.Response) -> Any:
+    try:
+        return resp.json()
+    except ValueError as exc:
+        raise DockhandError("Dockhand returned invalid JSON") from exc
@@ -0,0 +1,188 @@
+"""Stack state kept current from Dockhand's event stream.
+
+One task per Dockhand env holds an event subscription open and applies
+each container event (start, die, destroy, ...) to an in-memory copy of
+that env's allowlisted stacks. While the stream is up, handlers read
+that copy instead of fetching /api/stacks, so views cost no Dockhand
+call and an idle bot makes none.
+
+A full fetch (resync) runs only:
+
+- when the stream (re)connects. It subscribes first and fetches second,
+  so no change made during the fetch is lost; events that the fetch
+  already reflects just set the same states again.
+- on a gap: Dockhand numbers events, and a skipped number means a
+  missed event.
+- on an event for an allowlisted stack the last fetch did not have.
+
+A dropped stream reconnects with jittered exponential backoff, sending
+the last event id so a Dockhand that keeps recent events can replay
+them. While an env's stream is down it has no copy, and handlers fetch
+as they would without events (cache TTL). A Dockhand without an event
+endpoint is logged once and left alone.
+
+``on_change``, if given, gets each resync's stacks and each stack an
+event changed, by stack key (the state history records from it).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable, Collection, Iterable, Mapping
+
+from bot.dockhand import DockhandClient, DockhandError, EventStream, EventsUnsupported
+from bot.metrics import STACK_EVENTS, STACK_RESYNCS
+from bot.sse import ServerEvent
+from bot.stacks import Stack, apply_container_event, parse_container_event
+
+log = logging.getLogger(__name__)
+
+
+class _Gap(Exception):
+    """The copy missed something; fetch it again."""
+
+
+class StackEvents:
+    JITTER = 0.1  # +/- fraction of each delay
+    RECONNECT = 1.0  # seconds before the first reconnect, doubling per failure
+    MAX_BACKOFF = 300.0
+    # A stream that stayed up this long (seconds) ended normally; the next
+    # reconnect starts the backoff over.
+    STABLE = 60.0
+
+    def __init__(
+        self,
+        client: DockhandClient,
+        envs: Mapping[str, Collection[str]],
+        resync: Callable[[str], Awaitable[Mapping[str, Stack]]],
+        on_change: Callable[[Mapping[str, Stack]], None] | None = None,
+    ) -> None:
+        """``envs``: Stack.env -> allowlisted stack names. ``resync``
+        fetches one env's stacks by name, bypassing caches."""
+        self._client = client
+        self._envs = {env: frozenset(names) for env, names in envs.items()}
+        self._resync = resync
+        self._on_change = on_change
+        # Stack.env -> stacks by name, in allowlist order; only while the
+        # env's stream is up. Replaced, never mutated: handlers may hold
+        # the previous one, as they hold cached snapshots.
+        self._index: dict[str, dict[str, Stack]] = {}
+        self._last_id: dict[str, str] = {}  # for Last-Event-ID
+        self._seq: dict[str, int] = {}  # last event number this connection
+        self._tasks: list[asyncio.Task[None]] = []
+
+    @property
+    def live(self) -> int:
+        """Envs whose stream is up."""
+        return len(self._index)
+
+    def index(self, env: str = "") -> dict[str, Stack] | None:
+        """The env's current stacks by name, or None while its stream is
+        down."""
+        return self._index.get(env)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(
+                    self._follow(env), name=f"stack-events-{env or 'default'}"
+                )
+                for env in self._envs
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        self._index.clear()
+
+    def next_delay(self, failures: int) -> float:
+        base = min(self.RECONNECT * 2 ** max(failures - 1, 0), self.MAX_BACKOFF)
+        return base * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    async def _follow(self, env: str) -> None:
+        client = self._client.for_env(env) if env else self._client
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                await self._session(env, await client.events(self._last_id.get(env)))
+                reason = "stream ended"
+            except EventsUnsupported as exc:
+                log.warning("%s; stack views keep fetching /api/stacks", exc)
+                return
+            except (DockhandError, ValueError) as exc:
+                reason = str(exc)
+            except Exception:
+                # A bug must not end the subscription for the life of the
+                # process.
+                log.exception("Event stream of env %r crashed", env)
+                reason = "crashed"
+            finally:
+                self._index.pop(env, None)
+            if time.monotonic() - started >= self.STABLE:
+                failures = 0
+            failures += 1
+            delay = self.next_delay(failures)
+            log.warning(
+                "Event stream of env %r down (%s); reconnecting in %.1fs",
+                env,
+                reason,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def _session(self, env: str, stream: EventStream) -> None:
+        try:
+            self._seq.pop(env, None)
+            await self._load(env, "connect")
+            log.info("Following Dockhand events of env %r", env)
+            async for event in stream:
+                try:
+                    self._apply(env, event)
+                except _Gap:
+                    await self._load(env, "gap")
+        finally:
+            await stream.aclose()
+
+    async def _load(self, env: str, reason: str) -> None:
+        STACK_RESYNCS.inc(reason=reason)
+        self._index.pop(env, None)  # stale until the fetch is in
+        self._index[env] = index = dict(await self._resync(env))
+        self._changed(index.values())
+
+    def _apply(self, env: str, event: ServerEvent) -> None:
+        if event.id is not None:
+            self._last_id[env] = event.id
+            if event.id.isdigit():
+                seq, last = int(event.id), self._seq.get(env)
+                self._seq[env] = seq
+                if last is not None and seq > last + 1:
+                    log.info("Env %r missed events %d-%d", env, last + 1, seq - 1)
+                    raise _Gap
+        try:
+            change = parse_container_event(json.loads(event.data))
+        except ValueError:
+            change = None
+        if change is None or change.stack not in self._envs[env]:
+            STACK_EVENTS.inc(result="ignored")
+            return
+        index = self._index[env]
+        stack = index.get(change.stack)
+        if stack is None:
+            raise _Gap
+        stack = apply_container_event(stack, change)
+        self._index[env] = {**index, change.stack: stack}
+        STACK_EVENTS.inc(result="applied")
+        self._changed([stack])
+
+    def _changed(self, stacks: Iterable[Stack]) -> None:
+        if self._on_change is not None:
+            self._on_change({s.key: s for s in stacks})
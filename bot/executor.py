@@ -0,0 +1,237 @@
+"""Run stack actions in the background and follow them to completion.
+
+Handlers submit an action and return at once. The Dockhand POST runs as
+a task while the stack is polled for intermediate container states;
+progress goes to a callback until the stack reaches the action's target
+status (after the POST returned), the POST fails, or the timeout passes.
+
+At most one action runs per stack. A request for the action already in
+flight attaches to it and gets its progress and result; a conflicting
+one is refused (interactive taps) or waits its turn (bulk runs).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass, field
+from typing import Any
+
+from bot.dockhand import DockhandClient, DockhandError
+from bot.metrics import ACTION_LOCK_WAIT_SECONDS
+from bot.stacks import Stack, StackStatus, parse_stack_entry, stack_key
+
+log = logging.getLogger(__name__)
+
+# Endpoint verb -> status the stack settles in once the action worked
+_TARGET = {
+    "start": StackStatus.RUNNING,
+    "restart": StackStatus.RUNNING,
+    "stop": StackStatus.STOPPED,
+}
+
+
+@dataclass(frozen=True)
+class ActionProgress:
+    name: str
+    verb: str
+    stack: Stack | None = None  # latest polled state, None until known
+    done: bool = False
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.done and self.error is None
+
+
+Report = Callable[[ActionProgress], Awaitable[None]]
+
+
+class ActionConflict(Exception):
+    """A different action is already running on the stack."""
+
+    def __init__(self, name: str, verb: str) -> None:
+        super().__init__(f"{verb} already running on {name}")
+        self.name = name
+        self.verb = verb  # the one in flight
+
+
+@dataclass
+class _Job:
+    verb: str
+    latest: ActionProgress
+    reports: list[Report]
+    task: asyncio.Task[ActionProgress] = field(init=False)
+    # Serialises reports, so a late subscriber's catch-up never
+    # overtakes newer progress.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ActionExecutor:
+    POLL_EVERY = 2.0  # seconds between state polls while an action runs
+
+    def __init__(
+        self,
+        client: DockhandClient,
+        timeout: float,
+        poll_every: float = POLL_EVERY,
+    ) -> None:
+        self._client = client
+        self._timeout = timeout
+        self._poll_every = poll_every
+        self._tasks: set[asyncio.Task[Any]] = set()
+        self._jobs: dict[str, _Job] = {}  # stack key -> action in flight
+        self.coalesced = 0  # requests that attached to an identical action
+
+    def spawn[T](
+        self, coro: Coroutine[Any, Any, T], name: str | None = None
+    ) -> asyncio.Task[T]:
+        """Track a background job so shutdown can cancel it."""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def submit(
+        self,
+        name: str,
+        verb: str,
+        report: Report | None = None,
+        *,
+        env: str = "",
+    ) -> asyncio.Task[ActionProgress]:
+        """Start ``verb`` on ``name`` or attach to the identical action in
+        flight; raises ActionConflict if a different one is running.
+        ``env`` is "" for the client's own env, as on Stack."""
+        job = self._jobs.get(stack_key(name, env))
+        if job is None:
+            return self._start(name, verb, report, env)
+        if job.verb != verb:
+            raise ActionConflict(name, job.verb)
+        self.coalesced += 1
+        if report is not None:
+            job.reports.append(report)
+            self.spawn(self._catch_up(job, report), name=f"catch-up:{name}")
+        return job.task
+
+    async def run(
+        self,
+        name: str,
+        verb: str,
+        report: Report | None = None,
+        *,
+        env: str = "",
+    ) -> ActionProgress:
+        """Like submit(), but queue behind a conflicting action instead of
+        failing, and wait for the outcome."""
+        loop = asyncio.get_running_loop()
+        queued = loop.time()
+        key = stack_key(name, env)
+        while (job := self._jobs.get(key)) is not None and job.verb != verb:
+            await asyncio.wait({job.task})
+        ACTION_LOCK_WAIT_SECONDS.observe(loop.time() - queued)
+        # Shielded: one caller giving up must not cancel a shared action.
+        return await asyncio.shield(self.submit(name, verb, report, env=env))
+
+    def _start(
+        self, name: str, verb: str, report: Report | None, env: str
+    ) -> asyncio.Task[ActionProgress]:
+        key = stack_key(name, env)
+        job = _Job(verb, ActionProgress(name, verb), [report] if report else [])
+        self._jobs[key] = job
+        job.task = self.spawn(self._drive(name, env, job), name=f"{verb}:{key}")
+        return job.task
+
+    async def _drive(self, name: str, env: str, job: _Job) -> ActionProgress:
+        key = stack_key(name, env)
+        try:
+            await self._publish(job, job.latest)
+            final = await self._follow(name, env, job)
+            if final.error:
+                log.error("%s %s failed: %s", job.verb, key, final.error)
+            await self._publish(job, final)
+            return final
+        finally:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    async def _follow(self, name: str, env: str, job: _Job) -> ActionProgress:
+        """POST the action and poll until it settles; never raises
+        DockhandError, the outcome is in the returned progress."""
+        verb = job.verb
+        client = self._client.for_env(env) if env else self._client
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._timeout
+        post = asyncio.create_task(client.stack_action(name, verb))
+        stack: Stack | None = None
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                wait = max(0.0, min(self._poll_every, remaining))
+                await asyncio.wait({post}, timeout=wait)
+                if post.done() and (exc := post.exception()) is not None:
+                    return ActionProgress(name, verb, stack, True, str(exc))
+                latest = await self._probe(client, name, env)
+                changed = latest is not None and latest != stack
+                stack = latest if latest is not None else stack
+                settled = latest is not None and latest.status is _TARGET[verb]
+                if post.done() and settled:
+                    return ActionProgress(name, verb, stack, True)
+                if loop.time() >= deadline:
+                    state = stack.status.value if stack else "unknown"
+                    return ActionProgress(
+                        name,
+                        verb,
+                        stack,
+                        True,
+                        f"still {state} after {self._timeout:g}s",
+                    )
+                if changed:
+                    await self._publish(job, ActionProgress(name, verb, stack))
+        finally:
+            post.cancel()
+
+    async def join(self) -> None:
+        """Wait for every job in flight (graceful drain, tests)."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _probe(client: DockhandClient, name: str, env: str) -> Stack | None:
+        try:
+            entry = await client.get_stack(name)
+        except (DockhandError, ValueError) as exc:
+            log.warning("Polling %s during action failed: %s", name, exc)
+            return None
+        return None if entry is None else parse_stack_entry(entry, env)
+
+    async def _publish(self, job: _Job, progress: ActionProgress) -> None:
+        async with job.lock:
+            job.latest = progress
+            for report in list(job.reports):
+                await self._report(report, progress)
+
+    async def _catch_up(self, job: _Job, report: Report) -> None:
+        async with job.lock:
+            await self._report(report, job.latest)
+
+    @staticmethod
+    async def _report(report: Report, progress: ActionProgress) -> None:
+        try:
+            await report(progress)
+        except Exception:
+            log.exception("Progress report for %s failed", progress.name)
+
+    def _finished(self, task: asyncio.Task[Any]) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error(
+                "Background job %s crashed",
+                task.get_name(),
+                exc_info=task.exception(),
+            )
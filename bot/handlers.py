@@ -1,26 +1,82 @@
-"""Telegram handlers: /ping, /docker commands, callback dispatch, rendering."""
+"""Telegram handlers: /ping, /docker, /logs, /history and /schedule
+commands, callback dispatch, rendering."""
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import datetime as dt
+import functools
 import html
 import logging
+import sqlite3
+import time
+from collections import deque
+from collections.abc import (
+    Awaitable,
+    Callable,
+    Coroutine,
+    Hashable,
+    Mapping,
+    Sequence,
+)
+from dataclasses import replace
+from typing import Any
 
-from telegram import CallbackQuery, InlineKeyboardMarkup, Update
+from telegram import Bot, CallbackQuery, InlineKeyboardMarkup, Message, Update, User
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes
 
-from bot.config import Config
+from bot.bulk import BulkResult, dependency_map, run_bulk
+from bot.cache import TTLCache
+from bot.config import MAX_LOG_TAIL, Config
 from bot.dockhand import DockhandClient, DockhandError
+from bot.events import StackEvents
+from bot.executor import ActionConflict, ActionExecutor, ActionProgress
+from bot.history import ActionRecord, HistoryStore, StateRecord
 from bot.keyboards import (
+    FILTER_STATUS,
+    FIRST_PAGE,
+    MAX_PREFIX_BYTES,
+    SEP,
     Action,
+    Allowlist,
     CallbackError,
+    ListView,
+    StackFilter,
+    back_to_list_keyboard,
+    bulk_select_keyboard,
     confirm_stop_keyboard,
+    container_id,
+    container_keyboard,
     decode,
+    logs_keyboard,
     stack_detail_keyboard,
     stack_list_keyboard,
 )
-from bot.stacks import STATUS_DOT, Stack, StackStatus, parse_stacks
+from bot.logs import MESSAGE_LIMIT, LogTail, chunk_lines, text_length
+from bot.metrics import (
+    CALLBACK_REJECTED,
+    EDIT_NOT_MODIFIED,
+    EDIT_SKIPPED,
+    HANDLER_SECONDS,
+    TELEGRAM_SECONDS,
+)
+from bot.outbox import Call, Outbox, Superseded
+from bot.render import RenderCache, Rendered, message_key
+from bot.scheduler import Schedule, Scheduler, parse_when
+from bot.stacks import (
+    STATUS_DOT,
+    Container,
+    ContainerStats,
+    Stack,
+    StackStatus,
+    parse_container_stats,
+    parse_stack_entry,
+    parse_stack_index,
+    split_key,
+    stack_key,
+)
 
 log = logging.getLogger(__name__)
 
@@ -30,6 +86,33 @@ _ACTIONS = {
     Action.CONFIRM_STOP: ("stop", "Stopping"),
     Action.RESTART: ("restart", "Restarting"),
 }
+# Endpoint verb -> progress wording, for bulk runs
+_WORDING = {verb: wording for verb, wording in _ACTIONS.values()}
+# Bulk progress is edited at most this often (seconds); the summary always.
+_PROGRESS_EVERY = 1.0
+_BULK_USAGE = "Usage: /docker [start|stop|restart stack1,stack2,…]"
+_LOGS_USAGE = "Usage: /logs <stack> [container] [lines]"
+_LOG_MESSAGES = 5  # messages per log tail; the newest output is kept
+_FOLLOW_LINES = 200  # lines a followed log keeps (one message shows fewer)
+_FOLLOW_EVERY = 3.0  # seconds between edits of a followed log
+_MAX_FOLLOWS = 3  # follows at once; each holds a Dockhand connection
+_HISTORY_USAGE = "Usage: /history <stack> [entries]"
+_HISTORY_ENTRIES = 10  # actions and status changes /history shows by default
+_MAX_HISTORY_ENTRIES = 20  # of each; with the cuts below, fits one message
+_DOT_BY_STATUS = {status.value: dot for status, dot in STATUS_DOT.items()}
+_SCHEDULE_USAGE = (
+    "Usage:\n"
+    "/schedule add <stack> <start|stop|restart> in <delay, e.g. 30m>\n"
+    "/schedule add <stack> <start|stop|restart> <cron, e.g. 0 4 * * *>\n"
+    "/schedule list [stack]\n"
+    "/schedule cancel <id>"
+)
+_SCHEDULES_LISTED = 30  # per /schedule list; fits one message
+_FILTER_NOUNS = {
+    StackFilter.ALL: "stacks",
+    StackFilter.STOPPED: "stopped stacks",
+    StackFilter.PARTIAL: "partially running stacks",
+}
 
 
 def _config(context: ContextTypes.DEFAULT_TYPE) -> Config:
@@ -40,10 +123,102 @@ def _client(context: ContextTypes.DEFAULT_TYPE) -> DockhandClient:
     return context.bot_data["client"]
 
 
-def render_list(stacks: list[Stack]) -> str:
-    if not stacks:
-        return "No controllable stacks found in Dockhand."
-    return "<b>Stacks</b> — tap one to manage it."
+def _allowlist(context: ContextTypes.DEFAULT_TYPE) -> Allowlist:
+    return context.bot_data["allowlist"]
+
+
+def _executor(context: ContextTypes.DEFAULT_TYPE) -> ActionExecutor:
+    return context.bot_data["executor"]
+
+
+def _outbox(context: ContextTypes.DEFAULT_TYPE) -> Outbox:
+    return context.bot_data["outbox"]
+
+
+def _history(context: ContextTypes.DEFAULT_TYPE) -> HistoryStore | None:
+    return context.bot_data.get("history")
+
+
+def _audit(
+    bot_data: dict[str, Any],
+    key: str,
+    verb: str,
+    user: User | str | None,
+    chat_id: int | None,
+    started: float,
+    error: str | None,
+) -> None:
+    """Record an action's outcome if HISTORY_DB is set. ``user`` is who
+    asked, or a label for the bot itself (a schedule); ``started`` is
+    time.time() when it was requested."""
+    history: HistoryStore | None = bot_data.get("history")
+    if history is None:
+        return
+    history.record_action(
+        key,
+        verb,
+        user=user if isinstance(user, str) else _who(user),
+        user_id=None if user is None or isinstance(user, str) else user.id,
+        chat_id=chat_id,
+        started=started,
+        seconds=time.time() - started,
+        error=error,
+    )
+
+
+def _scheduler(context: ContextTypes.DEFAULT_TYPE) -> Scheduler | None:
+    return context.bot_data.get("scheduler")
+
+
+def _who(user: User | None) -> str:
+    if user is None:
+        return "?"
+    return f"@{user.username}" if user.username else user.full_name
+
+
+def _renders(context: ContextTypes.DEFAULT_TYPE) -> RenderCache:
+    return context.bot_data["renders"]
+
+
+def _cache(context: ContextTypes.DEFAULT_TYPE) -> TTLCache[Hashable, Any]:
+    """Keyed by env for the full snapshot, (env, name) for a single stack."""
+    return context.bot_data["cache"]
+
+
+def _stats_cache(
+    context: ContextTypes.DEFAULT_TYPE,
+) -> TTLCache[Hashable, ContainerStats]:
+    """Container stats keyed by (env, container)."""
+    return context.bot_data["stats"]
+
+
+def _follows(context: ContextTypes.DEFAULT_TYPE) -> dict[Hashable, asyncio.Task[None]]:
+    """Followed log messages (see message_key) -> the task editing them."""
+    return context.bot_data["follows"]
+
+
+def render_list(
+    stacks: list[Stack],
+    failed: Mapping[str, str] | None = None,
+    view: ListView = FIRST_PAGE,
+) -> str:
+    """``failed``: env id -> why that env is missing from ``stacks``."""
+    lines = [
+        f"⚠️ env {html.escape(env)} unavailable: {html.escape(why)}"
+        for env, why in (failed or {}).items()
+    ]
+    if view.narrowed:
+        shown = f"Showing {_FILTER_NOUNS[view.filter]}"
+        if view.prefix:
+            shown += f" starting with <code>{html.escape(view.prefix)}</code>"
+        lines.insert(0, f"<i>{shown}</i>")
+    if stacks:
+        lines.insert(0, "<b>Stacks</b> — tap one to manage it.")
+    elif view.narrowed:
+        lines.insert(0, "No stacks match.")
+    else:
+        lines.insert(0, "No controllable stacks found in Dockhand.")
+    return "\n".join(lines)
 
 
 def _container_dot(state: str) -> str:
@@ -51,137 +226,1291 @@ def _container_dot(state: str) -> str:
     return STATUS_DOT[StackStatus.RUNNING if running else StackStatus.STOPPED]
 
 
-def render_detail(stack: Stack) -> str:
+def _container_lines(stack: Stack) -> list[str]:
     lines = [
-        f"{STATUS_DOT[stack.status]} <b>{html.escape(stack.name)}</b>"
+        f"{_container_dot(c.state)} <code>{html.escape(c.name)}</code>"
+        f" ({html.escape(c.state)})"
+        for c in stack.containers
+    ]
+    return lines or ["<i>no containers</i>"]
+
+
+def render_detail(stack: Stack) -> str:
+    header = (
+        f"{STATUS_DOT[stack.status]} <b>{html.escape(stack.key)}</b>"
         f" — {stack.status.value}"
+    )
+    return "\n".join([header, *_container_lines(stack)])
+
+
+def render_container(
+    stack: Stack,
+    container: Container,
+    stats: ContainerStats,
+    now: float | None = None,
+) -> str:
+    state = html.escape(container.state)
+    if stats.health:
+        state += f", {html.escape(stats.health)}"
+    restarts = "—" if stats.restarts is None else str(stats.restarts)
+    lines = [
+        f"{_container_dot(container.state)} <b>{html.escape(stack.key)}</b>"
+        f" — <code>{html.escape(container.name)}</code>",
+        f"State: {state}",
+        f"CPU: {'—' if stats.cpu_percent is None else f'{stats.cpu_percent:.1f}%'}",
+        f"Memory: {_memory(stats)}",
+        f"Restarts: {restarts}",
     ]
-    for c in stack.containers:
-        lines.append(
-            f"{_container_dot(c.state)} <code>{html.escape(c.name)}</code>"
-            f" ({html.escape(c.state)})"
-        )
-    if not stack.containers:
-        lines.append("<i>no containers</i>")
+    if stats.started_at is not None:
+        now = time.time() if now is None else now
+        lines.append(f"Up: {_duration(now - stats.started_at)}")
     return "\n".join(lines)
 
 
-async def _fetch_stacks(context: ContextTypes.DEFAULT_TYPE) -> list[Stack]:
-    payload = await asyncio.to_thread(_client(context).list_stacks)
-    return parse_stacks(payload, _config(context).allowed_stacks)
+def _memory(stats: ContainerStats) -> str:
+    if stats.memory_used is None:
+        return "—"
+    used = _size(stats.memory_used)
+    if not stats.memory_limit:
+        return used
+    share = stats.memory_used / stats.memory_limit * 100
+    return f"{used} / {_size(stats.memory_limit)} ({share:.1f}%)"
+
+
+def _size(n: int) -> str:
+    value = float(n)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def _duration(seconds: float) -> str:
+    """Two largest units, e.g. 3d 4h, 5h 12m; seconds below a minute."""
+    s = max(0, int(seconds))
+    days, s = divmod(s, 86400)
+    hours, s = divmod(s, 3600)
+    minutes, s = divmod(s, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m" if minutes else f"{s}s"
+
+
+def _when(at: float, tz: dt.tzinfo | None = None) -> str:
+    return f"<code>{dt.datetime.fromtimestamp(at, tz):%m-%d %H:%M}</code>"
+
+
+def render_progress(wording: str, name: str, stack: Stack | None) -> str:
+    header = f"⏳ {wording} <b>{html.escape(name)}</b>…"
+    if stack is None or not stack.containers:
+        return header
+    running = sum(1 for c in stack.containers if c.state == "running")
+    header += f" {running}/{len(stack.containers)} running"
+    return "\n".join([header, *_container_lines(stack)])
+
+
+def _env_id(config: Config, env: str) -> str:
+    """Stack.env ("" = default env) -> Dockhand env id."""
+    return env or config.dockhand_env
+
+
+def _env_client(bot_data: dict[str, Any], env: str) -> DockhandClient:
+    client: DockhandClient = bot_data["client"]
+    return client.for_env(env) if env else client
+
+
+async def fetch_index(
+    bot_data: dict[str, Any],
+    *,
+    fresh: bool = False,
+    env: str = "",
+    names: Sequence[str] | None = None,
+) -> dict[str, Stack]:
+    """One env's stack snapshot: the event stream's copy while it is up
+    (DOCKHAND_EVENTS), else from the cache; ``fresh`` bypasses both
+    (Refresh, background poller, resync). ``env`` as on Stack.
+
+    ``names`` (allowlisted, in allowlist order) narrows the snapshot to
+    those stacks: served from a fresh full snapshot if there is one, else
+    only they are streamed out of Dockhand's list and parsed.
+    """
+    config: Config = bot_data["config"]
+    env_id = _env_id(config, env)
+    allowed = config.environments[env_id]
+    cache: TTLCache[Hashable, Any] = bot_data["cache"]
+    events: StackEvents | None = bot_data.get("events")
+    live = None if fresh or events is None else events.index(env)
+    if names is not None and len(names) < len(allowed):
+        wanted = tuple(names)
+        snapshot = live
+        if snapshot is None and not fresh:
+            snapshot = cache.peek(env_id)
+        if snapshot is not None:
+            return {n: snapshot[n] for n in wanted if n in snapshot}
+    else:
+        wanted = allowed
+        if live is not None:
+            return live
+
+    async def load() -> dict[str, Stack]:
+        payload = await _env_client(bot_data, env).list_stacks(wanted)
+        return parse_stack_index(payload, wanted, env)
+
+    key = env_id if wanted is allowed else (env_id, wanted)
+    return await cache.get(key, load, force=fresh)
+
+
+async def fetch_all(
+    bot_data: dict[str, Any],
+    *,
+    fresh: bool = False,
+    keys: Sequence[str] | None = None,
+) -> tuple[list[Stack], dict[str, str]]:
+    """Stacks of every env, fetched concurrently, and env id -> reason for
+    envs that failed or exceeded ENV_TIMEOUT. Raises only when no env
+    answered, so one slow host never blanks the whole list.
+
+    ``keys`` (allowlisted stack keys, in allowlist order) limits the fetch
+    to those stacks and the envs they live in.
+    """
+    config: Config = bot_data["config"]
+    wanted: dict[str, list[str] | None] = dict.fromkeys(
+        ["", *(env for env, _ in config.extra_envs)]
+    )
+    if keys is not None:
+        by_env: dict[str, list[str]] = {}
+        for key in keys:
+            name, env = split_key(key)
+            by_env.setdefault(env, []).append(name)
+        wanted = dict(by_env)
+    if not config.extra_envs:
+        if "" not in wanted:
+            return [], {}
+        index = await fetch_index(bot_data, fresh=fresh, names=wanted[""])
+        return list(index.values()), {}
+    envs = list(wanted)
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                fetch_index(bot_data, fresh=fresh, env=env, names=names),
+                config.env_timeout,
+            )
+            for env, names in wanted.items()
+        ),
+        return_exceptions=True,
+    )
+    stacks: list[Stack] = []
+    failed: dict[str, str] = {}
+    for env, result in zip(envs, results, strict=True):
+        env_id = _env_id(config, env)
+        if isinstance(result, TimeoutError):
+            failed[env_id] = f"no answer within {config.env_timeout:g}s"
+        elif isinstance(result, DockhandError | ValueError):
+            failed[env_id] = str(result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            stacks.extend(result.values())
+    for env_id, why in failed.items():
+        log.warning("Listing env %s failed: %s", env_id, why)
+    if failed and len(failed) == len(envs):
+        raise DockhandError("; ".join(f"env {e}: {w}" for e, w in failed.items()))
+    return stacks, failed
+
+
+async def fetch_snapshot(
+    bot_data: dict[str, Any], *, fresh: bool = False
+) -> dict[str, Stack]:
+    """Every env's stacks by stack key, for the poller. Fails if any env
+    did, so listeners never mistake an unreachable env for gone stacks."""
+    stacks, failed = await fetch_all(bot_data, fresh=fresh)
+    if failed:
+        raise DockhandError("; ".join(f"env {e}: {w}" for e, w in failed.items()))
+    return {s.key: s for s in stacks}
+
+
+async def fetch_page(
+    bot_data: dict[str, Any], view: ListView, *, fresh: bool = False
+) -> tuple[list[Stack], dict[str, str], ListView, int]:
+    """One list page: its stacks, failed envs as in fetch_all, ``view``
+    clamped to the last page, and the page count.
+
+    Unfiltered pages are slices of the allowlist, so only the page's own
+    stacks are fetched and parsed. A status filter needs the status of
+    every candidate first, which the cached snapshot usually has.
+    """
+    config: Config = bot_data["config"]
+    allowlist: Allowlist = bot_data["allowlist"]
+    keys = [k for k in allowlist.keys if k.startswith(view.prefix)]
+    status = FILTER_STATUS.get(view.filter)
+    size = config.list_page_size
+    if status is None:
+        view, pages = _clamp(view, len(keys), size)
+        start = view.page * size
+        page_keys = keys[start : start + size]
+        stacks, failed = await fetch_all(bot_data, fresh=fresh, keys=page_keys)
+        return stacks, failed, view, pages
+    stacks, failed = await fetch_all(bot_data, fresh=fresh, keys=keys)
+    stacks = [s for s in stacks if s.status is status]
+    view, pages = _clamp(view, len(stacks), size)
+    start = view.page * size
+    return stacks[start : start + size], failed, view, pages
+
+
+def _clamp(view: ListView, count: int, size: int) -> tuple[ListView, int]:
+    """(view on an existing page, page count) for ``count`` items."""
+    pages = max(1, -(-count // size))
+    if view.page < pages:
+        return view, pages
+    return replace(view, page=pages - 1), pages
+
+
+async def _fetch_stacks(
+    context: ContextTypes.DEFAULT_TYPE, *, fresh: bool = False
+) -> list[Stack]:
+    return (await fetch_all(context.bot_data, fresh=fresh))[0]
 
 
-async def _fetch_stack(context: ContextTypes.DEFAULT_TYPE, name: str) -> Stack | None:
-    stacks = await _fetch_stacks(context)
-    return next((s for s in stacks if s.name == name), None)
+async def _fetch_stack(
+    context: ContextTypes.DEFAULT_TYPE, key: str, *, fresh: bool = False
+) -> Stack | None:
+    """One stack: an O(1) snapshot lookup, or a single-stack fetch when
+    ``fresh`` so a detail Refresh never parses the whole inventory."""
+    name, env = split_key(key)
+    if not fresh:
+        return (await fetch_index(context.bot_data, env=env)).get(name)
+    env_id = _env_id(_config(context), env)
+
+    async def load() -> Stack | None:
+        entry = await _env_client(context.bot_data, env).get_stack(name)
+        return None if entry is None else parse_stack_entry(entry, env)
+
+    return await _cache(context).get((env_id, name), load, force=True)
+
+
+async def _fetch_container_stats(
+    context: ContextTypes.DEFAULT_TYPE, stack: Stack, container: Container
+) -> ContainerStats:
+    """Stats are only fetched for the container view, and reused for
+    STATS_CACHE_TTL seconds so Refresh taps don't reach Dockhand each time."""
+    env_id = _env_id(_config(context), stack.env)
+
+    async def load() -> ContainerStats:
+        client = _env_client(context.bot_data, stack.env)
+        inspect, stats = await client.container_stats(container.ref)
+        return parse_container_stats(inspect, stats)
+
+    return await _stats_cache(context).get((env_id, container.ref), load)
 
 
 async def _safe_edit(
-    query: CallbackQuery, text: str, keyboard: InlineKeyboardMarkup | None
+    context: ContextTypes.DEFAULT_TYPE,
+    target: CallbackQuery | Message,
+    text: str,
+    keyboard: InlineKeyboardMarkup | None,
+) -> None:
+    await _edit(context, target, Rendered.of(text, keyboard))
+
+
+async def _edit(
+    context: ContextTypes.DEFAULT_TYPE,
+    target: CallbackQuery | Message,
+    view: Rendered,
 ) -> None:
-    """Edit the callback message, ignoring Telegram's 'message is not
-    modified' complaint (e.g. Refresh with unchanged status)."""
+    """Show ``view`` in the callback's (or a sent) message. No call is made
+    if the message already shows it; Telegram's 'message is not modified'
+    (content the bot did not record, e.g. from before a restart) is
+    ignored."""
+    renders = _renders(context)
+    message = message_key(target)
+    if renders.shows(message, view):
+        EDIT_SKIPPED.inc()
+        return
+    # Recorded up front: once the queue drains this is what the message
+    # shows, since a later edit of it replaces this one if still queued.
+    renders.record(message, view)
+    edit = (
+        target.edit_text if isinstance(target, Message) else target.edit_message_text
+    )
+    call = _call(
+        "edit_message_text",
+        edit,
+        view.text,
+        reply_markup=view.keyboard,
+        parse_mode=ParseMode.HTML,
+    )
     try:
-        await query.edit_message_text(
-            text, reply_markup=keyboard, parse_mode=ParseMode.HTML
+        await _outbox(context).send(
+            _chat_id(target), call, kind="edit", collapse=message
         )
-    except BadRequest as exc:
-        if "not modified" not in str(exc).lower():
+    except Superseded:
+        pass
+    except TelegramError as exc:
+        if not (isinstance(exc, BadRequest) and "not modified" in str(exc).lower()):
+            renders.forget(message)  # may or may not have been applied
             raise
+        EDIT_NOT_MODIFIED.inc()
+
+
+async def _answer(
+    context: ContextTypes.DEFAULT_TYPE,
+    query: CallbackQuery,
+    text: str | None = None,
+    *,
+    show_alert: bool = False,
+) -> None:
+    args = () if text is None else (text,)
+    kwargs = {} if text is None else {"show_alert": show_alert}
+    await _outbox(context).answer(_call("answer", query.answer, *args, **kwargs))
 
 
-async def _show_list(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE) -> None:
-    stacks = await _fetch_stacks(context)
-    await _safe_edit(query, render_list(stacks), stack_list_keyboard(stacks))
+async def _reply(
+    context: ContextTypes.DEFAULT_TYPE, message: Message, text: str, **kwargs: Any
+) -> Message:
+    call = _call("send_message", message.reply_text, text, **kwargs)
+    return await _outbox(context).send(message.chat_id, call)
+
+
+def _call(
+    method: str, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any
+) -> Call:
+    """``fn(*args, **kwargs)`` as an outbox call, timed per Bot API method."""
+
+    async def call() -> Any:
+        with TELEGRAM_SECONDS.time(method=method):
+            return await fn(*args, **kwargs)
+
+    return call
+
+
+def _chat_id(target: CallbackQuery | Message) -> int | None:
+    message = target if isinstance(target, Message) else target.message
+    return None if message is None else message.chat.id
+
+
+def _timed[**P](
+    label: str,
+) -> Callable[
+    [Callable[P, Awaitable[None]]], Callable[P, Coroutine[Any, Any, None]]
+]:
+    """Record a command handler's latency under ``label``."""
+
+    def wrap(
+        handler: Callable[P, Awaitable[None]],
+    ) -> Callable[P, Coroutine[Any, Any, None]]:
+        @functools.wraps(handler)
+        async def timed(*args: P.args, **kwargs: P.kwargs) -> None:
+            with HANDLER_SECONDS.time(action=label):
+                await handler(*args, **kwargs)
+
+        return timed
+
+    return wrap
+
+
+async def _show_list(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    view: ListView = FIRST_PAGE,
+    *,
+    fresh: bool = False,
+) -> None:
+    stacks, failed, view, pages = await fetch_page(
+        context.bot_data, view, fresh=fresh
+    )
+    state = ("list", tuple(stacks), tuple(failed.items()), view, pages)
+    await _edit(
+        context,
+        query,
+        _renders(context).view(
+            state,
+            lambda: (
+                render_list(stacks, failed, view),
+                stack_list_keyboard(stacks, view, pages),
+            ),
+        ),
+    )
+
+
+def _detail_view(context: ContextTypes.DEFAULT_TYPE, stack: Stack) -> Rendered:
+    return _renders(context).view(
+        ("detail", stack),
+        lambda: (render_detail(stack), stack_detail_keyboard(stack)),
+    )
 
 
 async def _show_detail(
-    query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, name: str
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    key: str,
+    *,
+    fresh: bool = False,
 ) -> None:
-    stack = await _fetch_stack(context, name)
+    stack = await _fetch_stack(context, key, fresh=fresh)
     if stack is None:
         await _safe_edit(
+            context,
             query,
-            f"⚠️ Stack <b>{html.escape(name)}</b> not found in Dockhand.",
+            f"⚠️ Stack <b>{html.escape(key)}</b> not found in Dockhand.",
             stack_list_keyboard([]),
         )
         return
-    await _safe_edit(query, render_detail(stack), stack_detail_keyboard(stack))
+    await _edit(context, query, _detail_view(context, stack))
+
+
+def _container_by_id(stack: Stack | None, cid: str) -> Container | None:
+    containers = stack.containers if stack else ()
+    return next((c for c in containers if container_id(c.name) == cid), None)
+
+
+def _container_named(stack: Stack, name: str) -> Container | None:
+    """The container called ``name``, else the only one whose name
+    contains it (``/logs media db`` for ``media-db-1``)."""
+    for c in stack.containers:
+        if c.name == name:
+            return c
+    matches = [c for c in stack.containers if name in c.name]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _default_container(stack: Stack) -> Container | None:
+    """The one worth reading first: the first not running, else the first."""
+    for c in stack.containers:
+        if c.state != "running":
+            return c
+    return stack.containers[0] if stack.containers else None
+
+
+async def _show_container(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    key: str,
+    cid: str,
+) -> None:
+    stack = await _fetch_stack(context, key)
+    container = _container_by_id(stack, cid)
+    if stack is None or container is None:
+        # Gone since the button was sent: show what the stack has now.
+        await _show_detail(query, context, key)
+        return
+    stats = await _fetch_container_stats(context, stack, container)
+    view = Rendered.of(
+        render_container(stack, container, stats),
+        container_keyboard(stack, container.name),
+    )
+    await _edit(context, query, view)
+
+
+def _logs_header(stack: Stack, container: Container) -> str:
+    return (
+        f"📜 <b>{html.escape(stack.key)}</b>"
+        f" — <code>{html.escape(container.name)}</code>"
+    )
+
+
+async def _send_logs(
+    context: ContextTypes.DEFAULT_TYPE,
+    message: Message,
+    stack: Stack,
+    container: Container,
+    lines: int,
+) -> None:
+    """Reply with the last ``lines`` log lines, streamed into at most
+    _LOG_MESSAGES messages; older output beyond that is dropped as it
+    streams past, so volume never grows memory or message count."""
+    header = _logs_header(stack, container)
+    omitted = "<i>… earlier output omitted</i>"
+    room = MESSAGE_LIMIT - text_length(f"{header}\n{omitted}\n")
+    client = _env_client(context.bot_data, stack.env)
+    stream = client.container_logs(container.ref, lines)
+    kept: deque[str] = deque(maxlen=_LOG_MESSAGES)
+    total = 0
+    try:
+        async for chunk in chunk_lines(stream, room):
+            kept.append(chunk)
+            total += 1
+    finally:
+        await stream.aclose()
+    if total > len(kept):
+        header += f"\n{omitted}"
+    texts = list(kept) or ["<i>no output</i>"]
+    texts[0] = f"{header}\n{texts[0]}"
+    for i, text in enumerate(texts, 1):
+        last = i == len(texts)
+        await _reply(
+            context,
+            message,
+            text,
+            parse_mode=ParseMode.HTML,
+            reply_markup=(
+                logs_keyboard(stack.key, container.name, following=False)
+                if last
+                else None
+            ),
+        )
+
+
+async def _show_logs(
+    query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, key: str, cid: str
+) -> None:
+    message = query.message
+    if not isinstance(message, Message):  # too old to reply to
+        return
+    stack = await _fetch_stack(context, key)
+    if stack is None:
+        await _show_detail(query, context, key)
+        return
+    container = _container_by_id(stack, cid) if cid else _default_container(stack)
+    if container is None:
+        await _show_detail(query, context, key)
+        return
+    await _send_logs(context, message, stack, container, _config(context).logs_tail)
+
+
+async def _toggle_follow(
+    query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, key: str, cid: str
+) -> None:
+    """Start live-editing the log message, or stop if already following.
+    Answers the query itself."""
+    follows = _follows(context)
+    target = message_key(query)
+    running = follows.get(target)
+    if running is not None:
+        running.cancel()
+        await _answer(context, query)
+        return
+    if len(follows) >= _MAX_FOLLOWS:
+        await _answer(
+            context,
+            query,
+            f"Already following {_MAX_FOLLOWS} logs — stop one first",
+            show_alert=True,
+        )
+        return
+    try:
+        stack = await _fetch_stack(context, key)
+    except (DockhandError, ValueError) as exc:
+        log.error("Callback %r failed: %s", query.data, exc)
+        # Callback answers hold at most 200 characters.
+        await _answer(context, query, f"⚠️ {exc}"[:200], show_alert=True)
+        return
+    container = _container_by_id(stack, cid)
+    if stack is None or container is None:
+        await _answer(context, query, "That container is gone", show_alert=True)
+        return
+    await _answer(context, query)
+    follows[target] = _executor(context).spawn(
+        _follow_logs(query, context, stack, container),
+        name=f"follow:{key}",
+    )
+
+
+async def _follow_logs(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    stack: Stack,
+    container: Container,
+) -> None:
+    """Edit the message with the newest log lines at most every
+    _FOLLOW_EVERY seconds, for LOGS_FOLLOW_SECONDS or until stopped.
+    However fast the container logs, that is one edit per interval and
+    _FOLLOW_LINES lines held."""
+    header = _logs_header(stack, container)
+    # Room for " · <status>" and the newline after the header
+    tail = LogTail(_FOLLOW_LINES, MESSAGE_LIMIT - text_length(header) - 80)
+    seconds = _config(context).logs_follow_seconds
+    client = _env_client(context.bot_data, stack.env)
+    stream = client.container_logs(container.ref, _FOLLOW_LINES, follow=True)
+
+    async def read() -> None:
+        async for line in stream:
+            tail.add(line)
+
+    async def show(status: str, *, following: bool) -> None:
+        body = tail.render() or "<i>no output yet</i>"
+        view = Rendered.of(
+            f"{header} · {html.escape(status[:64])}\n{body}",
+            logs_keyboard(stack.key, container.name, following=following),
+        )
+        try:
+            await _edit(context, query, view)
+        except TelegramError as exc:
+            log.warning("Log follow edit for %s failed: %s", stack.key, exc)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    reader = asyncio.create_task(read())
+    status = f"stopped after {seconds:g}s"
+    try:
+        shown = -1
+        while not reader.done() and (remaining := deadline - loop.time()) > 0:
+            if tail.version != shown:
+                shown = tail.version
+                await show("following…", following=True)
+            await asyncio.wait({reader}, timeout=min(_FOLLOW_EVERY, remaining))
+        if reader.done() and (exc := reader.exception()) is not None:
+            status = f"⚠️ {exc}"
+        elif reader.done():
+            status = "log ended"
+    except asyncio.CancelledError:
+        status = "stopped"
+        raise
+    finally:
+        _follows(context).pop(message_key(query), None)
+        reader.cancel()
+        await asyncio.wait({reader})
+        if not reader.cancelled() and reader.exception() is not None:
+            log.warning("Following %s logs failed: %s", stack.key, reader.exception())
+        await stream.aclose()
+        await show(status, following=False)
 
 
 async def _run_action(
     query: CallbackQuery,
     context: ContextTypes.DEFAULT_TYPE,
     action: Action,
-    name: str,
+    key: str,
 ) -> None:
+    """Submit the action and return; the executor edits the message with
+    container progress until the stack settles. Answers the query itself,
+    with an alert if another action holds the stack."""
     verb, wording = _ACTIONS[action]
-    await _safe_edit(
+    name, env = split_key(key)
+    cache, env_id = _cache(context), _env_id(_config(context), env)
+    started = time.time()
+    chat_id = query.message.chat.id if query.message else None
+
+    async def report(progress: ActionProgress) -> None:
+        stack = progress.stack
+        if not progress.done:
+            # No buttons while the action runs: prevents double-taps.
+            view = Rendered.of(render_progress(wording, key, stack), None)
+        else:
+            user = query.from_user
+            _audit(
+                context.bot_data, key, verb, user, chat_id, started, progress.error
+            )
+            cache.invalidate(env_id)
+            if stack is not None and progress.error is None:
+                view = _detail_view(context, stack)
+            else:
+                text = render_detail(stack) if stack else ""
+                if progress.error:
+                    text = f"⚠️ {html.escape(progress.error)}\n\n{text}".rstrip()
+                keyboard = (
+                    stack_detail_keyboard(stack) if stack else back_to_list_keyboard()
+                )
+                view = Rendered.of(text, keyboard)
+        try:
+            await _edit(context, query, view)
+        except TelegramError as exc:
+            log.warning("Progress edit for %s failed: %s", key, exc)
+
+    try:
+        _executor(context).submit(name, verb, report, env=env)
+    except ActionConflict as exc:
+        await _answer(
+            context,
+            query,
+            f"{key} is busy: {_WORDING[exc.verb].lower()} — try again when done",
+            show_alert=True,
+        )
+        return
+    await _answer(context, query)
+
+
+def render_bulk(
+    verb: str,
+    names: Sequence[str],
+    results: Mapping[str, BulkResult],
+    *,
+    done: bool = False,
+) -> str:
+    if done:
+        ok = sum(1 for r in results.values() if r.ok)
+        lines = [f"<b>{verb.capitalize()}</b>: {ok}/{len(names)} succeeded"]
+    else:
+        lines = [
+            f"⏳ {_WORDING[verb]} {len(names)} stacks… ({len(results)}/{len(names)})"
+        ]
+    for name in names:
+        result = results.get(name)
+        label = f"<b>{html.escape(name)}</b>"
+        if result is None:
+            lines.append(f"⏳ {label}")
+        elif result.ok:
+            lines.append(f"✅ {label}")
+        else:
+            icon, why = ("⏭", "skipped: ") if result.skipped else ("❌", "")
+            lines.append(f"{icon} {label} — {why}{html.escape(result.error or '')}")
+    return "\n".join(lines)
+
+
+def _selection(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE) -> set[str]:
+    """Restart multi-select state: one per chat, tied to the message
+    showing it, so an older selection message starts from scratch."""
+    chat_data = context.chat_data if context.chat_data is not None else {}
+    message_id = query.message.message_id if query.message else None
+    current = chat_data.get("bulk_selection")
+    if current is None or current[0] != message_id:
+        current = chat_data["bulk_selection"] = (message_id, set())
+    return current[1]
+
+
+async def _run_bulk(
+    target: CallbackQuery | Message,
+    context: ContextTypes.DEFAULT_TYPE,
+    verb: str,
+    names: Sequence[str],
+    user: User | None,
+) -> None:
+    """Run ``verb`` on ``names`` (stack keys) for ``user``, editing one live
+    progress message."""
+    config = _config(context)
+    executor = _executor(context)
+    results: dict[str, BulkResult] = {}
+    changed = asyncio.Event()
+
+    def on_result(result: BulkResult) -> None:
+        results[result.name] = result
+        changed.set()
+
+    async def report_progress() -> None:
+        while True:
+            await changed.wait()
+            changed.clear()
+            text = render_bulk(verb, names, results)
+            try:
+                await _safe_edit(context, target, text, None)
+            except TelegramError as exc:
+                log.warning("Bulk progress edit failed: %s", exc)
+            await asyncio.sleep(_PROGRESS_EVERY)
+
+    message = target.message if isinstance(target, CallbackQuery) else target
+    chat_id = message.chat.id if message else None
+
+    async def act(key: str) -> None:
+        # Waits for the stack to settle, so dependents start on a live one.
+        name, env = split_key(key)
+        started = time.time()
+        outcome = await executor.run(name, verb, env=env)
+        _audit(context.bot_data, key, verb, user, chat_id, started, outcome.error)
+        if outcome.error:
+            raise DockhandError(outcome.error)
+
+    await _safe_edit(context, target, render_bulk(verb, names, results), None)
+    reporter = asyncio.create_task(report_progress())
+    try:
+        await run_bulk(
+            names,
+            act,
+            concurrency=config.bulk_concurrency,
+            dependencies=dependency_map(_dependency_keys(config)),
+            reverse=verb == "stop",
+            on_result=on_result,
+        )
+    finally:
+        reporter.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reporter
+        for env in {split_key(key)[1] for key in names}:
+            _cache(context).invalidate(_env_id(config, env))
+    failed = [r.name for r in results.values() if not r.ok]
+    if failed:
+        log.error("Bulk %s failed for: %s", verb, ", ".join(failed))
+    try:
+        await _safe_edit(
+            context,
+            target,
+            render_bulk(verb, names, results, done=True),
+            back_to_list_keyboard(),
+        )
+    except TelegramError as exc:
+        log.warning("Bulk summary edit failed: %s", exc)
+
+
+def _dependency_keys(config: Config) -> list[tuple[str, str]]:
+    """STACK_DEPENDENCIES apply within each env where both stacks exist."""
+    pairs = []
+    for env_id, allowed in config.environments.items():
+        env = "" if env_id == config.dockhand_env else env_id
+        for dependent, dependency in config.stack_dependencies:
+            if dependent in allowed and dependency in allowed:
+                pairs.append((stack_key(dependent, env), stack_key(dependency, env)))
+    return pairs
+
+
+def _start_bulk(
+    target: CallbackQuery | Message,
+    context: ContextTypes.DEFAULT_TYPE,
+    verb: str,
+    names: Sequence[str],
+    user: User | None,
+) -> None:
+    """Run a bulk action in the background; the handler returns at once."""
+    _executor(context).spawn(
+        _run_bulk(target, context, verb, names, user), f"bulk-{verb}"
+    )
+
+
+async def _show_selection(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    selected: set[str],
+    view: ListView,
+) -> None:
+    """The multi-select over the list page ``view`` shows; only that
+    page's stacks are fetched."""
+    stacks, _, view, pages = await fetch_page(context.bot_data, view)
+    state = ("select", tuple(stacks), frozenset(selected), view, pages)
+    await _edit(
+        context,
         query,
-        f"⏳ {wording} <b>{html.escape(name)}</b>…",
-        None,  # no buttons while the action runs: prevents double-taps
+        _renders(context).view(
+            state,
+            lambda: (
+                "<b>Restart</b> — pick the stacks, then confirm.",
+                bulk_select_keyboard(stacks, selected, view, pages),
+            ),
+        ),
     )
-    await asyncio.to_thread(_client(context).stack_action, name, verb)
-    await _show_detail(query, context, name)
 
 
+async def _on_bulk(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    action: Action,
+    key: str,
+    view: ListView,
+) -> None:
+    if action is Action.START_STOPPED:
+        stacks = await _fetch_stacks(context, fresh=True)
+        stopped = [s.key for s in stacks if s.status is StackStatus.STOPPED]
+        if not stopped:
+            await _safe_edit(
+                context, query, "Nothing is stopped.", back_to_list_keyboard()
+            )
+            return
+        _start_bulk(query, context, "start", stopped, query.from_user)
+        return
+
+    # Kept across pages of the multi-select.
+    selected = _selection(query, context)
+    if action is Action.SELECT:
+        selected.clear()
+    elif action is Action.TOGGLE:
+        selected.symmetric_difference_update({key})
+    elif action is Action.RESTART_SELECTED and selected:
+        names = [k for k in _allowlist(context).keys if k in selected]
+        selected.clear()
+        _start_bulk(query, context, "restart", names, query.from_user)
+        return
+    await _show_selection(query, context, selected, view)
+
+
+async def _bulk_command(
+    message: Message, context: ContextTypes.DEFAULT_TYPE, args: Sequence[str]
+) -> None:
+    """/docker <verb> a,b@2,c — stack keys validated against the allowlist."""
+    verb = args[0].lower()
+    names = list(dict.fromkeys(n.strip() for n in ",".join(args[1:]).split(",")))
+    names = [n for n in names if n]
+    if verb not in _WORDING or not names:
+        await _reply(context, message, _BULK_USAGE)
+        return
+    unknown = [n for n in names if n not in _allowlist(context)]
+    if unknown:
+        await _reply(context, message, f"⚠️ Not allowlisted: {', '.join(unknown)}")
+        return
+    progress = await _reply(
+        context, message, render_bulk(verb, names, {}), parse_mode=ParseMode.HTML
+    )
+    _start_bulk(progress, context, verb, names, message.from_user)
+
+
+@_timed("/ping")
 async def cmd_ping(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.effective_message
     if message is None:  # CommandHandler always carries one
         return
-    await message.reply_text("Pong")
+    await _reply(context, message, "Pong")
 
 
+@_timed("/docker")
 async def cmd_docker(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.effective_message
     if message is None:  # CommandHandler always carries one
         return
+    args = context.args or []
+    if len(args) > 1 or (args and args[0].lower() in _WORDING):
+        await _bulk_command(message, context, args)
+        return
+    view = FIRST_PAGE
+    if args:  # /docker <prefix>
+        prefix = args[0]
+        if len(prefix.encode()) > MAX_PREFIX_BYTES or SEP in prefix:
+            await _reply(
+                context,
+                message,
+                f"⚠️ Search prefix must be at most {MAX_PREFIX_BYTES} bytes"
+                f" and not contain {SEP!r}.",
+            )
+            return
+        view = ListView(prefix=prefix)
     try:
-        stacks = await _fetch_stacks(context)
+        stacks, failed, view, pages = await fetch_page(context.bot_data, view)
     except (DockhandError, ValueError) as exc:
         log.error("/docker failed: %s", exc)
-        await message.reply_text(f"⚠️ {exc}")
+        await _reply(context, message, f"⚠️ {exc}")
         return
-    await message.reply_text(
-        render_list(stacks),
-        reply_markup=stack_list_keyboard(stacks),
+    await _reply(
+        context,
+        message,
+        render_list(stacks, failed, view),
+        reply_markup=stack_list_keyboard(stacks, view, pages),
         parse_mode=ParseMode.HTML,
     )
 
 
+@_timed("/logs")
+async def cmd_logs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/logs <stack> [container] [lines]"""
+    message = update.effective_message
+    if message is None:  # CommandHandler always carries one
+        return
+    args = list(context.args or [])
+    lines = _config(context).logs_tail
+    if len(args) > 1 and args[-1].isdigit():
+        lines = min(int(args.pop()), MAX_LOG_TAIL)
+    if not 1 <= len(args) <= 2 or not lines:
+        await _reply(context, message, _LOGS_USAGE)
+        return
+    key, name = args[0], args[1] if len(args) > 1 else ""
+    if key not in _allowlist(context):
+        await _reply(context, message, f"⚠️ Not an allowed stack: {key}")
+        return
+    try:
+        stack = await _fetch_stack(context, key)
+        if stack is None:
+            await _reply(context, message, f"⚠️ Stack {key} not found in Dockhand.")
+            return
+        container = (
+            _container_named(stack, name) if name else _default_container(stack)
+        )
+        if container is None:
+            names = ", ".join(c.name for c in stack.containers) or "none"
+            await _reply(
+                context,
+                message,
+                f"⚠️ No container {name!r} in {key} (containers: {names})"
+                if name
+                else f"⚠️ {key} has no containers.",
+            )
+            return
+        await _send_logs(context, message, stack, container, lines)
+    except (DockhandError, ValueError) as exc:
+        log.error("/logs failed: %s", exc)
+        await _reply(context, message, f"⚠️ {exc}")
+
+
+def render_history(
+    key: str,
+    actions: Sequence[ActionRecord],
+    changes: Sequence[StateRecord],
+    tz: dt.tzinfo | None = None,
+    *,
+    recording: bool = True,
+) -> str:
+    """Latest actions and status changes, newest first, in local time
+    (``tz`` for tests). ``recording``: whether anything records states
+    (polling or the event stream)."""
+    lines = [f"🕓 <b>{html.escape(key)}</b> — history", "", "<b>Actions</b>"]
+    for a in actions:
+        outcome = "✅" if a.error is None else f"❌ {html.escape(a.error[:40])}"
+        lines.append(
+            f"{_when(a.at, tz)} {a.verb} {outcome} · {a.seconds:.0f}s · "
+            f"{html.escape(a.user[:32])}"
+        )
+    if not actions:
+        lines.append("<i>none recorded</i>")
+    lines += ["", "<b>Status changes</b>"]
+    for c in changes:
+        # Rows outlive code: a status this version lacks gets a plain dot.
+        dot = _DOT_BY_STATUS.get(c.status, "⚪")
+        lines.append(f"{_when(c.at, tz)} {dot} {c.status} ({c.running}/{c.total})")
+    if not changes and recording:
+        lines.append("<i>none recorded</i>")
+    elif not changes:
+        lines.append("<i>not recorded: set POLL_INTERVAL or DOCKHAND_EVENTS</i>")
+    return "\n".join(lines)
+
+
+@_timed("/history")
+async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/history <stack> [entries]"""
+    message = update.effective_message
+    if message is None:  # CommandHandler always carries one
+        return
+    args = list(context.args or [])
+    entries = _HISTORY_ENTRIES
+    if len(args) == 2 and args[1].isdigit():
+        entries = min(int(args.pop()), _MAX_HISTORY_ENTRIES)
+    if len(args) != 1 or not entries:
+        await _reply(context, message, _HISTORY_USAGE)
+        return
+    key = args[0]
+    if key not in _allowlist(context):
+        await _reply(context, message, f"⚠️ Not an allowed stack: {key}")
+        return
+    history = _history(context)
+    if history is None:
+        await _reply(context, message, "History is off: set HISTORY_DB to keep it.")
+        return
+    actions, changes = await asyncio.gather(
+        history.actions(key, entries), history.changes(key, entries)
+    )
+    await _reply(
+        context,
+        message,
+        render_history(
+            key,
+            actions,
+            changes,
+            recording="poller" in context.bot_data or "events" in context.bot_data,
+        ),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+def _describe(schedule: Schedule) -> str:
+    what = f"{schedule.verb} <b>{html.escape(schedule.stack)}</b>"
+    if schedule.cron is None:
+        return f"{what} once"
+    return f"{what} at <code>{html.escape(schedule.cron.expr)}</code>"
+
+
+def render_schedules(
+    schedules: Sequence[Schedule],
+    tz: dt.tzinfo | None = None,
+    limit: int = _SCHEDULES_LISTED,
+) -> str:
+    """Soonest first, at most ``limit`` of them, next run in local time
+    (``tz`` for tests)."""
+    if not schedules:
+        return "⏰ No schedules. Add one with /schedule add."
+    lines = [f"⏰ <b>Schedules</b> ({len(schedules)}), soonest first"]
+    for s in schedules[:limit]:
+        lines.append(
+            f"#{s.id} {_when(s.due, tz)} {_describe(s)} · {html.escape(s.user[:32])}"
+        )
+    if len(schedules) > limit:
+        lines.append(f"… and {len(schedules) - limit} more")
+    return "\n".join(lines)
+
+
+async def _schedule_add(
+    message: Message,
+    context: ContextTypes.DEFAULT_TYPE,
+    scheduler: Scheduler,
+    args: Sequence[str],
+) -> None:
+    key, verb = args[0], args[1].lower()
+    if key not in _allowlist(context):
+        await _reply(context, message, f"⚠️ Not an allowed stack: {key}")
+        return
+    if verb not in _WORDING:
+        await _reply(context, message, f"⚠️ Not an action: {verb}\n\n{_SCHEDULE_USAGE}")
+        return
+    try:
+        when = parse_when(args[2:])
+        schedule = await scheduler.add(
+            key, verb, when, chat_id=message.chat_id, user=_who(message.from_user)
+        )
+    except ValueError as exc:
+        await _reply(context, message, f"⚠️ {exc}")
+        return
+    except sqlite3.Error as exc:
+        log.error("Saving a schedule failed: %s", exc)
+        await _reply(context, message, f"⚠️ Could not save the schedule: {exc}")
+        return
+    await _reply(
+        context,
+        message,
+        f"⏰ Scheduled #{schedule.id}: {_describe(schedule)}, "
+        f"next {_when(schedule.due)}",
+        parse_mode=ParseMode.HTML,
+    )
+
+
+@_timed("/schedule")
+async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/schedule add <stack> <verb> <when> | list [stack] | cancel <id>"""
+    message = update.effective_message
+    if message is None:  # CommandHandler always carries one
+        return
+    scheduler = _scheduler(context)
+    if scheduler is None:
+        await _reply(context, message, "Scheduling is off: set SCHEDULE_DB to use it.")
+        return
+    args = list(context.args or [])
+    sub = args[0].lower() if args else ""
+    if sub == "add" and len(args) >= 4:
+        await _schedule_add(message, context, scheduler, args[1:])
+    elif sub == "list" and len(args) <= 2:
+        schedules = scheduler.schedules()
+        if len(args) == 2:
+            schedules = [s for s in schedules if s.stack == args[1]]
+        await _reply(
+            context, message, render_schedules(schedules), parse_mode=ParseMode.HTML
+        )
+    elif sub == "cancel" and len(args) == 2 and args[1].lstrip("#").isdigit():
+        try:
+            schedule = await scheduler.cancel(int(args[1].lstrip("#")))
+        except sqlite3.Error as exc:
+            log.error("Cancelling a schedule failed: %s", exc)
+            await _reply(context, message, f"⚠️ Could not cancel: {exc}")
+            return
+        text = (
+            f"🗑 Cancelled #{schedule.id}: {_describe(schedule)}"
+            if schedule is not None
+            else f"⚠️ No schedule {html.escape(args[1])}"
+        )
+        await _reply(context, message, text, parse_mode=ParseMode.HTML)
+    else:
+        await _reply(context, message, _SCHEDULE_USAGE)
+
+
+async def _notify(bot_data: dict[str, Any], bot: Bot, chat_id: int, text: str) -> None:
+    outbox: Outbox = bot_data["outbox"]
+    call = _call(
+        "send_message", bot.send_message, chat_id, text, parse_mode=ParseMode.HTML
+    )
+    try:
+        await outbox.send(chat_id, call)
+    except TelegramError as exc:
+        log.error("Notification to chat_id=%s failed: %s", chat_id, exc)
+
+
+async def run_scheduled(bot_data: dict[str, Any], bot: Bot, schedule: Schedule) -> None:
+    """Run a due schedule's action, queued behind any action in flight on
+    the stack, and report the outcome to the chat that scheduled it."""
+    key, verb = schedule.stack, schedule.verb
+    allowlist: Allowlist = bot_data["allowlist"]
+    if key not in allowlist:  # ALLOWED_STACKS changed since it was added
+        await _notify(
+            bot_data,
+            bot,
+            schedule.chat_id,
+            f"⚠️ Schedule #{schedule.id}: {html.escape(key)} is no longer an "
+            "allowed stack; skipped.",
+        )
+        return
+    name, env = split_key(key)
+    executor: ActionExecutor = bot_data["executor"]
+    started = time.time()
+    outcome = await executor.run(name, verb, env=env)
+    cache: TTLCache[Hashable, Any] = bot_data["cache"]
+    cache.invalidate(_env_id(bot_data["config"], env))
+    user = f"schedule #{schedule.id}"
+    _audit(bot_data, key, verb, user, schedule.chat_id, started, outcome.error)
+    result = (
+        "✅ done" if outcome.error is None else f"❌ {html.escape(outcome.error)}"
+    )
+    await _notify(
+        bot_data,
+        bot,
+        schedule.chat_id,
+        f"⏰ Schedule #{schedule.id}: {_describe(schedule)} — {result}",
+    )
+
+
+async def report_missed(
+    bot_data: dict[str, Any], bot: Bot, schedule: Schedule, late: float
+) -> None:
+    """Tell the chat that scheduled it that a run was skipped as overdue."""
+    await _notify(
+        bot_data,
+        bot,
+        schedule.chat_id,
+        f"⏭ Schedule #{schedule.id}: {_describe(schedule)} was due "
+        f"{_when(schedule.due)}, {_duration(late)} ago (the bot was down); "
+        "skipped.",
+    )
+
+
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if query is None:  # CallbackQueryHandler always carries one
         return
     try:
-        action, stack_name = decode(query.data, _config(context).allowed_stacks)
+        action, key, view, container = decode(query.data, _allowlist(context))
     except CallbackError as exc:
         chat = update.effective_chat
+        CALLBACK_REJECTED.inc()
         log.warning(
             "Rejected callback from chat_id=%s: %s", chat.id if chat else "?", exc
         )
-        await query.answer("Expired or invalid — send /docker", show_alert=True)
+        await _answer(
+            context, query, "Expired or invalid — send /docker", show_alert=True
+        )
         return
+    with HANDLER_SECONDS.time(action=action.value):
+        await _dispatch(query, context, action, key, view, container)
+
 
-    await query.answer()
+async def _dispatch(
+    query: CallbackQuery,
+    context: ContextTypes.DEFAULT_TYPE,
+    action: Action,
+    key: str,
+    view: ListView = FIRST_PAGE,
+    container: str = "",
+) -> None:
+    if action in _ACTIONS:  # START, CONFIRM_STOP, RESTART — validated by decode()
+        await _run_action(query, context, action, key)
+        return
+    if action is Action.FOLLOW:
+        await _toggle_follow(query, context, key, container)
+        return
+    await _answer(context, query)
     try:
         if action is Action.LIST:
-            await _show_list(query, context)
+            await _show_list(query, context, view)
         elif action is Action.SHOW:
-            await _show_detail(query, context, stack_name)
+            await _show_detail(query, context, key)
+        elif action is Action.REFRESH:
+            if key:
+                await _show_detail(query, context, key, fresh=True)
+            else:
+                await _show_list(query, context, view, fresh=True)
+        elif action is Action.CONTAINER:
+            await _show_container(query, context, key, container)
+        elif action is Action.LOGS:
+            await _show_logs(query, context, key, container)
         elif action is Action.STOP:
             await _safe_edit(
+                context,
                 query,
-                f"Stop <b>{html.escape(stack_name)}</b>?",
-                confirm_stop_keyboard(stack_name),
+                f"Stop <b>{html.escape(key)}</b>?",
+                confirm_stop_keyboard(key),
             )
         elif action is Action.EXIT:
-            await query.delete_message()
-        else:  # START, CONFIRM_STOP, RESTART — validated by decode()
-            await _run_action(query, context, action, stack_name)
+            await _outbox(context).send(
+                _chat_id(query),
+                _call("delete_message", query.delete_message),
+                kind="delete",
+                collapse=message_key(query),
+            )
+            _renders(context).forget(message_key(query))
+        else:  # START_STOPPED, SELECT, TOGGLE, RESTART_SELECTED, SELECT_PAGE
+            await _on_bulk(query, context, action, key, view)
     except (DockhandError, ValueError) as exc:
         log.error("Callback %r failed: %s", query.data, exc)
         await _safe_edit(
+            context,
             query,
             f"⚠️ {html.escape(str(exc))}\n\nSend /docker to reload.",
             None,
@@ -0,0 +1,268 @@
+"""Persistent audit log of stack actions and history of stack states.
+
+One SQLite file. Writes never touch the event loop: handlers and the
+poller put rows on a bounded queue, and one writer thread commits
+whatever has queued up in a single transaction. Reads for /history run
+in a worker thread on their own connection; WAL mode lets them proceed
+while the writer commits.
+
+States are recorded from polled snapshots and from the event stream's
+changes: a row whenever a stack's status or running count changes, plus a keyframe every
+``KEYFRAME_EVERY`` seconds of no change. Changes are flagged, so a
+partial index serves "latest changes of a stack" without scanning
+keyframes. Both tables are indexed by (stack, at) and pruned past the
+retention period.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Mapping
+from typing import Any, NamedTuple
+
+from bot.metrics import HISTORY_DROPPED, HISTORY_WRITE_SECONDS
+from bot.stacks import Stack
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    stack TEXT NOT NULL,
+    verb TEXT NOT NULL,
+    user_id INTEGER,
+    user TEXT NOT NULL,
+    chat_id INTEGER,
+    seconds REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS actions_stack_at ON actions (stack, at);
+CREATE INDEX IF NOT EXISTS actions_at ON actions (at);
+CREATE TABLE IF NOT EXISTS states (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    stack TEXT NOT NULL,
+    status TEXT NOT NULL,
+    running INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    changed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS states_stack_at ON states (stack, at);
+CREATE INDEX IF NOT EXISTS states_changes ON states (stack, at) WHERE changed;
+CREATE INDEX IF NOT EXISTS states_at ON states (at);
+"""
+_INSERT = {
+    "actions": "INSERT INTO actions "
+    "(at, stack, verb, user_id, user, chat_id, seconds, error) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    "states": "INSERT INTO states (at, stack, status, running, total, changed) "
+    "VALUES (?, ?, ?, ?, ?, ?)",
+}
+_Row = tuple[str, tuple[object, ...]]  # (table, values)
+
+
+class ActionRecord(NamedTuple):
+    at: float  # unix time the action was requested
+    verb: str
+    user: str
+    seconds: float
+    error: str | None
+
+
+class StateRecord(NamedTuple):
+    at: float
+    status: str
+    running: int
+    total: int
+
+
+class HistoryStore:
+    KEYFRAME_EVERY = 900.0  # seconds between rows of an unchanged stack
+    PRUNE_EVERY = 3600.0
+    MAX_QUEUED = 10_000  # rows; beyond that new rows are dropped
+    BATCH = 1000  # rows per transaction, at most
+
+    def __init__(
+        self,
+        path: str,
+        retention_days: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._path = path
+        self._retention = retention_days * 86400
+        self._clock = clock
+        self._queue: queue.Queue[_Row | None] = queue.Queue(self.MAX_QUEUED)
+        self._writer: threading.Thread | None = None
+        self._reader: sqlite3.Connection | None = None
+        self._read_lock = threading.Lock()
+        # stack key -> (status, running, total, at) of its last state row
+        self._last: dict[str, tuple[str, int, int, float]] = {}
+
+    async def start(self) -> None:
+        """Create the schema, load each stack's last state and start the
+        writer thread."""
+        await asyncio.to_thread(self._setup)
+        self._writer = threading.Thread(
+            target=self._write_loop, name="history-writer", daemon=True
+        )
+        self._writer.start()
+
+    async def aclose(self) -> None:
+        """Commit what is queued, then stop the writer."""
+        if self._writer is not None:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:  # waits for the writer, off the event loop
+                await asyncio.to_thread(self._queue.put, None)
+            await asyncio.to_thread(self._writer.join)
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def record_action(
+        self,
+        stack: str,
+        verb: str,
+        *,
+        user: str,
+        user_id: int | None,
+        chat_id: int | None,
+        started: float,
+        seconds: float,
+        error: str | None = None,
+    ) -> None:
+        """Queue one action's outcome; ``started`` is unix time."""
+        row = (started, stack, verb, user_id, user, chat_id, seconds, error)
+        self._put(("actions", row))
+
+    def record_states(self, snapshot: Mapping[str, Stack]) -> None:
+        """Queue the stacks whose state changed, and keyframes for those
+        unchanged for KEYFRAME_EVERY. Costs a tuple comparison per stack."""
+        now = self._clock()
+        for key, stack in snapshot.items():
+            running = sum(1 for c in stack.containers if c.state == "running")
+            state = (stack.status.value, running, len(stack.containers))
+            last = self._last.get(key)
+            changed = last is None or last[:3] != state
+            if last is not None and not changed and now - last[3] < self.KEYFRAME_EVERY:
+                continue
+            self._last[key] = (*state, now)
+            self._put(("states", (now, key, *state, int(changed))))
+
+    async def actions(self, stack: str, limit: int) -> list[ActionRecord]:
+        """The stack's latest actions, newest first."""
+        rows = await self._read(
+            "SELECT at, verb, user, seconds, error FROM actions "
+            "WHERE stack = ? ORDER BY at DESC LIMIT ?",
+            (stack, limit),
+        )
+        return [ActionRecord(*row) for row in rows]
+
+    async def changes(self, stack: str, limit: int) -> list[StateRecord]:
+        """The stack's latest state changes, newest first."""
+        rows = await self._read(
+            "SELECT at, status, running, total FROM states "
+            "WHERE stack = ? AND changed ORDER BY at DESC LIMIT ?",
+            (stack, limit),
+        )
+        return [StateRecord(*row) for row in rows]
+
+    def _put(self, row: _Row) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            HISTORY_DROPPED.inc()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _setup(self) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executescript(_SCHEMA)
+            self._prune(conn)
+            # One row per stack: SQLite takes the bare columns from the
+            # row holding MAX(at).
+            for key, status, running, total, at in conn.execute(
+                "SELECT stack, status, running, total, MAX(at) FROM states "
+                "GROUP BY stack"
+            ):
+                self._last[key] = (status, running, total, at)
+        finally:
+            conn.close()
+        self._reader = self._connect()
+
+    async def _read(self, sql: str, params: tuple[object, ...]) -> list[Any]:
+        def query() -> list[Any]:
+            if self._reader is None:
+                raise RuntimeError("history store is not started")
+            with self._read_lock:
+                return self._reader.execute(sql, params).fetchall()
+
+        return await asyncio.to_thread(query)
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        next_prune = time.monotonic() + self.PRUNE_EVERY
+        stop = False
+        try:
+            while not stop:
+                batch: list[_Row] = []
+                try:
+                    timeout = max(0.0, next_prune - time.monotonic())
+                    row = self._queue.get(timeout=timeout)
+                    # Then whatever else is queued, in the same transaction.
+                    while True:
+                        if row is None:
+                            stop = True
+                            break
+                        batch.append(row)
+                        if len(batch) >= self.BATCH:
+                            break
+                        row = self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                if batch:
+                    self._write(conn, batch)
+                if time.monotonic() >= next_prune:
+                    self._prune(conn)
+                    next_prune = time.monotonic() + self.PRUNE_EVERY
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: list[_Row]) -> None:
+        start = time.perf_counter()
+        try:
+            with conn:
+                for table, values in batch:
+                    conn.execute(_INSERT[table], values)
+        except sqlite3.Error:
+            log.exception("Writing %d history rows failed", len(batch))
+        HISTORY_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = self._clock() - self._retention
+        try:
+            with conn:
+                pruned = sum(
+                    conn.execute(f"DELETE FROM {t} WHERE at < ?", (cutoff,)).rowcount
+                    for t in _INSERT
+                )
+        except sqlite3.Error:
+            log.exception("Pruning history failed")
+            return
+        if pruned:
+            log.info("Pruned %d history rows older than the retention", pruned)
@@ -0,0 +1,99 @@
+"""Webhook ingress: a duplicate filter in front of a bounded backlog.
+
+Telegram redelivers an update when it gets no 2xx answer in time, and a
+redelivered button tap would run its action twice. Each delivery here
+is answered as soon as its update is admitted; the update is processed
+in the background, as PTB's own update fetcher does, and still in order
+per chat (see bot.updates).
+
+- Duplicates: an update whose update id or callback query id was
+  admitted in the last SEEN_TTL seconds is acknowledged and dropped. At
+  most SEEN_SIZE ids are remembered; the least recently seen go first.
+- Backlog: at most ``max_pending`` admitted updates may be unfinished.
+  Past that, deliveries are shed with a 503. Telegram keeps a shed
+  update and redelivers it later, backing off as it does, which is the
+  backpressure. Shed updates are not remembered, so their redelivery is
+  admitted.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable
+from enum import Enum
+
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from bot.cache import LRU
+from bot.metrics import WEBHOOK_UPDATES
+
+log = logging.getLogger(__name__)
+
+
+class Admission(Enum):
+    ACCEPTED = "accepted"
+    DUPLICATE = "duplicate"
+    SHED = "shed"
+
+
+class UpdateIngress:
+    SEEN_SIZE = 20_000  # update and callback query ids together
+    SEEN_TTL = 3600.0  # seconds
+
+    def __init__(
+        self,
+        app: Application,
+        max_pending: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._app = app
+        self.max_pending = max_pending
+        self._clock = clock
+        self._seen: LRU[tuple[str, int | str], float] = LRU(self.SEEN_SIZE)
+        self.pending = 0  # admitted, not yet finished
+
+    @property
+    def bot(self) -> Bot:
+        return self._app.bot
+
+    def offer(self, update: Update) -> Admission:
+        """Admit ``update`` for processing, unless it is a duplicate or
+        the backlog is full."""
+        now = self._clock()
+        keys: list[tuple[str, int | str]] = [("update", update.update_id)]
+        if update.callback_query is not None:
+            keys.append(("callback", update.callback_query.id))
+        if any(self._seen_since(key, now - self.SEEN_TTL) for key in keys):
+            WEBHOOK_UPDATES.inc(result=Admission.DUPLICATE.value)
+            log.info("Dropped redelivered update %d", update.update_id)
+            return Admission.DUPLICATE
+        if self.pending >= self.max_pending:
+            WEBHOOK_UPDATES.inc(result=Admission.SHED.value)
+            return Admission.SHED
+        for key in keys:
+            self._seen.put(key, now)
+        self.pending += 1
+        self._app.create_task(
+            self._process(update), update=update, name="webhook-update"
+        )
+        WEBHOOK_UPDATES.inc(result=Admission.ACCEPTED.value)
+        return Admission.ACCEPTED
+
+    def _seen_since(self, key: tuple[str, int | str], since: float) -> bool:
+        at = self._seen.get(key)
+        if at is None:
+            return False
+        if at < since:
+            self._seen.pop(key)
+            return False
+        return True
+
+    async def _process(self, update: Update) -> None:
+        app = self._app
+        try:
+            await app.update_processor.process_update(
+                update, app.process_update(update)
+            )
+        finally:
+            self.pending -= 1
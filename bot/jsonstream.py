@@ -0,0 +1,161 @@
+"""Incremental splitter for a top-level JSON array of objects.
+
+Feeds on raw byte chunks and yields each object element that has a
+top-level ``"name"`` string as ``(name, raw_bytes)``. Nothing is decoded
+beyond that name: callers ``json.loads`` only what they keep, and an
+element whose name is already known to be unwanted is dropped as it
+streams past instead of being buffered.
+
+Only structure is tracked, not full JSON grammar: malformed input may
+yield elements that later fail ``json.loads``, or raise ``ValueError``.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Callable, Iterator
+
+# While an element's name is unknown every string, ',' and ':' matters.
+_STRUCT_KEYS = re.compile(rb'["{}\[\],:]')
+# Remainder of a string whose opening quote has been consumed.
+_STRING_TAIL = re.compile(rb'[^"\\]*+(?:\\.[^"\\]*+)*+"', re.DOTALL)
+
+
+def _skip_pattern(levels: int) -> re.Pattern[bytes]:
+    """Whole strings, plain bytes and bracket groups nested up to
+    ``levels`` deep. Quantifiers are possessive so a group cut off by the
+    end of the buffer fails fast instead of backtracking; bracket kinds
+    are not paired up, which only matters for input json.loads rejects."""
+    string = rb'"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+    plain = rb'[^"{}\[\]]++'
+    atom = string + b"|" + plain
+    for _ in range(levels):
+        atom = rb"%s|%s|[{\[](?:%s)*+[}\]]" % (string, plain, atom)
+    return re.compile(rb"(?:%s)*+" % atom, re.DOTALL)
+
+
+# Once an element's name is known only depth matters: swallow everything
+# up to the next bracket that changes it (or an unterminated string) in
+# one C-level match. Three levels cover a whole "containerDetails" list.
+_TO_BRACKET = _skip_pattern(3)
+# Between elements every bracket starts or ends one.
+_TO_ELEMENT = _skip_pattern(0)
+_NAME_KEY = b'"name"'
+
+
+class ArraySplitter:
+    def __init__(self, wanted: Callable[[str], bool] = lambda name: True) -> None:
+        self._wanted = wanted
+        self._buf = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._finished = False
+        # Per-element state; depth 1 is the array, 2 the element's object.
+        self._start: int | None = None
+        self._name: str | None = None
+        self._seeking_name = False
+        self._skipping = False
+        self._last_string: bytes | None = None
+        self._pending_key: bytes | None = None
+
+    def feed(self, chunk: bytes) -> Iterator[tuple[str, bytes]]:
+        self._buf += chunk
+        yield from self._scan()
+        self._compact()
+
+    def close(self) -> None:
+        if not self._finished:
+            raise ValueError("truncated JSON array")
+
+    def _scan(self) -> Iterator[tuple[str, bytes]]:
+        buf = self._buf
+        if not self._started:
+            stripped = bytes(buf).lstrip()
+            if not stripped:
+                return
+            if stripped[:1] != b"[":
+                raise ValueError("expected a JSON array")
+            self._pos = len(buf) - len(stripped) + 1
+            self._depth = 1
+            self._started = True
+
+        while not self._finished:
+            if self._seeking_name:
+                match = _STRUCT_KEYS.search(buf, self._pos)
+                pos = len(buf) if match is None else match.start()
+            else:
+                skip = _TO_BRACKET if self._depth > 1 else _TO_ELEMENT
+                match = skip.match(buf, self._pos)
+                pos = len(buf) if match is None else match.end()
+            if pos == len(buf):
+                self._pos = pos
+                return
+            char = buf[pos]
+            if char == ord('"'):
+                end = _STRING_TAIL.match(buf, pos + 1)
+                if end is None:  # string continues in the next chunk
+                    self._pos = pos
+                    return
+                self._pos = end.end()
+                if self._seeking_name and self._depth == 2:
+                    self._on_string(bytes(buf[pos : self._pos]))
+                continue
+
+            self._pos = pos + 1
+            if char in b"{[":
+                self._depth += 1
+                if self._depth == 2:
+                    self._begin_element(pos, is_object=char == ord("{"))
+            elif char in b"}]":
+                self._depth -= 1
+                if self._depth == 1 and self._start is not None:
+                    element = self._end_element()
+                    if element is not None:
+                        yield element
+                elif self._depth == 0:
+                    self._finished = True
+            elif self._depth == 2:
+                if char == ord(":"):
+                    self._pending_key = self._last_string
+                else:  # ','
+                    self._pending_key = None
+                self._last_string = None
+
+    def _begin_element(self, pos: int, *, is_object: bool) -> None:
+        self._start = pos
+        self._name = None
+        self._seeking_name = is_object
+        self._skipping = not is_object  # arrays are never stack entries
+        self._last_string = self._pending_key = None
+
+    def _on_string(self, token: bytes) -> None:
+        if self._pending_key == _NAME_KEY:
+            self._name = json.loads(token)
+            self._seeking_name = False
+            if not self._wanted(self._name):
+                self._skipping = True
+        else:
+            self._last_string = token
+        self._pending_key = None
+
+    def _end_element(self) -> tuple[str, bytes] | None:
+        start, name, skipping = self._start, self._name, self._skipping
+        self._start = None
+        self._seeking_name = self._skipping = False
+        if skipping or name is None or start is None:
+            return None
+        return name, bytes(self._buf[start : self._pos])
+
+    def _compact(self) -> None:
+        """Drop consumed bytes; an element being skipped keeps none of its body."""
+        if self._start is None:
+            cut = self._pos
+        elif self._skipping:
+            cut = self._pos
+            self._start = 0
+        else:
+            cut = self._start
+            self._start = 0
+        del self._buf[:cut]
+        self._pos -= cut
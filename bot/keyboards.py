@@ -1,19 +1,44 @@
 """Inline keyboards and the callback-data codec.
 
-Callback data format: ``<action>|<stack>``. Telegram callback data is
-client-forgeable, so ``decode`` is the security boundary: unknown actions
-and non-allowlisted stacks are rejected with ``CallbackError``.
+Callback data format (version 2): ``2<action code><stack id>``, where the
+action code is one character and the stack id is a fixed-width hash of
+the stack key (the stack name, or ``name@env`` outside the default
+Dockhand env). Ids are stable across restarts and allowlist edits, and
+the data stays 10 bytes whatever the name length. List and multi-select
+buttons append ``:<filter><page>[,<prefix>]`` for the page, status
+filter and search prefix they show; container buttons append
+``:<container id>``, the same hash of the container name.
+
+Buttons sent before version 2 carry ``<action>|<stack key>``; ``decode``
+still accepts them. Telegram callback data is client-forgeable, so
+``decode`` is the security boundary: unknown actions and stacks not in
+the allowlist are rejected with ``CallbackError``.
 """
 from __future__ import annotations
 
-from collections.abc import Sequence
+import base64
+import hashlib
+import re
+from collections.abc import Collection, Iterable, Sequence
+from dataclasses import dataclass, replace
 from enum import StrEnum
+from typing import NamedTuple
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from bot.stacks import STATUS_DOT, Stack, StackStatus
 
-SEP = "|"
+VERSION = "2"
+SEP = "|"  # version 1 separator
+STACK_ID_LEN = 8
+VIEW_SEP = ":"
+# Longest /docker search prefix; keeps list buttons within Telegram's
+# 64-byte callback data.
+MAX_PREFIX_BYTES = 32
+# Container buttons on a stack's detail view. Telegram allows 100 buttons
+# per keyboard; actions, Refresh and Back take five.
+_MAX_CONTAINER_BUTTONS = 90
+_CONTAINERS_PER_ROW = 2
 
 
 class Action(StrEnum):
@@ -23,71 +48,383 @@ class Action(StrEnum):
     STOP = "stop"  # asks for confirmation
     CONFIRM_STOP = "cstop"  # actually stops
     RESTART = "restart"
+    REFRESH = "refresh"  # LIST or SHOW bypassing the stack cache
     EXIT = "exit"
+    START_STOPPED = "sall"  # bulk: start every stopped stack
+    SELECT = "select"  # bulk: open the restart multi-select
+    TOGGLE = "toggle"  # bulk: flip one stack in the selection
+    RESTART_SELECTED = "rsel"  # bulk: restart the selection
+    SELECT_PAGE = "spage"  # bulk: another page of the multi-select
+    CONTAINER = "ctr"  # one container's resource stats
+    LOGS = "logs"  # a container's log tail, as new messages
+    FOLLOW = "follow"  # start or stop live-editing a log message
+
+
+# Actions whose callback data never names a stack.
+_NO_STACK = frozenset(
+    {
+        Action.LIST,
+        Action.EXIT,
+        Action.START_STOPPED,
+        Action.SELECT,
+        Action.RESTART_SELECTED,
+        Action.SELECT_PAGE,
+    }
+)
+
+
+# Actions that render a list page, or the multi-select over one, so may
+# carry a ListView. Of these only TOGGLE also names a stack.
+_LIST_VIEWS = frozenset(
+    {
+        Action.LIST,
+        Action.REFRESH,
+        Action.SELECT,
+        Action.TOGGLE,
+        Action.RESTART_SELECTED,
+        Action.SELECT_PAGE,
+    }
+)
+# Actions on one container of a stack; LOGS may leave the choice to the
+# handler.
+_CONTAINER_ACTIONS = frozenset({Action.CONTAINER, Action.LOGS, Action.FOLLOW})
+
+
+class StackFilter(StrEnum):
+    ALL = "a"
+    STOPPED = "s"
+    PARTIAL = "p"
+
+
+# Filter -> the one status it keeps
+FILTER_STATUS = {
+    StackFilter.STOPPED: StackStatus.STOPPED,
+    StackFilter.PARTIAL: StackStatus.PARTIAL,
+}
+_FILTER_LABELS = {
+    StackFilter.ALL: "All",
+    StackFilter.STOPPED: f"{STATUS_DOT[StackStatus.STOPPED]} Stopped",
+    StackFilter.PARTIAL: f"{STATUS_DOT[StackStatus.PARTIAL]} Partial",
+}
+_VIEW = re.compile(r"([asp])(\d{1,4})(?:,(.+))?", re.DOTALL)
+_CONTAINER_ID = re.compile(r"[A-Za-z0-9_-]{8}")  # STACK_ID_LEN chars
+
+
+@dataclass(frozen=True)
+class ListView:
+    """The slice of the stack list a message shows."""
+
+    page: int = 0
+    filter: StackFilter = StackFilter.ALL
+    prefix: str = ""  # /docker <prefix> search on stack keys
+
+    @property
+    def narrowed(self) -> bool:
+        return self.filter is not StackFilter.ALL or bool(self.prefix)
+
+
+FIRST_PAGE = ListView()
+
+
+class Callback(NamedTuple):
+    action: Action
+    key: str  # stack key, "" if the action names none
+    view: ListView = FIRST_PAGE
+    container: str = ""  # container id (see container_id), container actions
+
+
+# One-character action codes; never reuse a code for a different action,
+# buttons already sent keep the old meaning.
+_CODES = {
+    Action.LIST: "l",
+    Action.SHOW: "s",
+    Action.START: "a",
+    Action.STOP: "o",
+    Action.CONFIRM_STOP: "O",
+    Action.RESTART: "r",
+    Action.REFRESH: "f",
+    Action.EXIT: "x",
+    Action.START_STOPPED: "A",
+    Action.SELECT: "e",
+    Action.TOGGLE: "t",
+    Action.RESTART_SELECTED: "R",
+    Action.CONTAINER: "c",
+    Action.LOGS: "g",
+    Action.FOLLOW: "w",
+    Action.SELECT_PAGE: "P",
+}
+_ACTIONS = {code: action for action, code in _CODES.items()}
 
 
 class CallbackError(ValueError):
     """Callback data failed validation."""
 
 
-def encode(action: Action, stack: str = "") -> str:
-    return f"{action.value}{SEP}{stack}"
+def stack_id(key: str) -> str:
+    """Stable short id of a stack key: 48 bits of BLAKE2b, base64url."""
+    digest = hashlib.blake2b(key.encode(), digest_size=6).digest()
+    return base64.urlsafe_b64encode(digest).decode()
+
+
+def container_id(name: str) -> str:
+    """Short id of a container name, hashed like stack ids. Resolved
+    against the stack's current containers, never trusted as a name."""
+    return stack_id(name)
+
+
+class Allowlist:
+    """Allowed stack keys, indexed by key and by stack id for O(1) decode."""
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self.keys = tuple(keys)
+        self._keys = frozenset(self.keys)
+        self._by_id: dict[str, str] = {}
+        for key in self.keys:
+            other = self._by_id.setdefault(stack_id(key), key)
+            if other != key:
+                raise ValueError(f"stack id collision: {key!r} and {other!r}")
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def key_for(self, sid: str) -> str | None:
+        return self._by_id.get(sid)
+
 
+def encode(
+    action: Action,
+    stack: str = "",
+    view: ListView | None = None,
+    *,
+    container: str = "",
+) -> str:
+    """``container`` is a container name, for container actions."""
+    data = f"{VERSION}{_CODES[action]}{stack_id(stack) if stack else ''}"
+    if container:
+        return f"{data}{VIEW_SEP}{container_id(container)}"
+    if view is None or view == FIRST_PAGE:
+        return data
+    prefix = f",{view.prefix}" if view.prefix else ""
+    return f"{data}{VIEW_SEP}{view.filter.value}{view.page}{prefix}"
 
-def decode(data: str | None, allowed_stacks: Sequence[str]) -> tuple[Action, str]:
-    if not data or SEP not in data:
+
+def decode(data: str | None, allowed: Allowlist) -> Callback:
+    """Action, stack key and list view from version 2 or 1 callback data."""
+    if not data:
+        raise CallbackError(f"malformed callback data: {data!r}")
+    if data[0] == VERSION and SEP not in data:
+        action = _ACTIONS.get(data[1:2])
+        if action is None:
+            raise CallbackError(f"unknown action code: {data[1:2]!r}")
+        sid, has_view, raw_view = data[2:].partition(VIEW_SEP)
+        key = ""
+        if sid:
+            found = allowed.key_for(sid) if len(sid) == STACK_ID_LEN else None
+            if found is None:
+                raise CallbackError(f"unknown stack id: {sid!r}")
+            key = found
+            _check_stack(action)
+        else:
+            _check_empty(action)
+        if action in _CONTAINER_ACTIONS and (has_view or action is not Action.LOGS):
+            if not key or not _CONTAINER_ID.fullmatch(raw_view):
+                raise CallbackError(f"malformed container: {raw_view!r}")
+            return Callback(action, key, container=raw_view)
+        if not has_view:
+            return Callback(action, key)
+        if action not in _LIST_VIEWS or (key and action is not Action.TOGGLE):
+            raise CallbackError(f"{action.value} action carries no list view")
+        return Callback(action, key, _parse_view(raw_view))
+    return _decode_v1(data, allowed)
+
+
+def _parse_view(raw: str) -> ListView:
+    match = _VIEW.fullmatch(raw)
+    if match is None:
+        raise CallbackError(f"malformed list view: {raw!r}")
+    filter_, page, prefix = match.groups()
+    if prefix and len(prefix.encode()) > MAX_PREFIX_BYTES:
+        raise CallbackError("search prefix too long")
+    return ListView(int(page), StackFilter(filter_), prefix or "")
+
+
+def _decode_v1(data: str, allowed: Allowlist) -> Callback:
+    if SEP not in data:
         raise CallbackError(f"malformed callback data: {data!r}")
     raw_action, stack = data.split(SEP, 1)
     try:
         action = Action(raw_action)
     except ValueError as exc:
         raise CallbackError(f"unknown action: {raw_action!r}") from exc
-    if action in (Action.LIST, Action.EXIT):
-        if stack:
-            raise CallbackError(f"{action.value} action carries no stack")
-        return action, ""
-    if stack not in allowed_stacks:
+    if not stack:
+        return Callback(_check_empty(action), "")
+    if stack not in allowed:
         raise CallbackError(f"stack not allowlisted: {stack!r}")
-    return action, stack
+    return Callback(_check_stack(action), stack)
+
+
+def _check_empty(action: Action) -> Action:
+    if action in _NO_STACK or action is Action.REFRESH:
+        return action
+    raise CallbackError(f"{action.value} action needs a stack")
 
 
-def _button(label: str, action: Action, stack: str = "") -> InlineKeyboardButton:
-    return InlineKeyboardButton(label, callback_data=encode(action, stack))
+def _check_stack(action: Action) -> Action:
+    if action in _NO_STACK:
+        raise CallbackError(f"{action.value} action carries no stack")
+    return action
 
 
-def stack_list_keyboard(stacks: Sequence[Stack]) -> InlineKeyboardMarkup:
+def _button(
+    label: str,
+    action: Action,
+    stack: str = "",
+    view: ListView | None = None,
+    *,
+    container: str = "",
+) -> InlineKeyboardButton:
+    data = encode(action, stack, view, container=container)
+    return InlineKeyboardButton(label, callback_data=data)
+
+
+def _page_row(
+    action: Action, view: ListView, pages: int
+) -> list[InlineKeyboardButton]:
+    """Prev, page x/y and Next buttons; ``action`` renders a page."""
+    row = [_button(f"{view.page + 1}/{pages}", action, view=view)]
+    if view.page > 0:
+        back = replace(view, page=view.page - 1)
+        row.insert(0, _button("◀️ Prev", action, view=back))
+    if view.page + 1 < pages:
+        forward = replace(view, page=view.page + 1)
+        row.append(_button("Next ▶️", action, view=forward))
+    return row
+
+
+def stack_list_keyboard(
+    stacks: Sequence[Stack], view: ListView = FIRST_PAGE, pages: int = 1
+) -> InlineKeyboardMarkup:
+    """``stacks`` is the page ``view`` shows, out of ``pages``."""
     rows = [
-        [_button(f"{STATUS_DOT[s.status]} {s.name}", Action.SHOW, s.name)]
+        [_button(f"{STATUS_DOT[s.status]} {s.key}", Action.SHOW, s.key)]
         for s in stacks
     ]
-    rows.append([_button("🔄 Refresh", Action.LIST), _button("🚪 Exit", Action.EXIT)])
+    if pages > 1:
+        rows.append(_page_row(Action.LIST, view, pages))
+    if pages > 1 or view.narrowed:
+        rows.append(
+            [
+                _button(
+                    f"✓ {label}" if f is view.filter else label,
+                    Action.LIST,
+                    view=replace(view, filter=f, page=0),
+                )
+                for f, label in _FILTER_LABELS.items()
+            ]
+        )
+    bulk: list[InlineKeyboardButton] = []
+    if any(s.status is StackStatus.STOPPED for s in stacks):
+        bulk.append(_button("▶️ Start all stopped", Action.START_STOPPED))
+    if len(stacks) > 1:
+        bulk.append(_button("🔁 Restart…", Action.SELECT, view=view))
+    if bulk:
+        rows.append(bulk)
+    rows.append(
+        [
+            _button("🔄 Refresh", Action.REFRESH, view=view),
+            _button("🚪 Exit", Action.EXIT),
+        ]
+    )
     return InlineKeyboardMarkup(rows)
 
 
 def stack_detail_keyboard(stack: Stack) -> InlineKeyboardMarkup:
     actions: list[InlineKeyboardButton] = []
     if stack.status is not StackStatus.RUNNING:
-        actions.append(_button("▶️ Start", Action.START, stack.name))
+        actions.append(_button("▶️ Start", Action.START, stack.key))
     if stack.status is not StackStatus.STOPPED:
-        actions.append(_button("⏹ Stop", Action.STOP, stack.name))
-        actions.append(_button("🔁 Restart", Action.RESTART, stack.name))
+        actions.append(_button("⏹ Stop", Action.STOP, stack.key))
+        actions.append(_button("🔁 Restart", Action.RESTART, stack.key))
+    containers = [
+        _button(f"📊 {c.name}", Action.CONTAINER, stack.key, container=c.name)
+        for c in stack.containers[:_MAX_CONTAINER_BUTTONS]
+    ]
+    footer = [_button("🔄 Refresh", Action.REFRESH, stack.key)]
+    if stack.containers:
+        footer.append(_button("📜 Logs", Action.LOGS, stack.key))
+    footer.append(_button("⬅️ Back", Action.LIST))
     return InlineKeyboardMarkup(
         [
             actions,
+            *(
+                containers[i : i + _CONTAINERS_PER_ROW]
+                for i in range(0, len(containers), _CONTAINERS_PER_ROW)
+            ),
+            footer,
+        ]
+    )
+
+
+def container_keyboard(stack: Stack, name: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
             [
-                _button("🔄 Refresh", Action.SHOW, stack.name),
-                _button("⬅️ Back", Action.LIST),
-            ],
+                _button("🔄 Refresh", Action.CONTAINER, stack.key, container=name),
+                _button("📜 Logs", Action.LOGS, stack.key, container=name),
+                _button("⬅️ Back", Action.SHOW, stack.key),
+            ]
         ]
     )
 
 
-def confirm_stop_keyboard(stack_name: str) -> InlineKeyboardMarkup:
+def logs_keyboard(key: str, name: str, *, following: bool) -> InlineKeyboardMarkup:
+    label = "⏹ Stop following" if following else "👁 Follow"
+    return InlineKeyboardMarkup(
+        [[_button(label, Action.FOLLOW, key, container=name)]]
+    )
+
+
+def confirm_stop_keyboard(key: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [
             [
-                _button("✅ Yes, stop", Action.CONFIRM_STOP, stack_name),
-                _button("❌ Cancel", Action.SHOW, stack_name),
+                _button("✅ Yes, stop", Action.CONFIRM_STOP, key),
+                _button("❌ Cancel", Action.SHOW, key),
             ]
         ]
     )
+
+
+def bulk_select_keyboard(
+    stacks: Sequence[Stack],
+    selected: Collection[str],
+    view: ListView = FIRST_PAGE,
+    pages: int = 1,
+) -> InlineKeyboardMarkup:
+    """The multi-select over one list page; ``selected`` spans all pages."""
+    rows = [
+        [
+            _button(
+                f"{'☑️' if s.key in selected else '⬜'} {s.key}",
+                Action.TOGGLE,
+                s.key,
+                view,
+            )
+        ]
+        for s in stacks
+    ]
+    if pages > 1:
+        rows.append(_page_row(Action.SELECT_PAGE, view, pages))
+    rows.append(
+        [
+            _button(
+                f"🔁 Restart {len(selected)}", Action.RESTART_SELECTED, view=view
+            ),
+            _button("⬅️ Back", Action.LIST, view=view),
+        ]
+    )
+    return InlineKeyboardMarkup(rows)
+
+
+def back_to_list_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[_button("⬅️ Back", Action.LIST)]])
@@ -0,0 +1,113 @@
+"""Container log tails sized for Telegram, bounded however much is logged.
+
+Dockhand's log endpoint is read as a stream and split into lines as it
+arrives (``split_lines``); a line longer than ``MAX_LINE_CHARS`` is cut,
+so no single line can grow without bound. Lines are HTML-escaped into
+``<pre>`` blocks that each fit one message (``chunk_lines``), and follow
+mode keeps only the newest lines (``LogTail``).
+
+Telegram's limit is 4096 characters counted in UTF-16 code units; tags
+are counted too, which leaves a margin.
+"""
+from __future__ import annotations
+
+import html
+import re
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator
+
+MESSAGE_LIMIT = 4096
+MAX_LINE_CHARS = 1000
+_PRE_OPEN, _PRE_CLOSE = "<pre>", "</pre>"
+# Docker multiplexes stdout/stderr of non-TTY containers in frames with
+# an 8-byte header (stream, 0, 0, 0, 4-byte size); relayed undecoded,
+# it shows up at the start of lines.
+_FRAME_HEADER = re.compile(r"^[\x00-\x02]\x00\x00\x00.{4}", re.DOTALL)
+
+
+def text_length(text: str) -> int:
+    """Length as Telegram counts it (UTF-16 code units)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+async def split_lines(
+    chunks: AsyncIterable[str], max_chars: int = MAX_LINE_CHARS
+) -> AsyncIterator[str]:
+    """Lines of a text stream; only the current line is held, and only
+    its first ``max_chars`` characters ("…" marks the cut)."""
+    head = ""
+    cut = False
+    async for chunk in chunks:
+        parts = chunk.split("\n")
+        for i, part in enumerate(parts):
+            if not cut:
+                head += part
+                if len(head) > max_chars:
+                    head, cut = head[:max_chars], True
+            if i < len(parts) - 1:
+                yield _clean(head, cut)
+                head, cut = "", False
+    if head or cut:
+        yield _clean(head, cut)
+
+
+def _clean(line: str, cut: bool) -> str:
+    line = _FRAME_HEADER.sub("", line).rstrip("\r")
+    return f"{line}…" if cut else line
+
+
+def _escape(line: str, room: int) -> str:
+    """``line`` escaped, cut to fit ``room`` if need be."""
+    escaped = html.escape(line, quote=False)
+    if text_length(escaped) <= room:
+        return escaped
+    # No character escapes or encodes to more than 5 units ("&amp;").
+    return html.escape(line[: room // 5 - 1], quote=False) + "…"
+
+
+def _block(lines: list[str]) -> str:
+    return _PRE_OPEN + "\n".join(lines) + _PRE_CLOSE
+
+
+async def chunk_lines(
+    lines: AsyncIterable[str], limit: int = MESSAGE_LIMIT
+) -> AsyncIterator[str]:
+    """``<pre>`` blocks of whole escaped lines, each at most ``limit``
+    long; holds one block at a time."""
+    room = limit - text_length(_PRE_OPEN + _PRE_CLOSE)
+    block: list[str] = []
+    size = 0
+    async for line in lines:
+        escaped = _escape(line, room)
+        length = text_length(escaped) + (1 if block else 0)  # + newline
+        if block and size + length > room:
+            yield _block(block)
+            block, size, length = [], 0, length - 1
+        block.append(escaped)
+        size += length
+    if block:
+        yield _block(block)
+
+
+class LogTail:
+    """The newest lines of a followed log, at most ``max_lines``."""
+
+    def __init__(self, max_lines: int, limit: int = MESSAGE_LIMIT) -> None:
+        self._room = limit - text_length(_PRE_OPEN + _PRE_CLOSE)
+        self._lines: deque[str] = deque(maxlen=max_lines)
+        self.version = 0  # bumped per line, so callers can skip re-renders
+
+    def add(self, line: str) -> None:
+        self._lines.append(_escape(line, self._room))
+        self.version += 1
+
+    def render(self) -> str:
+        """The newest lines that fit one ``<pre>`` block, or "" if none."""
+        kept: list[str] = []
+        size = 0
+        for line in reversed(self._lines):
+            size += text_length(line) + (1 if kept else 0)
+            if size > self._room:
+                break
+            kept.append(line)
+        return _block(kept[::-1]) if kept else ""
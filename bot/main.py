@@ -1,48 +1,52 @@
-"""Entrypoint: python -m bot.main"""
+"""Entrypoint: python -m bot.main [--check-config | --profile-startup]
+
+Only the standard library and the configuration are imported up front.
+A misconfigured container fails before the Telegram stack (most of the
+startup time) is loaded, and --check-config never loads it at all.
+"""
 from __future__ import annotations
 
+import argparse
 import logging
 import sys
-from typing import Any
-
-from telegram import Update
-from telegram.ext import (
-    Application,
-    CallbackQueryHandler,
-    CommandHandler,
-    TypeHandler,
-)
+import time
 
-from bot.auth import make_auth_gate
 from bot.config import Config, ConfigError
-from bot.dockhand import DockhandClient
-from bot.handlers import cmd_docker, cmd_ping, on_callback, on_error
 
 log = logging.getLogger(__name__)
 
 
-def build_application(config: Config, client: DockhandClient) -> Application:
-    app = Application.builder().token(config.telegram_bot_token).build()
-    app.bot_data["config"] = config
-    app.bot_data["client"] = client
-    # Group -1 runs before all default-group handlers, for every update type.
-    app.add_handler(
-        TypeHandler(Update, make_auth_gate(config.allowed_chat_ids)), group=-1
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bot.main")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--check-config",
+        action="store_true",
+        help="validate the environment and Dockhand reachability, then exit",
+    )
+    mode.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report how long importing each module takes, then exit",
     )
-    app.add_handler(CommandHandler("ping", cmd_ping))
-    app.add_handler(CommandHandler("docker", cmd_docker))
-    app.add_handler(CallbackQueryHandler(on_callback))
-    app.add_error_handler(on_error)
-    return app
+    return parser.parse_args(argv)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
+    started = time.perf_counter()
+    args = _parse_args(argv)
     logging.basicConfig(
         format="%(asctime)s %(levelname)s %(name)s %(message)s", level=logging.INFO
     )
     # PTB's httpx transport is chatty at INFO
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
+    if args.profile_startup:
+        from bot.startup import format_profile, profile_imports
+
+        print(format_profile(profile_imports("bot.app"), "bot.app"))
+        return 0
+
     try:
         config = Config.from_env()
     except ConfigError as exc:
@@ -50,31 +54,22 @@ def main() -> int:
         return 1
 
     logging.getLogger().setLevel(config.log_level)
-    client = DockhandClient(
-        config.dockhand_url, config.dockhand_api_token, config.dockhand_env
-    )
-    app = build_application(config, client)
+    if args.check_config:
+        import asyncio
+
+        from bot.startup import check_config
+
+        return 0 if asyncio.run(check_config(config)) else 1
+
+    configured = time.perf_counter()
+    from bot.app import run
+
     log.info(
-        "Bot starting: %d allowed chat(s), stacks: %s",
-        len(config.allowed_chat_ids),
-        ", ".join(config.allowed_stacks),
+        "Configuration checked in %.0f ms, application imported in %.0f ms",
+        (configured - started) * 1000,
+        (time.perf_counter() - configured) * 1000,
     )
-    run_kwargs: dict[str, Any] = {
-        "allowed_updates": [Update.MESSAGE, Update.CALLBACK_QUERY],
-        "drop_pending_updates": True,
-    }
-    if config.webhook is None:
-        app.run_polling(**run_kwargs)
-    else:
-        log.info("Webhook mode: listening on :%d", config.webhook.port)
-        app.run_webhook(
-            listen="0.0.0.0",
-            port=config.webhook.port,
-            url_path=config.webhook.path,
-            webhook_url=config.webhook.url,
-            secret_token=config.webhook.secret,
-            **run_kwargs,
-        )
+    run(config)
     return 0
 
 
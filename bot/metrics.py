@@ -0,0 +1,297 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Just what the bot needs: counters, gauges and fixed-bucket histograms
+with labels in one process-wide registry, rendered on demand for
+``/metrics``. Label values come from small fixed sets (HTTP methods,
+endpoint templates, actions), so series live in plain dicts.
+"""
+from __future__ import annotations
+
+import abc
+import bisect
+import math
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+
+Labels = tuple[str, ...]
+# Latency buckets (seconds): Telegram/Dockhand round trips up to long
+# image pulls.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = labelnames
+
+    def _key(self, labels: Mapping[str, object]) -> Labels:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _label_str(self, key: Labels, extra: str = "") -> str:
+        named = zip(self.labelnames, key, strict=True)
+        pairs = [f'{n}="{_escape(v)}"' for n, v in named]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(f"{line}\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help_, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{self._label_str(key)} {_num(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per series: [count per bucket..., +Inf overflow], sum
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: object) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += n
+                le = self._label_str(key, f'le="{_num(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{self._label_str(key)} {_num(total[0])}"
+            yield f"{self.name}_count{self._label_str(key)} {cumulative}"
+
+
+class Sampled(_Metric):
+    """Counter or gauge read from a callback at scrape time, for state
+    that already lives elsewhere (cache counters, queue depths)."""
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        kind: str,
+        read: Callable[[], Mapping[Labels, float]],
+        labelnames: Labels = (),
+    ) -> None:
+        super().__init__(name, help_, labelnames)
+        self.kind = kind
+        self._read = read
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._read().items():
+            yield f"{self.name}{self._label_str(key)} {_num(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, help_: str, labelnames: Labels = ()) -> Counter:
+        return self._add(Counter(name, help_, labelnames))
+
+    def gauge(self, name: str, help_: str, labelnames: Labels = ()) -> Gauge:
+        return self._add(Gauge(name, help_, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help_, labelnames, buckets))
+
+    def sampled(
+        self,
+        name: str,
+        help_: str,
+        kind: str,
+        read: Callable[[], Mapping[Labels, float]],
+        labelnames: Labels = (),
+    ) -> Sampled:
+        """(Re)bind a sampled metric; the latest ``read`` wins, so building
+        the application again rebinds to the new objects."""
+        metric = Sampled(name, help_, kind, read, labelnames)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+    def _add[M: _Metric](self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = Registry()
+
+DOCKHAND_SECONDS = REGISTRY.histogram(
+    "tgops_dockhand_request_seconds",
+    "Dockhand API call latency; status is the HTTP code or 'error'.",
+    ("method", "endpoint", "status"),
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "tgops_handler_seconds",
+    "Time spent in a Telegram update handler, per command or callback action.",
+    ("action",),
+)
+TELEGRAM_SECONDS = REGISTRY.histogram(
+    "tgops_telegram_request_seconds",
+    "Telegram Bot API call latency.",
+    ("method",),
+)
+ACTION_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "tgops_action_lock_wait_seconds",
+    "Time a queued action waited for another action on the same stack.",
+)
+CALLBACK_REJECTED = REGISTRY.counter(
+    "tgops_callback_rejected_total",
+    "Callback queries rejected as expired, forged or malformed.",
+)
+AUTH_DENIED = REGISTRY.counter(
+    "tgops_auth_denied_total",
+    "Updates dropped by the chat allowlist.",
+)
+EDIT_NOT_MODIFIED = REGISTRY.counter(
+    "tgops_edit_not_modified_total",
+    "Message edits Telegram refused as 'message is not modified'.",
+)
+EDIT_SKIPPED = REGISTRY.counter(
+    "tgops_edit_skipped_total",
+    "Message edits not sent because the message already showed that content.",
+)
+OUTBOX_DELAY_SECONDS = REGISTRY.histogram(
+    "tgops_outbox_delay_seconds",
+    "Time a Telegram call waited in the outbound queue (rate limits, 429s).",
+    ("kind",),
+)
+OUTBOX_COLLAPSED = REGISTRY.counter(
+    "tgops_outbox_collapsed_total",
+    "Queued Telegram calls replaced by a newer one for the same message.",
+    ("kind",),
+)
+OUTBOX_RETRY_AFTER = REGISTRY.counter(
+    "tgops_outbox_retry_after_total",
+    "Telegram flood-control (429) answers, each retried after retry_after.",
+    ("kind",),
+)
+UPDATE_WAIT_SECONDS = REGISTRY.histogram(
+    "tgops_update_wait_seconds",
+    "Time an update waited for its chat's previous updates and a free worker.",
+)
+DOCKHAND_RETRIES = REGISTRY.counter(
+    "tgops_dockhand_retries_total",
+    "Dockhand calls retried after a connect error, timeout or gateway error.",
+    ("method",),
+)
+DOCKHAND_BREAKER_STATE = REGISTRY.gauge(
+    "tgops_dockhand_breaker_state",
+    "1 for the Dockhand circuit breaker's current state, 0 for the others.",
+    ("state",),
+)
+DOCKHAND_BREAKER_TRIPS = REGISTRY.counter(
+    "tgops_dockhand_breaker_trips_total",
+    "Times the Dockhand circuit breaker opened.",
+)
+HISTORY_WRITE_SECONDS = REGISTRY.histogram(
+    "tgops_history_write_seconds",
+    "Time to commit one batch of audit/state history rows to SQLite.",
+)
+HISTORY_DROPPED = REGISTRY.counter(
+    "tgops_history_dropped_total",
+    "History rows dropped because the writer queue was full.",
+)
+SCHEDULE_RUNS = REGISTRY.counter(
+    "tgops_schedule_runs_total",
+    "Schedules that came due: run, or missed (overdue past the grace period).",
+    ("result",),
+)
+STACK_EVENTS = REGISTRY.counter(
+    "tgops_stack_events_total",
+    "Dockhand events by outcome: applied to the stack model, or ignored.",
+    ("result",),
+)
+STACK_RESYNCS = REGISTRY.counter(
+    "tgops_stack_resyncs_total",
+    "Full stack fetches by the event stream: on (re)connect, or after a gap.",
+    ("reason",),
+)
+WEBHOOK_UPDATES = REGISTRY.counter(
+    "tgops_webhook_updates_total",
+    "Webhook deliveries by outcome: accepted, duplicate (dropped) or shed (503).",
+    ("result",),
+)
@@ -0,0 +1,211 @@
+"""Outbound Telegram calls, paced for the Bot API's flood limits.
+
+Calls into a chat queue in that chat's lane and go out in order, each
+taking a token from the chat's bucket and from the global one. An edit
+of a message that already has an edit queued takes that edit's place in
+line: only the latest content is sent, and the waiter of the dropped
+edit gets ``Superseded``. A 429 pauses the lane for ``retry_after`` and
+puts the call back at its head.
+
+Callback answers bypass the lanes: they only clear the client's
+spinner, do not count as messages, and must arrive within seconds.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dtm
+import logging
+import warnings
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Any
+
+from telegram.error import RetryAfter
+from telegram.warnings import PTBDeprecationWarning
+
+from bot.metrics import OUTBOX_COLLAPSED, OUTBOX_DELAY_SECONDS, OUTBOX_RETRY_AFTER
+from bot.ratelimit import TELEGRAM_CHAT_RATE, TELEGRAM_GLOBAL_RATE, TokenBucket
+
+log = logging.getLogger(__name__)
+
+Call = Callable[[], Awaitable[Any]]
+
+
+class Superseded(Exception):
+    """A newer edit of the same message replaced this one before it went out."""
+
+
+@dataclass
+class _Job:
+    kind: str  # metrics label: send, edit, delete
+    call: Call
+    future: asyncio.Future[Any]
+    queued: float
+    collapse: Hashable | None = None
+    attempts: int = 0
+
+
+@dataclass
+class _Lane:
+    bucket: TokenBucket
+    jobs: deque[_Job] = field(default_factory=deque)
+    queued: dict[Hashable, _Job] = field(default_factory=dict)  # by collapse key
+    paused_until: float = 0.0
+    worker: asyncio.Task[None] | None = None
+
+
+class Outbox:
+    CHAT_BURST = 3.0  # taps in quick succession go out at once
+    MAX_RETRIES = 3  # 429s tolerated per call before giving up
+
+    def __init__(
+        self,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: float = CHAT_BURST,
+    ) -> None:
+        self._global = TokenBucket(global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._lanes: dict[int | None, _Lane] = {}
+        self._global_paused_until = 0.0
+
+    def depth(self) -> int:
+        """Calls queued in all lanes, not yet sent."""
+        return sum(len(lane.jobs) for lane in self._lanes.values())
+
+    async def answer(self, call: Call) -> Any:
+        """Answer a callback query ahead of every queued call. Takes a
+        global token when one is free but never waits for one."""
+        self._global.try_acquire()
+        loop = asyncio.get_running_loop()
+        attempts = 0
+        while True:
+            await self._sleep_until(self._global_paused_until)
+            start = loop.time()
+            try:
+                return await call()
+            except RetryAfter as exc:
+                attempts += 1
+                if attempts > self.MAX_RETRIES:
+                    raise
+                # Answers are not per chat: hold every lane back too.
+                self._global_paused_until = start + self._retry_after(exc, "answer")
+
+    async def send(
+        self,
+        chat_id: int | None,
+        call: Call,
+        *,
+        kind: str = "send",
+        collapse: Hashable | None = None,
+    ) -> Any:
+        """Queue ``call`` in the chat's lane and wait for its result.
+
+        ``collapse`` (e.g. the edited message) lets a later call with the
+        same key replace this one while it is still queued; this call
+        then raises ``Superseded``.
+        """
+        loop = asyncio.get_running_loop()
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            bucket = TokenBucket(self._chat_rate, self._chat_burst)
+            lane = self._lanes[chat_id] = _Lane(bucket)
+        future: asyncio.Future[Any] = loop.create_future()
+        queued = lane.queued.get(collapse) if collapse is not None else None
+        if queued is not None:
+            # Keep the queued call's place in line, send the new content.
+            OUTBOX_COLLAPSED.inc(kind=kind)
+            _settle(queued.future, Superseded())
+            queued.call, queued.future = call, future
+        else:
+            job = _Job(kind, call, future, loop.time(), collapse)
+            lane.jobs.append(job)
+            if collapse is not None:
+                lane.queued[collapse] = job
+        if lane.worker is None:
+            lane.worker = asyncio.create_task(
+                self._drain(lane), name=f"outbox:{chat_id}"
+            )
+        return await future
+
+    async def aclose(self) -> None:
+        workers = [lane.worker for lane in self._lanes.values() if lane.worker]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for lane in self._lanes.values():
+            for job in lane.jobs:
+                job.future.cancel()
+            lane.jobs.clear()
+            lane.queued.clear()
+
+    async def _drain(self, lane: _Lane) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while lane.jobs:
+                await self._sleep_until(
+                    max(lane.paused_until, self._global_paused_until)
+                )
+                await lane.bucket.acquire()
+                await self._global.acquire()
+                # Taken only now, so edits queued while waiting still collapse.
+                job = lane.jobs.popleft()
+                if job.collapse is not None:
+                    lane.queued.pop(job.collapse, None)
+                start = loop.time()
+                OUTBOX_DELAY_SECONDS.observe(start - job.queued, kind=job.kind)
+                try:
+                    result = await job.call()
+                except RetryAfter as exc:
+                    job.attempts += 1
+                    pause = self._retry_after(exc, job.kind)
+                    if job.attempts > self.MAX_RETRIES:
+                        _settle(job.future, exc)
+                        continue
+                    lane.paused_until = start + pause
+                    lane.jobs.appendleft(job)
+                    if job.collapse is not None:
+                        lane.queued[job.collapse] = job
+                except asyncio.CancelledError:
+                    job.future.cancel()  # aclose: the waiter must not hang
+                    raise
+                except Exception as exc:
+                    _settle(job.future, exc)
+                else:
+                    _settle(job.future, result=result)
+        finally:
+            lane.worker = None
+
+    @staticmethod
+    def _retry_after(exc: RetryAfter, kind: str) -> float:
+        OUTBOX_RETRY_AFTER.inc(kind=kind)
+        with warnings.catch_warnings():
+            # int or timedelta depending on PTB_TIMEDELTA; both are handled.
+            warnings.simplefilter("ignore", PTBDeprecationWarning)
+            value = exc.retry_after
+        if isinstance(value, dtm.timedelta):
+            seconds = value.total_seconds()
+        else:
+            seconds = float(value)
+        log.warning("Telegram flood control on %s: retrying in %gs", kind, seconds)
+        return seconds
+
+    @staticmethod
+    async def _sleep_until(deadline: float) -> None:
+        delay = deadline - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _settle(
+    future: asyncio.Future[Any], exc: BaseException | None = None, result: Any = None
+) -> None:
+    """Resolve a waiter's future unless the waiter gave up (cancelled)."""
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
@@ -0,0 +1,78 @@
+"""Background task keeping the stack snapshot warm.
+
+Polls at a fixed interval with jitter, so several bot instances never
+fall into lockstep, and backs off exponentially while Dockhand errors.
+Handlers keep reading the cache; they only fetch themselves when the
+snapshot is older than the cache TTL (the max-staleness bound).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+from collections.abc import Awaitable, Callable, Mapping
+
+from bot.dockhand import DockhandError
+from bot.stacks import Stack
+
+log = logging.getLogger(__name__)
+
+
+class StackPoller:
+    JITTER = 0.1  # +/- fraction of each delay
+    MAX_BACKOFF = 300.0  # seconds
+
+    def __init__(
+        self,
+        refresh: Callable[[], Awaitable[Mapping[str, Stack]]],
+        interval: float,
+        on_snapshot: Callable[[Mapping[str, Stack]], None] | None = None,
+    ) -> None:
+        self._refresh = refresh
+        self._interval = interval
+        self._on_snapshot = on_snapshot
+        self._failures = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="stack-poller")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def next_delay(self) -> float:
+        base = min(self._interval * 2**self._failures, self.MAX_BACKOFF)
+        jittered = base * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+        return max(jittered, self._interval)  # never poll faster than configured
+
+    async def poll_once(self) -> None:
+        try:
+            snapshot = await self._refresh()
+        except (DockhandError, ValueError) as exc:
+            self._failures += 1
+            log.warning("Stack poll failed (%d in a row): %s", self._failures, exc)
+        except Exception:
+            # A bug must not silently end polling for the life of the process.
+            self._failures += 1
+            log.exception("Stack poll crashed")
+        else:
+            if self._failures:
+                log.info("Stack poll recovered after %d failure(s)", self._failures)
+            self._failures = 0
+            if self._on_snapshot is not None:
+                try:
+                    self._on_snapshot(snapshot)
+                except Exception:
+                    log.exception("Snapshot listener failed")
+
+    async def _run(self) -> None:
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.next_delay())
@@ -0,0 +1,84 @@
+"""Rendered views, shared between identical states, and what each
+message currently shows.
+
+A view (HTML body plus inline keyboard) is a pure function of the state
+it shows, so identical states are served from a bounded LRU instead of
+rebuilding strings and markup. Every view carries a digest of its
+content: an edit whose digest matches what the message already shows is
+skipped, instead of costing a round trip that Telegram answers with
+"message is not modified".
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+
+from telegram import CallbackQuery, InlineKeyboardMarkup, Message
+
+from bot.cache import LRU
+
+MessageKey = tuple[int, int]  # (chat id, message id)
+
+
+@dataclass(frozen=True)
+class Rendered:
+    text: str
+    keyboard: InlineKeyboardMarkup | None
+    digest: bytes
+
+    @classmethod
+    def of(cls, text: str, keyboard: InlineKeyboardMarkup | None) -> Rendered:
+        h = hashlib.blake2b(text.encode(), digest_size=16)
+        if keyboard is not None:
+            h.update(b"\0")
+            h.update(json.dumps(keyboard.to_dict(), sort_keys=True).encode())
+        return cls(text, keyboard, h.digest())
+
+
+def message_key(target: CallbackQuery | Message) -> MessageKey | None:
+    """The message a callback came from, or a sent message; None for
+    inline-mode messages, which the bot never sends."""
+    message = target if isinstance(target, Message) else target.message
+    if message is None:
+        return None
+    return message.chat.id, message.message_id
+
+
+class RenderCache:
+    VIEWS = 256  # rendered views kept
+    MESSAGES = 1024  # messages whose content digest is remembered
+
+    def __init__(self, views: int = VIEWS, messages: int = MESSAGES) -> None:
+        self._views: LRU[Hashable, Rendered] = LRU(views)
+        self._shown: LRU[MessageKey, bytes] = LRU(messages)
+        self.hits = 0
+        self.misses = 0
+
+    def view(
+        self,
+        key: Hashable,
+        build: Callable[[], tuple[str, InlineKeyboardMarkup | None]],
+    ) -> Rendered:
+        """The view for ``key`` (the state it renders), built on a miss."""
+        rendered = self._views.get(key)
+        if rendered is not None:
+            self.hits += 1
+            return rendered
+        self.misses += 1
+        rendered = Rendered.of(*build())
+        self._views.put(key, rendered)
+        return rendered
+
+    def shows(self, message: MessageKey | None, rendered: Rendered) -> bool:
+        return message is not None and self._shown.get(message) == rendered.digest
+
+    def record(self, message: MessageKey | None, rendered: Rendered) -> None:
+        if message is not None:
+            self._shown.put(message, rendered.digest)
+
+    def forget(self, message: MessageKey | None) -> None:
+        """The message content is unknown (failed edit, deleted)."""
+        if message is not None:
+            self._shown.pop(message)
@@ -0,0 +1,323 @@
+"""Scheduled stack actions: recurring (cron) and one-shot (after a delay).
+
+Schedules are rows in a SQLite file and, while the bot runs, entries in
+one heap ordered by due time. A single task sleeps until the earliest
+entry is due, so the loop wakes once per due time however many
+schedules there are; adding an earlier schedule wakes it early.
+Cancelled entries stay in the heap and are skipped when popped; the
+heap is rebuilt once they outnumber the live ones.
+
+The loop only hands due schedules to a callback, which runs the action
+in the background, and writes the new due times of everything that came
+due at once in one transaction.
+
+Misfires: a run found overdue by more than the grace period (the bot
+was down, or the host asleep) is not run late but reported as missed. A
+recurring schedule then moves on to its next time after now, so a long
+outage costs one missed run, not a burst of them.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, replace
+
+from bot.cron import Cron, CronError
+from bot.metrics import SCHEDULE_RUNS
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    stack TEXT NOT NULL,
+    verb TEXT NOT NULL,
+    cron TEXT,
+    due REAL NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user TEXT NOT NULL
+);
+"""
+_DELAY = re.compile(r"(?:\d+[smhd])+")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+MAX_DELAY = 366 * 86400.0
+
+
+class ScheduleError(ValueError):
+    """A schedule that cannot be added."""
+
+
+@dataclass(frozen=True)
+class Schedule:
+    id: int
+    stack: str  # stack key
+    verb: str  # start, stop or restart
+    cron: Cron | None  # None: runs once
+    due: float  # unix time of the next run
+    chat_id: int  # where outcomes are reported
+    user: str  # who added it
+
+
+def parse_delay(text: str) -> float:
+    """Seconds in e.g. ``30m``, ``2h``, ``1h30m`` or ``1d``."""
+    text = text.lower()
+    if not _DELAY.fullmatch(text):
+        raise ScheduleError(f"not a delay like 30m, 2h or 1h30m: {text!r}")
+    seconds = sum(
+        int(n) * _UNITS[unit] for n, unit in re.findall(r"(\d+)([smhd])", text)
+    )
+    if not 0 < seconds <= MAX_DELAY:
+        raise ScheduleError("the delay must be between 1s and 366d")
+    return float(seconds)
+
+
+def parse_when(words: Sequence[str]) -> Cron | float:
+    """``in 30m`` or ``30m`` (a delay in seconds), else a cron expression."""
+    if words and words[0].lower() == "in":
+        return parse_delay("".join(words[1:]))
+    if len(words) == 1 and not words[0].startswith("@"):
+        return parse_delay(words[0])
+    return Cron.parse(" ".join(words))
+
+
+Due = Callable[[Schedule], object]
+Missed = Callable[[Schedule, float], object]  # schedule, seconds overdue
+
+
+class ScheduleStore:
+    """The schedules table. Calls run in a worker thread, one at a time."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    async def load(self) -> list[Schedule]:
+        """Open the file and read every schedule; unreadable rows are
+        logged and left out."""
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT id, stack, verb, cron, due, chat_id, user FROM schedules"
+            ).fetchall()
+        )
+        schedules = []
+        for sid, stack, verb, cron, due, chat_id, user in rows:
+            try:
+                parsed = Cron.parse(cron) if cron is not None else None
+            except CronError as exc:
+                log.error("Ignoring schedule #%d: %s", sid, exc)
+                continue
+            schedules.append(Schedule(sid, stack, verb, parsed, due, chat_id, user))
+        return schedules
+
+    async def insert(
+        self,
+        stack: str,
+        verb: str,
+        cron: Cron | None,
+        due: float,
+        chat_id: int,
+        user: str,
+    ) -> int:
+        expr = cron.expr if cron is not None else None
+
+        def insert(conn: sqlite3.Connection) -> int:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO schedules (stack, verb, cron, due, chat_id, user) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (stack, verb, expr, due, chat_id, user),
+                )
+            assert cursor.lastrowid is not None
+            return cursor.lastrowid
+
+        return await self._run(insert)
+
+    async def update(
+        self, dues: Sequence[tuple[float, int]], gone: Sequence[int]
+    ) -> None:
+        """Set the (due, id) pairs and delete the ``gone`` ids, in one
+        transaction."""
+
+        def update(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.executemany("UPDATE schedules SET due = ? WHERE id = ?", dues)
+                conn.executemany(
+                    "DELETE FROM schedules WHERE id = ?", [(i,) for i in gone]
+                )
+
+        await self._run(update)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def _run[T](self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        def call() -> T:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(self._path, check_same_thread=False)
+                    self._conn.execute("PRAGMA journal_mode=WAL")
+                    with self._conn:
+                        self._conn.executescript(_SCHEMA)
+                return fn(self._conn)
+
+        return await asyncio.to_thread(call)
+
+
+class Scheduler:
+    MAX_SCHEDULES = 10_000
+    # The loop re-reads the wall clock at least this often (seconds), so
+    # a clock step or a host resume is noticed without waiting out a
+    # long sleep.
+    MAX_SLEEP = 60.0
+
+    def __init__(
+        self,
+        store: ScheduleStore,
+        on_due: Due,
+        on_missed: Missed,
+        *,
+        grace: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._store = store
+        self._on_due = on_due
+        self._on_missed = on_missed
+        self._grace = grace
+        self._clock = clock
+        self._schedules: dict[int, Schedule] = {}
+        self._heap: list[tuple[float, int]] = []  # (due, id), possibly stale
+        self._stale = 0  # heap entries of cancelled schedules
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    async def start(self) -> None:
+        """Load the stored schedules and start the loop; any that came due
+        while the bot was down are handled on its first pass."""
+        for schedule in await self._store.load():
+            self._schedules[schedule.id] = schedule
+        self._rebuild()
+        self._task = asyncio.create_task(self._loop(), name="scheduler")
+        log.info("Scheduler started with %d schedule(s)", len(self._schedules))
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await asyncio.to_thread(self._store.close)
+
+    def schedules(self) -> list[Schedule]:
+        """Every schedule, soonest first."""
+        return sorted(self._schedules.values(), key=lambda s: (s.due, s.id))
+
+    async def add(
+        self,
+        stack: str,
+        verb: str,
+        when: Cron | float,
+        *,
+        chat_id: int,
+        user: str,
+    ) -> Schedule:
+        """Schedule ``verb`` on ``stack`` by cron expression, or once after
+        ``when`` seconds."""
+        if len(self._schedules) >= self.MAX_SCHEDULES:
+            raise ScheduleError(f"there are already {self.MAX_SCHEDULES} schedules")
+        now = self._clock()
+        if isinstance(when, Cron):
+            cron, due = when, when.next_after(now)
+        else:
+            cron, due = None, now + when
+        sid = await self._store.insert(stack, verb, cron, due, chat_id, user)
+        schedule = Schedule(sid, stack, verb, cron, due, chat_id, user)
+        self._push(schedule)
+        return schedule
+
+    async def cancel(self, sid: int) -> Schedule | None:
+        """Remove a schedule; None if there is none with that id."""
+        schedule = self._schedules.get(sid)
+        if schedule is None:
+            return None
+        await self._store.update((), (sid,))  # kept if the store fails
+        if self._schedules.pop(sid, None) is None:
+            return schedule  # fired meanwhile, or cancelled twice
+        self._stale += 1
+        if self._stale > max(len(self._schedules), 64):
+            self._rebuild()
+        return schedule
+
+    def _push(self, schedule: Schedule) -> None:
+        self._schedules[schedule.id] = schedule
+        heapq.heappush(self._heap, (schedule.due, schedule.id))
+        if self._heap[0][1] == schedule.id:
+            self._wake.set()  # due before whatever the loop sleeps on
+
+    def _rebuild(self) -> None:
+        self._heap = [(s.due, s.id) for s in self._schedules.values()]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    async def _loop(self) -> None:
+        while True:
+            now = self._clock()
+            due = self._pop_due(now)
+            if due:
+                await self._fire(due, now)
+            self._wake.clear()
+            timeout = self.MAX_SLEEP
+            if self._heap:
+                timeout = min(max(0.0, self._heap[0][0] - self._clock()), timeout)
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout)
+
+    def _pop_due(self, now: float) -> list[Schedule]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, sid = heapq.heappop(self._heap)
+            schedule = self._schedules.get(sid)
+            if schedule is None or schedule.due != at:
+                self._stale = max(0, self._stale - 1)
+                continue
+            due.append(schedule)
+        return due
+
+    async def _fire(self, due: list[Schedule], now: float) -> None:
+        dues: list[tuple[float, int]] = []
+        gone: list[int] = []
+        for schedule in due:
+            late = now - schedule.due
+            try:
+                if late > self._grace:
+                    SCHEDULE_RUNS.inc(result="missed")
+                    self._on_missed(schedule, late)
+                else:
+                    SCHEDULE_RUNS.inc(result="run")
+                    self._on_due(schedule)
+            except Exception:
+                log.exception("Schedule #%d failed to start", schedule.id)
+            if schedule.cron is None:
+                del self._schedules[schedule.id]
+                gone.append(schedule.id)
+            else:
+                following = replace(schedule, due=schedule.cron.next_after(now))
+                self._push(following)
+                dues.append((following.due, schedule.id))
+        try:
+            await self._store.update(dues, gone)
+        except sqlite3.Error:
+            log.exception("Saving %d schedule(s) failed", len(due))
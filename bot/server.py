@@ -0,0 +1,70 @@
+"""HTTP ingress: Telegram webhook deliveries and ``/metrics``.
+
+In webhook mode one tornado server on WEBHOOK_PORT carries both routes
+(PTB's built-in webhook server cannot host extra ones). In polling mode
+only the metrics route is served, on METRICS_PORT. Deliveries go through
+an UpdateIngress (see bot.ingress) and are answered once admitted.
+"""
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+
+import tornado.web
+from telegram import Update
+
+from bot.config import Webhook
+from bot.ingress import Admission, UpdateIngress
+from bot.metrics import CONTENT_TYPE, REGISTRY
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self) -> None:
+        self.set_header("Content-Type", CONTENT_TYPE)
+        self.write(REGISTRY.render())
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, ingress: UpdateIngress, secret: str) -> None:
+        self._ingress = ingress
+        self._secret = secret.encode()
+
+    async def post(self) -> None:
+        token = self.request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(token, self._secret):
+            # Not from Telegram: answer before looking at the body.
+            self.set_status(403)
+            return
+        try:
+            update = Update.de_json(json.loads(self.request.body), self._ingress.bot)
+        except (ValueError, TypeError, KeyError) as exc:
+            log.warning("Malformed webhook delivery: %s", exc)
+            self.set_status(400)
+            return
+        if self._ingress.offer(update) is Admission.SHED:
+            # Telegram keeps the update and delivers it again later.
+            self.set_status(503)
+
+
+def _quiet(handler: tornado.web.RequestHandler) -> None:
+    """Skip tornado's per-request access log; failures still go to tornado.*."""
+
+
+def make_web_app(
+    ingress: UpdateIngress | None = None,
+    webhook: Webhook | None = None,
+    *,
+    metrics: bool = False,
+) -> tornado.web.Application:
+    routes: list[tornado.web.URLSpec | tuple] = []
+    if metrics:
+        routes.append((r"/metrics", MetricsHandler))
+    if ingress is not None and webhook is not None:
+        kwargs = {"ingress": ingress, "secret": webhook.secret}
+        routes.append((f"/{webhook.path}", WebhookHandler, kwargs))
+    return tornado.web.Application(routes, log_function=_quiet)
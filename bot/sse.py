@@ -0,0 +1,42 @@
+"""Parser for a text/event-stream body (server-sent events).
+
+Follows the WHATWG event stream format as far as a client that never
+reconnects on its own needs it: ``data`` lines are joined with newlines,
+``id`` persists across events until the server changes it, comment lines
+(keep-alives) and ``retry`` are skipped, and an event without data is
+never dispatched.
+"""
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator, AsyncIterable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class ServerEvent:
+    data: str
+    event: str = "message"
+    id: str | None = None  # the stream's last event id as of this event
+
+
+async def parse_events(lines: AsyncIterable[str]) -> AsyncGenerator[ServerEvent]:
+    """Events of a stream given line by line, without line endings."""
+    data: list[str] = []
+    event = ""
+    last_id: str | None = None
+    async for line in lines:
+        if not line:
+            if data:
+                yield ServerEvent("\n".join(data), event or "message", last_id)
+            data, event = [], ""
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        value = value.removeprefix(" ")
+        if field == "data":
+            data.append(value)
+        elif field == "event":
+            event = value
+        elif field == "id" and "\0" not in value:
+            last_id = value
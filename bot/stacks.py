@@ -1,10 +1,20 @@
-"""Domain model: stack status derived from Dockhand's /api/stacks payload."""
+"""Domain model: stack status derived from Dockhand's /api/stacks payload.
+
+Snapshots hold every container of every allowlisted stack and are kept
+and compared often, so the model stays small: slotted dataclasses, and
+container states interned (a handful of distinct strings). Resource
+stats are not part of a snapshot; they are fetched per container on
+demand (see ContainerStats).
+"""
 from __future__ import annotations
 
+import re
+import sys
 from collections.abc import Sequence
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from datetime import datetime
 from enum import Enum
-from typing import Any
+from typing import Any, NamedTuple
 
 
 class StackStatus(Enum):
@@ -20,17 +30,55 @@ STATUS_DOT = {
 }
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Container:
     name: str
     state: str
+    id: str = ""  # Docker container id; "" if Dockhand did not send one
+
+    @property
+    def ref(self) -> str:
+        """What to address the container by in Dockhand's container API."""
+        return self.id or self.name
+
+
+@dataclass(frozen=True, slots=True)
+class ContainerStats:
+    """One container's resource usage and health; None where Dockhand
+    did not say (e.g. no stats for a stopped container)."""
+
+    cpu_percent: float | None = None
+    memory_used: int | None = None  # bytes
+    memory_limit: int | None = None  # bytes
+    restarts: int | None = None
+    started_at: float | None = None  # Unix time, while running
+    health: str | None = None  # healthy, unhealthy, starting; None = no check
+
+
+# Stacks outside the default Dockhand env are addressed as "name@env".
+ENV_SEP = "@"
+
+
+def stack_key(name: str, env: str = "") -> str:
+    return f"{name}{ENV_SEP}{env}" if env else name
+
 
+def split_key(key: str) -> tuple[str, str]:
+    """Stack key -> (name, env), env "" for the default env."""
+    name, _, env = key.partition(ENV_SEP)
+    return name, env
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Stack:
     name: str
     status: StackStatus
     containers: tuple[Container, ...] = ()
+    env: str = ""  # "" for the default env, else the Dockhand env id
+
+    @property
+    def key(self) -> str:
+        return stack_key(self.name, self.env)
 
 
 def compute_status(
@@ -46,7 +94,16 @@ def compute_status(
     return StackStatus.PARTIAL
 
 
-def parse_stacks(payload: Any, allowed_stacks: Sequence[str]) -> list[Stack]:
+def parse_stacks(
+    payload: Any, allowed_stacks: Sequence[str], env: str = ""
+) -> list[Stack]:
+    return list(parse_stack_index(payload, allowed_stacks, env).values())
+
+
+def parse_stack_index(
+    payload: Any, allowed_stacks: Sequence[str], env: str = ""
+) -> dict[str, Stack]:
+    """Allowlisted stacks keyed by name, in allowlist order."""
     if not isinstance(payload, list):
         raise ValueError("unexpected /api/stacks payload (not a list)")
 
@@ -55,21 +112,163 @@ def parse_stacks(payload: Any, allowed_stacks: Sequence[str]) -> list[Stack]:
         if isinstance(entry, dict) and isinstance(entry.get("name"), str):
             by_name[entry["name"]] = entry
 
-    stacks: list[Stack] = []
-    for name in allowed_stacks:
-        entry = by_name.get(name)
-        if entry is None:
-            continue
-        # Dockhand puts container objects in "containerDetails"; the
-        # "containers" key holds bare container ids.
-        containers = tuple(
-            Container(
-                name=str(c.get("name", "?")),
-                state=str(c.get("state", "unknown")),
-            )
-            for c in entry.get("containerDetails") or ()
-            if isinstance(c, dict)
+    return {
+        name: parse_stack_entry(by_name[name], env)
+        for name in allowed_stacks
+        if name in by_name
+    }
+
+
+def parse_stack_entry(entry: dict, env: str = "") -> Stack:
+    # Dockhand puts container objects in "containerDetails"; the
+    # "containers" key holds bare container ids.
+    containers = tuple(
+        Container(
+            name=str(c.get("name", "?")),
+            state=sys.intern(str(c.get("state", "unknown"))),
+            id=str(c.get("id") or ""),
         )
-        status = compute_status([c.state for c in containers], entry.get("status"))
-        stacks.append(Stack(name=name, status=status, containers=containers))
-    return stacks
+        for c in entry.get("containerDetails") or ()
+        if isinstance(c, dict)
+    )
+    status = compute_status([c.state for c in containers], entry.get("status"))
+    return Stack(name=entry["name"], status=status, containers=containers, env=env)
+
+
+# Docker event actions that leave a container in a known state; "destroy"
+# removes it. Others (kill, exec_*, health_status, ...) change no state.
+_EVENT_STATES = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "stop": "exited",
+    "die": "exited",
+}
+_PROJECT_LABEL = "com.docker.compose.project"
+
+
+class ContainerEvent(NamedTuple):
+    stack: str  # compose project
+    id: str
+    name: str
+    state: str | None  # None: the container was removed
+
+
+def parse_container_event(payload: Any) -> ContainerEvent | None:
+    """A Docker Engine event, as Dockhand relays it, if it changes the
+    state of a compose-managed container; else None."""
+    if not isinstance(payload, dict) or payload.get("Type") != "container":
+        return None
+    action = str(payload.get("Action", "")).partition(":")[0]
+    if action != "destroy" and action not in _EVENT_STATES:
+        return None
+    actor = payload.get("Actor")
+    if not isinstance(actor, dict) or not isinstance(actor.get("Attributes"), dict):
+        return None
+    attributes = actor["Attributes"]
+    stack = attributes.get(_PROJECT_LABEL)
+    if not isinstance(stack, str):
+        return None
+    return ContainerEvent(
+        stack=stack,
+        id=str(actor.get("ID") or ""),
+        name=str(attributes.get("name", "?")),
+        state=_EVENT_STATES.get(action),
+    )
+
+
+def apply_container_event(stack: Stack, event: ContainerEvent) -> Stack:
+    """``stack`` with ``event`` applied: a known container (by id, or by
+    name) changes state or goes, an unknown one is added."""
+    containers = list(stack.containers)
+    for i, c in enumerate(containers):
+        if (c.id and event.id.startswith(c.id)) or c.name == event.name:
+            if event.state is None:
+                del containers[i]
+            else:
+                state = sys.intern(event.state)
+                containers[i] = replace(c, state=state, id=c.id or event.id)
+            break
+    else:
+        if event.state is None:
+            return stack
+        containers.append(Container(event.name, sys.intern(event.state), event.id))
+    fallback = "running" if stack.status is StackStatus.RUNNING else None
+    status = compute_status([c.state for c in containers], fallback)
+    return replace(stack, status=status, containers=tuple(containers))
+
+
+# Docker timestamps carry nanoseconds; datetime takes microseconds.
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def parse_container_stats(inspect: Any, stats: Any) -> ContainerStats:
+    """Docker Engine inspect and (one-shot) stats payloads, as Dockhand
+    relays them; ``stats`` is None when Dockhand had none."""
+    if not isinstance(inspect, dict):
+        raise ValueError("unexpected container payload (not an object)")
+    state = inspect.get("State")
+    if not isinstance(state, dict):
+        state = {}
+    health = state.get("Health")
+    cpu, used, limit = _usage(stats) if isinstance(stats, dict) else (None,) * 3
+    running = state.get("Running") is True
+    return ContainerStats(
+        cpu_percent=cpu,
+        memory_used=used,
+        memory_limit=limit,
+        restarts=_int(inspect.get("RestartCount")),
+        started_at=_timestamp(state.get("StartedAt")) if running else None,
+        health=str(health.get("Status")) if isinstance(health, dict) else None,
+    )
+
+
+def _usage(stats: dict) -> tuple[float | None, int | None, int | None]:
+    """(CPU %, memory used, memory limit) as ``docker stats`` shows them."""
+    cpu = _path(stats, "cpu_stats", "cpu_usage", "total_usage")
+    pre_cpu = _path(stats, "precpu_stats", "cpu_usage", "total_usage")
+    system = _path(stats, "cpu_stats", "system_cpu_usage")
+    pre_system = _path(stats, "precpu_stats", "system_cpu_usage")
+    cpus = _path(stats, "cpu_stats", "online_cpus") or 1
+    percent = None
+    if cpu is not None and pre_cpu is not None and system and pre_system:
+        busy, elapsed = cpu - pre_cpu, system - pre_system
+        percent = busy / elapsed * cpus * 100 if busy > 0 and elapsed > 0 else 0.0
+    used = _path(stats, "memory_stats", "usage")
+    if used is not None:
+        # Page cache is reclaimable, so docker stats leaves it out:
+        # inactive_file on cgroup v2, total_inactive_file on v1.
+        cache = _path(stats, "memory_stats", "stats", "inactive_file")
+        if cache is None:
+            cache = _path(stats, "memory_stats", "stats", "total_inactive_file")
+        used -= cache or 0
+    return percent, used, _path(stats, "memory_stats", "limit")
+
+
+def _path(payload: dict, *keys: str) -> int | None:
+    value: Any = payload
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return _int(value)
+
+
+def _int(value: Any) -> int | None:
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    return int(value)
+
+
+def _timestamp(value: Any) -> float | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.fromisoformat(_FRACTION.sub(r"\1", value))
+    except ValueError:
+        return None
+    if moment.year < 2:  # Docker's zero time: never started
+        return None
+    return moment.timestamp()
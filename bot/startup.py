@@ -0,0 +1,115 @@
+"""Startup tooling that never loads the Telegram stack.
+
+``check_config`` backs ``python -m bot.main --check-config``: the
+environment is already validated by then, and it asks each Dockhand env
+for its stacks. ``profile_imports`` backs ``--profile-startup``: it
+imports the application in a fresh interpreter under ``-X importtime``,
+so the numbers match a cold container start.
+"""
+from __future__ import annotations
+
+import subprocess
+import sys
+from collections import defaultdict
+from typing import NamedTuple, TextIO
+
+import httpx
+
+from bot.config import Config
+from bot.dockhand import DockhandClient, DockhandError
+
+
+async def check_config(
+    config: Config,
+    *,
+    out: TextIO = sys.stdout,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> bool:
+    """Print whether each Dockhand env answers and which allowlisted
+    stacks it lacks. True if every env listed at least one stack; an
+    empty list almost always means a wrong DOCKHAND_ENV."""
+    print(
+        f"config: ok, {len(config.allowed_chat_ids)} chat(s), "
+        f"{len(config.stack_keys)} stack(s) in {len(config.environments)} env(s)",
+        file=out,
+    )
+    client = DockhandClient(
+        config.dockhand_url,
+        config.dockhand_api_token,
+        config.dockhand_env,
+        transport=transport,
+        retries=0,
+    )
+    ok = True
+    try:
+        for env, names in config.environments.items():
+            try:
+                entries = await client.for_env(env).list_stacks()
+            except DockhandError as exc:
+                print(f"env {env}: {exc}", file=out)
+                ok = False
+                continue
+            if not entries:
+                print(f"env {env}: no stacks (is DOCKHAND_ENV right?)", file=out)
+                ok = False
+                continue
+            found = {e.get("name") for e in entries if isinstance(e, dict)}
+            line = f"env {env}: reachable, {len(entries)} stack(s)"
+            missing = [name for name in names if name not in found]
+            if missing:
+                line += f"; not in Dockhand: {', '.join(missing)}"
+            print(line, file=out)
+    finally:
+        await client.aclose()
+    return ok
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(text: str) -> list[ImportTime]:
+    """Rows of ``-X importtime`` output, in the order it printed them."""
+    rows: list[ImportTime] = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:  # the header row
+            continue
+        rows.append(ImportTime(fields[2].strip(), self_us, cumulative_us))
+    return rows
+
+
+def profile_imports(module: str = "bot.app") -> list[ImportTime]:
+    """Import ``module`` in a fresh interpreter and time every import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(proc.stderr)
+
+
+def format_profile(rows: list[ImportTime], module: str, top: int = 15) -> str:
+    """Totals per top-level package (own time of its modules), then the
+    slowest modules including what they import."""
+    packages: defaultdict[str, int] = defaultdict(int)
+    for row in rows:
+        packages[row.module.partition(".")[0]] += row.self_us
+    total = sum(packages.values())
+    lines = [f"import {module}: {total / 1000:.1f} ms, {len(rows)} modules", ""]
+    lines.append("by package (own time):")
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    lines += [f"  {us / 1000:8.1f} ms  {name}" for name, us in ranked[:top]]
+    lines += ["", "slowest modules (with their imports):"]
+    slowest = sorted(rows, key=lambda row: row.cumulative_us, reverse=True)
+    lines += [f"  {r.cumulative_us / 1000:8.1f} ms  {r.module}" for r in slowest[:top]]
+    return "\n".join(lines)
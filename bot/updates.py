@@ -0,0 +1,98 @@
+"""Concurrent update processing, in order within each chat.
+
+PTB hands every update to the processor as its own task. Updates of the
+same chat (or the same inline message, which has no chat) queue on that
+chat's lock and run one at a time in arrival order, so taps on one
+message never overtake each other and ``chat_data`` sees no interleaving.
+Updates of different chats run in parallel on up to ``workers`` slots.
+
+The chat lock is taken before a worker slot: a burst of taps in one chat
+waits without holding slots, so it cannot starve the other chats.
+
+Each update still goes through every handler group in turn, so the auth
+gate in group -1 runs before any of its handlers.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Hashable
+from dataclasses import dataclass, field
+from typing import Any
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from bot.metrics import UPDATE_WAIT_SECONDS
+
+
+def update_key(update: object) -> Hashable | None:
+    """What ``update`` must stay ordered with: its chat, else its inline
+    message; None for updates that need no ordering."""
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    query = update.callback_query
+    if query is not None and query.inline_message_id:
+        return query.inline_message_id
+    return None
+
+
+@dataclass
+class _Chat:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0  # updates holding or waiting for the lock
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    MAX_PENDING = 256  # updates accepted at once, running or queued
+
+    def __init__(self, workers: int, max_pending: int = MAX_PENDING) -> None:
+        # PTB's own semaphore only bounds how many updates are in the
+        # processor; ours bounds how many run.
+        super().__init__(max(max_pending, workers))
+        self._slots = asyncio.Semaphore(workers)
+        self.workers = workers
+        self._chats: dict[Hashable, _Chat] = {}
+        self.running = 0
+
+    def waiting(self) -> int:
+        """Updates accepted but not yet running."""
+        return self.current_concurrent_updates - self.running
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        key = update_key(update)
+        if key is None:
+            await self._run(coroutine, time.perf_counter())
+            return
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = _Chat()
+        chat.users += 1
+        queued = time.perf_counter()
+        try:
+            async with chat.lock:
+                await self._run(coroutine, queued)
+        finally:
+            chat.users -= 1
+            if not chat.users:
+                del self._chats[key]
+
+    async def _run(self, coroutine: Awaitable[Any], queued: float) -> None:
+        async with self._slots:
+            UPDATE_WAIT_SECONDS.observe(time.perf_counter() - queued)
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+
+    async def initialize(self) -> None:
+        """Nothing to set up."""
+
+    async def shutdown(self) -> None:
+        """Nothing to tear down; PTB waits for updates in flight."""
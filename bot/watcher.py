@@ -0,0 +1,169 @@
+"""Push stack status changes to the allowed chats.
+
+Consecutive snapshots are diffed per stack. A change is reported only
+once it has held for ``debounce`` seconds, so a flapping container that
+keeps returning to its reported state never notifies. All changes found
+in one snapshot go out as one message per chat through the outbox, which
+paces them within Telegram's global and per-chat limits.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import html
+import logging
+import time
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from bot.outbox import Outbox
+from bot.stacks import STATUS_DOT, Stack, StackStatus
+
+log = logging.getLogger(__name__)
+
+# (what operators last heard, what it is now); None = not in Dockhand
+Change = tuple[Stack | None, Stack | None]
+# What a notification shows of a stack: status, {(container, state)}
+_Shown = tuple[StackStatus, frozenset[tuple[str, str]]] | None
+
+
+@dataclass
+class _Track:
+    reported: Stack | None
+    shown: _Shown = None  # _shown(reported)
+    pending: Stack | None = None
+    pending_shown: _Shown = None  # _shown(pending)
+    since: float = 0.0
+    has_pending: bool = False
+
+
+class StatusWatcher:
+    def __init__(
+        self,
+        bot: Bot,
+        chat_ids: Iterable[int],
+        debounce: float,
+        clock: Callable[[], float] = time.monotonic,
+        outbox: Outbox | None = None,
+    ) -> None:
+        self._bot = bot
+        self._chat_ids = tuple(chat_ids)
+        self._debounce = debounce
+        self._clock = clock
+        self._tracks: dict[str, _Track] | None = None  # None until baseline
+        self._outbox = outbox if outbox is not None else Outbox()
+        self._deliveries: set[asyncio.Task[None]] = set()
+
+    def observe(self, snapshot: Mapping[str, Stack]) -> None:
+        text = render_changes(self.diff(snapshot))
+        if text:
+            task = asyncio.create_task(self._deliver(text))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    def diff(self, snapshot: Mapping[str, Stack]) -> list[Change]:
+        """Settled changes since the last report.
+
+        Only what a notification shows counts: the stack status and each
+        container's state by name. A container recreated under a new id
+        in the same state is no change.
+        """
+        if self._tracks is None:
+            self._tracks = {
+                name: _Track(stack, _shown(stack)) for name, stack in snapshot.items()
+            }
+            return []
+        now = self._clock()
+        changes: list[Change] = []
+        for name, stack in snapshot.items():
+            self._step(self._tracks, name, stack, now, changes)
+        for name in self._tracks.keys() - snapshot.keys():
+            self._step(self._tracks, name, None, now, changes)
+        return changes
+
+    async def aclose(self) -> None:
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    def _step(
+        self,
+        tracks: dict[str, _Track],
+        name: str,
+        stack: Stack | None,
+        now: float,
+        changes: list[Change],
+    ) -> None:
+        track = tracks.get(name)
+        if track is None:
+            track = tracks[name] = _Track(reported=None)
+        if stack is track.reported or stack == track.reported:
+            track.has_pending = False  # unchanged, or flapped back
+            return
+        shown = _shown(stack)
+        if shown == track.shown:
+            # Changed only in what no message shows (e.g. container ids):
+            # track it so the next poll takes the equality path above.
+            track.reported, track.has_pending = stack, False
+            return
+        if not track.has_pending or shown != track.pending_shown:
+            track.pending, track.pending_shown = stack, shown
+            track.since, track.has_pending = now, True
+        if now - track.since >= self._debounce:
+            changes.append((track.reported, stack))
+            track.reported, track.shown, track.has_pending = stack, shown, False
+        if stack is None and not track.has_pending and track.reported is None:
+            del tracks[name]  # gone and reported as gone
+
+    async def _deliver(self, text: str) -> None:
+        await asyncio.gather(*(self._send(chat_id, text) for chat_id in self._chat_ids))
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        send = functools.partial(
+            self._bot.send_message, chat_id, text, parse_mode=ParseMode.HTML
+        )
+        try:
+            await self._outbox.send(chat_id, send)
+        except TelegramError as exc:
+            log.error("Status notification to chat_id=%s failed: %s", chat_id, exc)
+
+
+def _shown(stack: Stack | None) -> _Shown:
+    """What a notification shows of ``stack``."""
+    if stack is None:
+        return None
+    return stack.status, frozenset((c.name, c.state) for c in stack.containers)
+
+
+def render_changes(changes: Iterable[Change]) -> str:
+    """One message for all ``changes``; "" if none of them shows any
+    difference (e.g. a container only gained or lost a sibling)."""
+    lines = []
+    for old, new in changes:
+        if new is None:
+            if old is not None:
+                name = html.escape(old.key)
+                lines.append(f"⚪ <b>{name}</b>: no longer in Dockhand")
+            continue
+        before = {c.name: c.state for c in old.containers} if old else {}
+        flips = [
+            f"    <code>{html.escape(c.name)}</code>: "
+            f"{html.escape(before[c.name])} → {html.escape(c.state)}"
+            for c in new.containers
+            if before.get(c.name, c.state) != c.state
+        ]
+        if old is not None and old.status is new.status and not flips:
+            continue
+        name = html.escape(new.key)
+        was = f"{old.status.value} → " if old is not None else "appeared, "
+        lines.append(
+            f"{STATUS_DOT[new.status]} <b>{name}</b>: {was}{new.status.value}"
+        )
+        lines.extend(flips)
+    if not lines:
+        return ""
+    return "\n".join(["🔔 <b>Stack status changed</b>", *lines])
@@ -0,0 +1,95 @@
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+from telegram.ext import CallbackQueryHandler, CommandHandler, TypeHandler
+
+from bot.app import build_application
+from bot.config import Webhook
+from bot.events import StackEvents
+from bot.history import HistoryStore
+from bot.ingress import UpdateIngress
+from bot.metrics import REGISTRY
+from bot.poller import StackPoller
+from bot.scheduler import Scheduler
+from bot.updates import ChatOrderedProcessor
+
+
+def test_build_application_wires_everything(config):
+    app = build_application(config, MagicMock())
+    assert app.bot_data["config"] is config
+    # auth gate runs first, in its own group before all others
+    assert min(app.handlers) == -1
+    assert isinstance(app.handlers[-1][0], TypeHandler)
+    default_group = [type(h) for h in app.handlers[0]]
+    assert CommandHandler in default_group
+    assert CallbackQueryHandler in default_group
+
+
+def test_updates_processed_per_chat_with_configured_workers(config):
+    app = build_application(replace(config, update_workers=3), MagicMock())
+    assert isinstance(app.update_processor, ChatOrderedProcessor)
+    assert app.update_processor.workers == 3
+    assert 'tgops_updates_in_progress{state="running"} 0' in REGISTRY.render()
+
+
+def test_poller_only_when_configured(config):
+    assert "poller" not in build_application(config, MagicMock()).bot_data
+    polling = replace(config, poll_interval=10, poll_max_staleness=30)
+    app = build_application(polling, MagicMock())
+    assert isinstance(app.bot_data["poller"], StackPoller)
+    assert app.bot_data["cache"].ttl == 30
+
+
+def test_event_stream_only_when_configured(config):
+    assert "events" not in build_application(config, MagicMock()).bot_data
+    app = build_application(replace(config, dockhand_events=True), MagicMock())
+    events = app.bot_data["events"]
+    assert isinstance(events, StackEvents)
+    assert events._envs == {"": frozenset(config.allowed_stacks)}
+    assert "tgops_event_streams_live 0" in REGISTRY.render()
+
+
+def test_ingress_only_in_webhook_mode(config):
+    assert "ingress" not in build_application(config, MagicMock()).bot_data
+    webhook = Webhook("https://bot.example.com/hook", "s3cret", max_pending=7)
+    app = build_application(replace(config, webhook=webhook), MagicMock())
+    ingress = app.bot_data["ingress"]
+    assert isinstance(ingress, UpdateIngress)
+    assert ingress.max_pending == 7
+    assert "tgops_webhook_pending 0" in REGISTRY.render()
+
+
+def test_cache_counters_exposed(config):
+    app = build_application(config, MagicMock())
+    app.bot_data["cache"].hits = 3
+    assert 'tgops_stack_cache_requests_total{result="hit"} 3' in REGISTRY.render()
+
+
+def test_history_store_gets_snapshots(config, tmp_path):
+    history_config = replace(
+        config,
+        history_db=str(tmp_path / "history.db"),
+        poll_interval=10,
+        poll_max_staleness=30,
+    )
+    app = build_application(history_config, MagicMock())
+    history = app.bot_data["history"]
+    assert isinstance(history, HistoryStore)
+    assert app.bot_data["poller"]._on_snapshot == history.record_states
+    assert any(
+        isinstance(h, CommandHandler) and "history" in h.commands
+        for h in app.handlers[0]
+    )
+    assert "tgops_history_queued 0" in REGISTRY.render()
+
+
+def test_scheduler_only_when_configured(config, tmp_path):
+    assert "scheduler" not in build_application(config, MagicMock()).bot_data
+    scheduling = replace(config, schedule_db=str(tmp_path / "schedules.db"))
+    app = build_application(scheduling, MagicMock())
+    assert isinstance(app.bot_data["scheduler"], Scheduler)
+    assert any(
+        isinstance(h, CommandHandler) and "schedule" in h.commands
+        for h in app.handlers[0]
+    )
+    assert "tgops_schedules 0" in REGISTRY.render()
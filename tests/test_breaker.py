@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from bot.breaker import BreakerState, CircuitBreaker
+from bot.metrics import DOCKHAND_BREAKER_STATE
+
+
+class _Probe:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.outcomes.pop(0):
+            return
+        raise OSError("still down")
+
+
+@pytest.fixture
+async def breaker():
+    b = CircuitBreaker(threshold=3, cooldown=0.01)
+    b.JITTER = 0
+    yield b
+    await b.aclose()
+
+
+async def test_opens_after_threshold_failures_in_a_row(breaker):
+    probe = _Probe(False)
+    breaker.failure(probe)
+    breaker.failure(probe)
+    breaker.success()  # resets the run
+    breaker.failure(probe)
+    breaker.failure(probe)
+    assert breaker.closed
+    breaker.failure(probe)
+    assert breaker.state is BreakerState.OPEN
+    assert breaker.message.startswith("Dockhand down since ")
+    assert DOCKHAND_BREAKER_STATE.value(state="open") == 1
+    assert DOCKHAND_BREAKER_STATE.value(state="closed") == 0
+
+
+async def test_probe_backs_off_until_dockhand_answers(breaker):
+    probe = _Probe(False, False, True)
+    for _ in range(3):
+        breaker.failure(probe)
+    task = breaker._probe
+    breaker.failure(probe)  # already open: no second probe
+    assert breaker._probe is task
+    async with asyncio.timeout(1):
+        while not breaker.closed:
+            await asyncio.sleep(0.01)
+    assert probe.calls == 3
+    assert breaker.failures == 0
+    assert DOCKHAND_BREAKER_STATE.value(state="closed") == 1
+
+
+async def test_half_open_while_probing(breaker):
+    release = asyncio.Event()
+
+    async def probe():
+        await release.wait()
+
+    for _ in range(3):
+        breaker.failure(probe)
+    async with asyncio.timeout(1):
+        while breaker.state is not BreakerState.HALF_OPEN:
+            await asyncio.sleep(0.005)
+    assert not breaker.closed
+    release.set()
+    async with asyncio.timeout(1):
+        while not breaker.closed:
+            await asyncio.sleep(0.005)
+
+
+async def test_other_success_closes_and_stops_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    probe = _Probe(True)
+    breaker.failure(probe)
+    task = breaker._probe
+    breaker.success()
+    assert breaker.closed
+    await asyncio.sleep(0)
+    assert task is not None and task.cancelled()
+    assert probe.calls == 0
@@ -0,0 +1,71 @@
+import asyncio
+
+from bot.bulk import dependency_map, run_bulk
+from bot.dockhand import DockhandError
+
+
+class _Recorder:
+    def __init__(self, fail=()):
+        self.order: list[str] = []
+        self.running = 0
+        self.peak = 0
+        self._fail = set(fail)
+
+    async def __call__(self, name):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        self.order.append(name)
+        if name in self._fail:
+            raise DockhandError(f"{name} broke")
+
+
+async def test_concurrency_is_bounded():
+    action = _Recorder()
+    results = await run_bulk(list("abcdef"), action, concurrency=2)
+    assert action.peak == 2
+    assert [r.name for r in results] == list("abcdef")
+    assert all(r.ok for r in results)
+
+
+async def test_dependencies_start_first():
+    action = _Recorder()
+    deps = dependency_map([("app", "db")])
+    await run_bulk(["app", "db"], action, concurrency=5, dependencies=deps)
+    assert action.order == ["db", "app"]
+
+
+async def test_stop_runs_dependents_first():
+    action = _Recorder()
+    deps = dependency_map([("app", "db")])
+    await run_bulk(
+        ["db", "app"], action, concurrency=5, dependencies=deps, reverse=True
+    )
+    assert action.order == ["app", "db"]
+
+
+async def test_failed_dependency_skips_dependent():
+    action = _Recorder(fail={"db"})
+    deps = dependency_map([("app", "db")])
+    seen = []
+    results = await run_bulk(
+        ["app", "db", "web"],
+        action,
+        concurrency=5,
+        dependencies=deps,
+        on_result=lambda r: seen.append(r.name),
+    )
+    app, db, web = results
+    assert app.skipped and app.error == "db failed"
+    assert db.error == "db broke" and not db.skipped
+    assert web.ok
+    assert "app" not in action.order
+    assert sorted(seen) == ["app", "db", "web"]
+
+
+async def test_dependencies_outside_batch_ignored():
+    action = _Recorder()
+    deps = dependency_map([("app", "db")])
+    results = await run_bulk(["app"], action, concurrency=1, dependencies=deps)
+    assert results[0].ok
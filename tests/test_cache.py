@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from bot.cache import LRU, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Loader:
+    """Counts calls; each call can be held open until ``release`` is set."""
+
+    def __init__(self, hold=False):
+        self.calls = 0
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+async def test_hit_within_ttl_and_reload_after_expiry():
+    clock, load = Clock(), Loader()
+    cache = TTLCache(5, clock)
+    assert await cache.get("k", load) == 1
+    clock.now = 4.9
+    assert await cache.get("k", load) == 1
+    clock.now = 5
+    assert await cache.get("k", load) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+async def test_concurrent_misses_share_one_load():
+    load = Loader(hold=True)
+    cache = TTLCache(5)
+    waiters = [asyncio.create_task(cache.get("k", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    load.release.set()
+    assert await asyncio.gather(*waiters) == [1] * 5
+    assert load.calls == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+
+
+async def test_force_bypasses_ttl_but_coalesces():
+    load = Loader()
+    cache = TTLCache(60)
+    await cache.get("k", load)
+    load.release.clear()
+    forced = [asyncio.create_task(cache.get("k", load, force=True)) for _ in range(3)]
+    await asyncio.sleep(0)
+    load.release.set()
+    assert await asyncio.gather(*forced) == [2, 2, 2]
+    assert load.calls == 2
+
+
+async def test_keys_are_independent():
+    load = Loader()
+    cache = TTLCache(60)
+    await cache.get("a", load)
+    await cache.get("b", load)
+    assert load.calls == 2
+
+
+async def test_invalidate_drops_entry():
+    load = Loader()
+    cache = TTLCache(60)
+    await cache.get("k", load)
+    cache.invalidate("k")
+    assert await cache.get("k", load) == 2
+
+
+async def test_invalidate_drops_scoped_keys():
+    load = Loader()
+    cache = TTLCache(60)
+    await cache.get(("1", "a"), load)
+    await cache.get(("2", "a"), load)
+    cache.invalidate("1")
+    assert await cache.get(("1", "a"), load) == 3
+    assert await cache.get(("2", "a"), load) == 2
+
+
+async def test_load_started_before_invalidate_is_not_stored():
+    load = Loader(hold=True)
+    cache = TTLCache(60)
+    stale = asyncio.create_task(cache.get("k", load))
+    await asyncio.sleep(0)
+    cache.invalidate("k")
+    load.release.set()
+    assert await stale == 1
+    assert await cache.get("k", load) == 2
+
+
+async def test_errors_are_not_cached():
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    cache = TTLCache(60)
+    with pytest.raises(RuntimeError):
+        await cache.get("k", flaky)
+    assert await cache.get("k", flaky) == "ok"
+
+
+async def test_cancelled_waiter_does_not_cancel_shared_load():
+    load = Loader(hold=True)
+    cache = TTLCache(60)
+    first = asyncio.create_task(cache.get("k", load))
+    second = asyncio.create_task(cache.get("k", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    load.release.set()
+    assert await second == 1
+    assert load.calls == 1
+
+
+async def test_peek_never_loads():
+    clock, load = Clock(), Loader()
+    cache = TTLCache(5, clock)
+    assert cache.peek("k") is None
+    await cache.get("k", load)
+    assert cache.peek("k") == 1
+    clock.now = 5
+    assert cache.peek("k") is None
+    assert load.calls == 1
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRU(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1  # b is now the oldest
+    lru.put("c", 3)
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == (1, None, 3)
+    lru.pop("a")
+    lru.pop("missing")
+    assert len(lru) == 1
+
+
+async def test_expired_entries_swept_on_store():
+    clock, load = Clock(), Loader()
+    cache = TTLCache(5, clock)
+    await cache.get("a", load)
+    clock.now = 5
+    assert len(cache) == 1
+    await cache.get("b", load)
+    assert len(cache) == 1
+    assert await cache.get("b", load) == 2
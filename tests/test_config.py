@@ -11,6 +11,7 @@ def test_valid_config_parses(base_env):
     assert cfg.allowed_stacks == ("media", "vpn")
     assert cfg.dockhand_env == "1"
     assert cfg.log_level == "INFO"
+    assert cfg.stack_cache_ttl == 5.0
 
 
 def test_missing_vars_all_listed():
@@ -39,9 +40,10 @@ def test_stack_name_with_pipe_rejected(base_env):
         Config.from_env(base_env | {"ALLOWED_STACKS": "bad|name"})
 
 
-def test_stack_name_too_long_rejected(base_env):
-    with pytest.raises(ConfigError, match="too long"):
-        Config.from_env(base_env | {"ALLOWED_STACKS": "x" * 56})
+def test_long_stack_names_allowed(base_env):
+    name = "x" * 200
+    cfg = Config.from_env(base_env | {"ALLOWED_STACKS": name, "DOCKHAND_ENV": "1,2"})
+    assert cfg.stack_keys == (name, f"{name}@2")
 
 
 def test_duplicate_stacks_deduped_order_kept(base_env):
@@ -114,3 +116,234 @@ def test_webhook_port_parsed(webhook_env):
 def test_webhook_port_rejected(webhook_env, port):
     with pytest.raises(ConfigError, match="WEBHOOK_PORT"):
         Config.from_env(webhook_env | {"WEBHOOK_PORT": port})
+
+
+def test_webhook_max_pending(webhook_env):
+    assert Config.from_env(webhook_env).webhook.max_pending == 1000
+    env = webhook_env | {"WEBHOOK_MAX_PENDING": "50"}
+    assert Config.from_env(env).webhook.max_pending == 50
+    with pytest.raises(ConfigError, match="WEBHOOK_MAX_PENDING"):
+        Config.from_env(webhook_env | {"WEBHOOK_MAX_PENDING": "0"})
+
+
+def test_stack_cache_ttl_parsed(base_env):
+    cfg = Config.from_env(base_env | {"STACK_CACHE_TTL": "0.5"})
+    assert cfg.stack_cache_ttl == 0.5
+
+
+@pytest.mark.parametrize("ttl", ["soon", "-1", "nan", "inf"])
+def test_stack_cache_ttl_rejected(base_env, ttl):
+    with pytest.raises(ConfigError, match="STACK_CACHE_TTL"):
+        Config.from_env(base_env | {"STACK_CACHE_TTL": ttl})
+
+
+def test_polling_off_by_default(base_env):
+    cfg = Config.from_env(base_env | {"STACK_CACHE_TTL": "2"})
+    assert cfg.poll_interval == 0
+    assert cfg.snapshot_ttl == 2
+
+
+def test_polling_staleness_defaults_to_three_intervals(base_env):
+    cfg = Config.from_env(base_env | {"POLL_INTERVAL": "10"})
+    assert cfg.poll_interval == 10
+    assert cfg.snapshot_ttl == 30
+
+
+def test_polling_staleness_below_interval_rejected(base_env):
+    with pytest.raises(ConfigError, match="POLL_MAX_STALENESS"):
+        Config.from_env(
+            base_env | {"POLL_INTERVAL": "10", "POLL_MAX_STALENESS": "5"}
+        )
+
+
+def test_dockhand_events(base_env):
+    assert not Config.from_env(base_env).dockhand_events
+    assert Config.from_env(base_env | {"DOCKHAND_EVENTS": "on"}).dockhand_events
+
+
+def test_notify_requires_polling(base_env):
+    with pytest.raises(ConfigError, match="POLL_INTERVAL"):
+        Config.from_env(base_env | {"NOTIFY_CHANGES": "true"})
+
+
+def test_notify_parsed(base_env):
+    cfg = Config.from_env(
+        base_env
+        | {"NOTIFY_CHANGES": "yes", "POLL_INTERVAL": "15", "NOTIFY_DEBOUNCE": "30"}
+    )
+    assert cfg.notify_changes
+    assert cfg.notify_debounce == 30
+
+
+def test_invalid_bool_rejected(base_env):
+    with pytest.raises(ConfigError, match="NOTIFY_CHANGES"):
+        Config.from_env(base_env | {"NOTIFY_CHANGES": "maybe"})
+
+
+def test_bulk_defaults(config):
+    assert config.bulk_concurrency == 3
+    assert config.stack_dependencies == ()
+
+
+def test_stack_dependencies_parsed(base_env):
+    cfg = Config.from_env(
+        base_env
+        | {"STACK_DEPENDENCIES": "media:vpn, media:vpn", "BULK_CONCURRENCY": "2"}
+    )
+    assert cfg.stack_dependencies == (("media", "vpn"),)
+    assert cfg.bulk_concurrency == 2
+
+
+@pytest.mark.parametrize("deps", ["media", "media:db", "media:media"])
+def test_stack_dependencies_rejected(base_env, deps):
+    with pytest.raises(ConfigError, match="STACK_DEPENDENCIES"):
+        Config.from_env(base_env | {"STACK_DEPENDENCIES": deps})
+
+
+def test_stack_dependency_cycle_rejected(base_env):
+    with pytest.raises(ConfigError, match="cycle"):
+        Config.from_env(base_env | {"STACK_DEPENDENCIES": "media:vpn,vpn:media"})
+
+
+def test_list_page_size(config, base_env):
+    assert config.list_page_size == 10
+    cfg = Config.from_env(base_env | {"LIST_PAGE_SIZE": "25"})
+    assert cfg.list_page_size == 25
+    with pytest.raises(ConfigError, match="at most 90"):
+        Config.from_env(base_env | {"LIST_PAGE_SIZE": "91"})
+    with pytest.raises(ConfigError, match="LIST_PAGE_SIZE"):
+        Config.from_env(base_env | {"LIST_PAGE_SIZE": "0"})
+
+
+def test_stats_cache_ttl(config, base_env):
+    assert config.stats_cache_ttl == 5
+    assert Config.from_env(base_env | {"STATS_CACHE_TTL": "0"}).stats_cache_ttl == 0
+    with pytest.raises(ConfigError, match="STATS_CACHE_TTL"):
+        Config.from_env(base_env | {"STATS_CACHE_TTL": "-1"})
+
+
+def test_logs_settings(config, base_env):
+    assert (config.logs_tail, config.logs_follow_seconds) == (100, 120)
+    cfg = Config.from_env(base_env | {"LOGS_TAIL": "500", "LOGS_FOLLOW_SECONDS": "30"})
+    assert (cfg.logs_tail, cfg.logs_follow_seconds) == (500, 30)
+    with pytest.raises(ConfigError, match="at most 1000"):
+        Config.from_env(base_env | {"LOGS_TAIL": "1001"})
+    with pytest.raises(ConfigError, match="LOGS_FOLLOW_SECONDS"):
+        Config.from_env(base_env | {"LOGS_FOLLOW_SECONDS": "0"})
+
+
+def test_dockhand_resilience_settings(config, base_env):
+    assert (
+        config.dockhand_retries,
+        config.breaker_threshold,
+        config.breaker_cooldown,
+    ) == (2, 5, 10)
+    cfg = Config.from_env(
+        base_env
+        | {
+            "DOCKHAND_RETRIES": "0",
+            "DOCKHAND_BREAKER_THRESHOLD": "3",
+            "DOCKHAND_BREAKER_COOLDOWN": "2.5",
+        }
+    )
+    assert (cfg.dockhand_retries, cfg.breaker_threshold, cfg.breaker_cooldown) == (
+        0,
+        3,
+        2.5,
+    )
+    for name, value in [
+        ("DOCKHAND_RETRIES", "-1"),
+        ("DOCKHAND_RETRIES", "11"),
+        ("DOCKHAND_RETRIES", "x"),
+        ("DOCKHAND_BREAKER_THRESHOLD", "0"),
+        ("DOCKHAND_BREAKER_COOLDOWN", "0"),
+    ]:
+        with pytest.raises(ConfigError, match=name):
+            Config.from_env(base_env | {name: value})
+
+
+def test_history_settings(config, base_env, tmp_path):
+    assert (config.history_db, config.history_retention_days) == ("", 90)
+    db = str(tmp_path / "history.db")
+    cfg = Config.from_env(
+        base_env | {"HISTORY_DB": db, "HISTORY_RETENTION_DAYS": "7.5"}
+    )
+    assert (cfg.history_db, cfg.history_retention_days) == (db, 7.5)
+    with pytest.raises(ConfigError, match="directory does not exist"):
+        Config.from_env(base_env | {"HISTORY_DB": str(tmp_path / "no" / "h.db")})
+    with pytest.raises(ConfigError, match="HISTORY_RETENTION_DAYS"):
+        Config.from_env(base_env | {"HISTORY_RETENTION_DAYS": "0"})
+
+
+def test_schedule_settings(config, base_env, tmp_path):
+    assert (config.schedule_db, config.schedule_misfire_grace) == ("", 300)
+    db = str(tmp_path / "schedules.db")
+    cfg = Config.from_env(
+        base_env | {"SCHEDULE_DB": db, "SCHEDULE_MISFIRE_GRACE": "900"}
+    )
+    assert (cfg.schedule_db, cfg.schedule_misfire_grace) == (db, 900)
+    with pytest.raises(ConfigError, match="SCHEDULE_DB directory does not exist"):
+        Config.from_env(base_env | {"SCHEDULE_DB": str(tmp_path / "no" / "s.db")})
+    with pytest.raises(ConfigError, match="SCHEDULE_MISFIRE_GRACE"):
+        Config.from_env(base_env | {"SCHEDULE_MISFIRE_GRACE": "-1"})
+
+
+def test_update_workers(config, base_env):
+    assert config.update_workers == 8
+    assert Config.from_env(base_env | {"UPDATE_WORKERS": "1"}).update_workers == 1
+    with pytest.raises(ConfigError, match="UPDATE_WORKERS"):
+        Config.from_env(base_env | {"UPDATE_WORKERS": "0"})
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "x"])
+def test_bulk_concurrency_rejected(base_env, value):
+    with pytest.raises(ConfigError, match="BULK_CONCURRENCY"):
+        Config.from_env(base_env | {"BULK_CONCURRENCY": value})
+
+
+def test_action_timeout(base_env):
+    assert Config.from_env(base_env).action_timeout == 300
+    assert Config.from_env(base_env | {"ACTION_TIMEOUT": "90"}).action_timeout == 90
+    with pytest.raises(ConfigError, match="ACTION_TIMEOUT"):
+        Config.from_env(base_env | {"ACTION_TIMEOUT": "0"})
+
+
+def test_metrics_settings(base_env):
+    cfg = Config.from_env(base_env)
+    assert not cfg.metrics_enabled and cfg.metrics_port == 5555
+    cfg = Config.from_env(
+        base_env | {"METRICS_ENABLED": "true", "METRICS_PORT": "9464"}
+    )
+    assert cfg.metrics_enabled and cfg.metrics_port == 9464
+    with pytest.raises(ConfigError, match="METRICS_PORT"):
+        Config.from_env(base_env | {"METRICS_PORT": "0"})
+
+
+def test_single_env_has_no_extra_envs(config):
+    assert config.extra_envs == ()
+    assert config.environments == {"1": ("media", "vpn")}
+    assert config.stack_keys == ("media", "vpn")
+
+
+def test_multiple_envs_with_own_allowlists(base_env):
+    cfg = Config.from_env(
+        base_env | {"DOCKHAND_ENV": "1, 3, 2", "ALLOWED_STACKS_3": "db"}
+    )
+    assert cfg.dockhand_env == "1"
+    assert cfg.environments == {
+        "1": ("media", "vpn"),
+        "3": ("db",),
+        "2": ("media", "vpn"),
+    }
+    assert cfg.stack_keys == ("media", "vpn", "db@3", "media@2", "vpn@2")
+
+
+def test_env_separator_rejected_in_stack_names(base_env):
+    with pytest.raises(ConfigError, match="'@'"):
+        Config.from_env(base_env | {"ALLOWED_STACKS": "media@2"})
+
+
+def test_env_timeout(base_env):
+    assert Config.from_env(base_env | {"ENV_TIMEOUT": "3"}).env_timeout == 3
+    with pytest.raises(ConfigError, match="ENV_TIMEOUT"):
+        Config.from_env(base_env | {"ENV_TIMEOUT": "0"})
@@ -0,0 +1,67 @@
+import datetime as dt
+
+import pytest
+
+from bot.cron import Cron, CronError
+
+
+def _next(expr, after):
+    start = dt.datetime.fromisoformat(after).timestamp()
+    return dt.datetime.fromtimestamp(Cron.parse(expr).next_after(start))
+
+
+@pytest.mark.parametrize(
+    ("expr", "after", "expected"),
+    [
+        ("0 4 * * *", "2026-03-01 03:59", "2026-03-01 04:00"),
+        ("0 4 * * *", "2026-03-01 04:00", "2026-03-02 04:00"),
+        ("*/15 * * * *", "2026-03-01 10:07:30", "2026-03-01 10:15"),
+        ("30 2 * * mon-fri", "2026-10-16 03:00", "2026-10-19 02:30"),  # Fri -> Mon
+        ("0 0 * * 7", "2026-10-18 00:00", "2026-10-25 00:00"),  # Sunday as 7
+        ("0 12 1 jan,jul *", "2026-02-01 00:00", "2026-07-01 12:00"),
+        ("0 0 29 2 *", "2026-01-01 00:00", "2028-02-29 00:00"),
+        ("5/20 8-9 * * *", "2026-03-01 08:30", "2026-03-01 08:45"),
+        ("0 0 31 * *", "2026-04-01 00:00", "2026-05-31 00:00"),
+        ("@monthly", "2026-01-15 00:00", "2026-02-01 00:00"),
+        ("@hourly", "2026-01-15 23:10", "2026-01-16 00:00"),
+    ],
+)
+def test_next_after(expr, after, expected):
+    assert _next(expr, after) == dt.datetime.fromisoformat(expected)
+
+
+def test_restricted_day_fields_match_either():
+    # the 13th, or any Friday (Vixie cron semantics)
+    assert _next("0 0 13 * fri", "2026-10-10 00:00") == dt.datetime(2026, 10, 13)
+    assert _next("0 0 13 * fri", "2026-10-13 00:00") == dt.datetime(2026, 10, 16)
+
+
+def test_step_on_star_day_counts_as_unrestricted():
+    # odd days AND Mondays, not OR: skips the even-dated Mondays
+    assert _next("0 0 */2 * mon", "2026-10-19 00:00") == dt.datetime(2026, 11, 9)
+
+
+def test_parse_keeps_normalised_text():
+    assert Cron.parse("  0  4 * *   * ").expr == "0 4 * * *"
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "0 4 * *",
+        "60 * * * *",
+        "* 24 * * *",
+        "* * 0 * *",
+        "* * * 13 *",
+        "* * * * 8",
+        "*/0 * * * *",
+        "5-1 * * * *",
+        "x * * * *",
+        "* * * * funday",
+        "0 0 30 2 *",
+        "@sometimes",
+    ],
+)
+def test_invalid_expressions(expr):
+    with pytest.raises(CronError):
+        Cron.parse(expr)
@@ -1,85 +1,358 @@
+import asyncio
+
+import httpx
 import pytest
-import requests
-import responses
 
-from bot.dockhand import DockhandClient, DockhandError
+from bot.breaker import CircuitBreaker
+from bot.dockhand import (
+    DockhandClient,
+    DockhandDown,
+    DockhandError,
+    EventsUnsupported,
+)
+from bot.metrics import DOCKHAND_RETRIES
 
 BASE = "http://dockhand:3000"
 
 
-@pytest.fixture
-def client():
-    return DockhandClient(BASE, "dh_test")
+@pytest.fixture(autouse=True)
+def _no_retry_delay(monkeypatch):
+    monkeypatch.setattr(DockhandClient, "RETRY_BACKOFF", 0)
+
+
+class FakeDockhand:
+    """Records requests and answers each with a canned response (or raises)."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request)
+        result = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _client(fake, env=None, **kwargs):
+    return DockhandClient(
+        BASE, "dh_test", env, transport=httpx.MockTransport(fake), **kwargs
+    )
+
+
+async def test_list_stacks_success_and_auth_header():
+    fake = FakeDockhand(httpx.Response(200, json=[{"name": "media"}]))
+    assert await _client(fake).list_stacks() == [{"name": "media"}]
+    assert fake.calls[0].url.path == "/api/stacks"
+    assert fake.calls[0].headers["Authorization"] == "Bearer dh_test"
 
 
-@responses.activate
-def test_list_stacks_success_and_auth_header(client):
-    responses.get(f"{BASE}/api/stacks", json=[{"name": "media"}])
-    assert client.list_stacks() == [{"name": "media"}]
-    assert responses.calls[0].request.headers["Authorization"] == "Bearer dh_test"
+async def test_env_param_sent_when_configured():
+    fake = FakeDockhand(httpx.Response(200, json=[]))
+    await _client(fake, env="prod").list_stacks()
+    assert fake.calls[0].url.params["env"] == "prod"
 
 
-@responses.activate
-def test_env_param_sent_when_configured():
-    client = DockhandClient(BASE, "dh_test", env="prod")
-    responses.get(f"{BASE}/api/stacks", json=[])
-    client.list_stacks()
-    assert "env=prod" in responses.calls[0].request.url
+async def test_env_view_shares_pool_and_scopes_env():
+    fake = FakeDockhand(httpx.Response(200, json=[]))
+    client = _client(fake, env="1")
+    view = client.for_env("2")
+    assert client.for_env("2") is view
+    assert client.for_env("1") is client
+    await view.list_stacks()
+    await client.list_stacks()
+    assert [r.url.params["env"] for r in fake.calls] == ["2", "1"]
+    await view.aclose()
 
 
-@responses.activate
-def test_no_env_param_by_default(client):
-    responses.get(f"{BASE}/api/stacks", json=[])
-    client.list_stacks()
-    assert "env=" not in responses.calls[0].request.url
+async def test_no_env_param_by_default():
+    fake = FakeDockhand(httpx.Response(200, json=[]))
+    await _client(fake).list_stacks()
+    assert "env" not in fake.calls[0].url.params
 
 
-@responses.activate
-def test_actions_post_to_right_endpoints(client):
+async def test_actions_post_to_right_endpoints():
+    fake = FakeDockhand(httpx.Response(200, json={"success": True}))
+    client = _client(fake)
     for action in ("start", "stop", "restart"):
-        responses.post(f"{BASE}/api/stacks/media/{action}", json={"success": True})
-        client.stack_action("media", action)
-    assert len(responses.calls) == 3
+        await client.stack_action("media", action)
+    assert [(r.method, r.url.path) for r in fake.calls] == [
+        ("POST", "/api/stacks/media/start"),
+        ("POST", "/api/stacks/media/stop"),
+        ("POST", "/api/stacks/media/restart"),
+    ]
+
+
+async def test_container_stats_fetches_inspect_and_stats():
+    def fake(request):
+        if request.url.path.endswith("/stats"):
+            return httpx.Response(200, json={"memory_stats": {"usage": 1}})
+        return httpx.Response(200, json={"RestartCount": 0})
+
+    client = DockhandClient(BASE, "t", "1", transport=httpx.MockTransport(fake))
+    inspect, stats = await client.container_stats("media app")
+    assert inspect == {"RestartCount": 0}
+    assert stats == {"memory_stats": {"usage": 1}}
+
+
+async def test_container_stats_none_for_stopped_container():
+    def fake(request):
+        if request.url.path.endswith("/stats"):
+            return httpx.Response(409, json={"error": "not running"})
+        return httpx.Response(200, json={"RestartCount": 0})
+
+    client = DockhandClient(BASE, "t", transport=httpx.MockTransport(fake))
+    assert await client.container_stats("abc") == ({"RestartCount": 0}, None)
+
+
+async def test_container_stats_missing_container_raises():
+    fake = FakeDockhand(httpx.Response(404, json={}))
+    with pytest.raises(DockhandError, match="404"):
+        await _client(fake).container_stats("gone")
 
 
-@responses.activate
-def test_stack_name_is_url_quoted(client):
-    responses.post(f"{BASE}/api/stacks/my%20stack/restart", json={"success": True})
-    client.stack_action("my stack", "restart")
+async def test_container_logs_stream_lines():
+    fake = FakeDockhand(httpx.Response(200, content=b"one\ntwo\nthree"))
+    client = _client(fake, env="1")
+    lines = [line async for line in client.container_logs("abc", 3)]
+    assert lines == ["one", "two", "three"]
+    request = fake.calls[0]
+    assert request.url.path == "/api/containers/abc/logs"
+    assert request.url.params["tail"] == "3"
+    assert request.url.params["env"] == "1"
+    assert "follow" not in request.url.params
 
 
-@responses.activate
-def test_action_accepts_empty_body(client):
+async def test_events_stream_and_resume_header():
+    body = b'id: 4\ndata: {"Type": "container"}\n\n: ping\n\n'
+    fake = FakeDockhand(httpx.Response(200, content=body))
+    stream = await _client(fake, env="2").events("3")
+    events = [event async for event in stream]
+    await stream.aclose()
+    assert [(e.id, e.data) for e in events] == [("4", '{"Type": "container"}')]
+    request = fake.calls[0]
+    assert request.url.path == "/api/events"
+    assert request.url.params["env"] == "2"
+    assert request.headers["Last-Event-ID"] == "3"
+    assert request.headers["Accept"] == "text/event-stream"
+    assert request.extensions["timeout"]["read"] is None
+
+
+async def test_events_unsupported():
+    fake = FakeDockhand(httpx.Response(404))
+    with pytest.raises(EventsUnsupported):
+        await _client(fake).events()
+    assert "Last-Event-ID" not in fake.calls[0].headers
+
+
+async def test_container_logs_follow_has_no_read_timeout():
+    fake = FakeDockhand(httpx.Response(200, content=b"x\n"))
+    stream = _client(fake).container_logs("abc", 10, follow=True)
+    assert await anext(stream) == "x"
+    await stream.aclose()
+    assert fake.calls[0].url.params["follow"] == "true"
+    assert fake.calls[0].extensions["timeout"]["read"] is None
+
+
+async def test_stack_name_is_url_quoted():
+    fake = FakeDockhand(httpx.Response(200, json={"success": True}))
+    await _client(fake).stack_action("my stack", "restart")
+    assert fake.calls[0].url.raw_path == b"/api/stacks/my%20stack/restart"
+
+
+async def test_action_accepts_empty_body():
     """Only the status code carries the outcome; an empty 204 is success."""
-    responses.post(f"{BASE}/api/stacks/media/stop", status=204, body="")
-    client.stack_action("media", "stop")
+    fake = FakeDockhand(httpx.Response(204))
+    await _client(fake).stack_action("media", "stop")
+
 
+async def test_list_and_action_use_their_own_timeouts():
+    fake = FakeDockhand(httpx.Response(200, json=[]))
+    client = _client(fake)
+    await client.list_stacks()
+    await client.stack_action("media", "restart")
+    list_timeout, action_timeout = (r.extensions["timeout"] for r in fake.calls)
+    assert list_timeout["read"] == 15
+    assert action_timeout["read"] == 180
 
-@responses.activate
-def test_401_raises_token_error(client):
-    responses.get(f"{BASE}/api/stacks", status=401, json={})
+
+async def test_401_raises_token_error():
+    fake = FakeDockhand(httpx.Response(401, json={}))
     with pytest.raises(DockhandError, match="token"):
-        client.list_stacks()
+        await _client(fake).list_stacks()
 
 
-@responses.activate
-def test_5xx_raises(client):
-    responses.post(f"{BASE}/api/stacks/media/stop", status=500, json={})
+async def test_5xx_raises():
+    fake = FakeDockhand(httpx.Response(500, json={}))
     with pytest.raises(DockhandError, match="500"):
-        client.stack_action("media", "stop")
+        await _client(fake).stack_action("media", "stop")
 
 
-@responses.activate
-def test_connection_error_raises(client):
-    responses.get(
-        f"{BASE}/api/stacks", body=requests.exceptions.ConnectionError("boom")
-    )
+async def test_connection_error_raises():
+    fake = FakeDockhand(httpx.ConnectError("boom"))
     with pytest.raises(DockhandError, match="unreachable"):
-        client.list_stacks()
+        await _client(fake).list_stacks()
 
 
-@responses.activate
-def test_invalid_json_raises(client):
-    responses.get(f"{BASE}/api/stacks", body="<html>login</html>")
+async def test_invalid_json_raises():
+    fake = FakeDockhand(httpx.Response(200, text="<html>login</html>"))
     with pytest.raises(DockhandError, match="JSON"):
-        client.list_stacks()
+        await _client(fake).list_stacks()
+
+
+_MEDIA = {"name": "media", "status": "running"}
+
+
+async def test_get_stack_uses_single_stack_endpoint():
+    fake = FakeDockhand(httpx.Response(200, json=_MEDIA))
+    client = _client(fake)
+    assert await client.get_stack("media") == _MEDIA
+    assert await client.get_stack("media") == _MEDIA
+    assert [r.url.path for r in fake.calls] == ["/api/stacks/media"] * 2
+
+
+async def test_get_stack_404_after_endpoint_seen_means_missing():
+    fake = FakeDockhand(
+        httpx.Response(200, json=_MEDIA), httpx.Response(404, json={})
+    )
+    client = _client(fake)
+    await client.get_stack("media")
+    assert await client.get_stack("gone") is None
+    assert len(fake.calls) == 2
+
+
+async def test_get_stack_falls_back_to_list_and_remembers():
+    fake = FakeDockhand(
+        httpx.Response(405),
+        httpx.Response(200, json=[{"name": "vpn"}, _MEDIA]),
+    )
+    client = _client(fake)
+    assert await client.get_stack("media") == _MEDIA
+    assert await client.get_stack("media") == _MEDIA
+    assert [r.url.path for r in fake.calls] == [
+        "/api/stacks/media",
+        "/api/stacks",
+        "/api/stacks",
+    ]
+
+
+async def test_get_stack_ignores_non_entry_response():
+    """A 200 that isn't the stack entry (e.g. an HTML shell) means no route."""
+    fake = FakeDockhand(
+        httpx.Response(200, text="<html></html>"), httpx.Response(200, json=[_MEDIA])
+    )
+    assert await _client(fake).get_stack("media") == _MEDIA
+
+
+async def test_get_stack_missing_everywhere_keeps_probing():
+    fake = FakeDockhand(httpx.Response(404), httpx.Response(200, json=[]))
+    client = _client(fake)
+    assert await client.get_stack("gone") is None
+    fake.responses = [httpx.Response(200, json=_MEDIA)]
+    assert await client.get_stack("media") == _MEDIA
+
+
+async def test_list_stacks_by_name_streams_and_stops_early():
+    sent = []
+
+    async def body():
+        for part in (b'[{"name": "vpn", "x": 1},', b'{"name": "media"},', b'{"name"'):
+            sent.append(part)
+            yield part
+        raise AssertionError("read past the last wanted stack")
+
+    fake = FakeDockhand(httpx.Response(200, content=body()))
+    entries = await _client(fake).list_stacks(["media", "vpn"])
+    assert entries == [{"name": "vpn", "x": 1}, {"name": "media"}]
+    assert len(sent) == 2
+
+
+async def test_list_stacks_by_name_missing_stack_reads_to_end():
+    fake = FakeDockhand(httpx.Response(200, json=[{"name": "vpn"}, _MEDIA]))
+    assert await _client(fake).list_stacks(["media", "nope"]) == [_MEDIA]
+
+
+async def test_list_stacks_by_name_invalid_json_raises():
+    fake = FakeDockhand(httpx.Response(200, text="<html>login</html>"))
+    with pytest.raises(DockhandError, match="JSON"):
+        await _client(fake).list_stacks(["media"])
+
+
+async def test_list_stacks_by_name_http_error_raises():
+    fake = FakeDockhand(httpx.Response(502, text="bad gateway"))
+    with pytest.raises(DockhandError, match="502"):
+        await _client(fake).list_stacks(["media"])
+
+
+async def test_get_retried_through_a_restart():
+    fake = FakeDockhand(
+        httpx.ConnectError("refused"),
+        httpx.Response(503, text="starting"),
+        httpx.Response(200, json=[_MEDIA]),
+    )
+    before = DOCKHAND_RETRIES.value(method="GET")
+    assert await _client(fake).list_stacks() == [_MEDIA]
+    assert len(fake.calls) == 3
+    assert DOCKHAND_RETRIES.value(method="GET") == before + 2
+
+
+async def test_get_gives_up_after_retries():
+    fake = FakeDockhand(httpx.Response(502, text="bad gateway"))
+    with pytest.raises(DockhandError, match="502"):
+        await _client(fake, retries=1).list_stacks()
+    assert len(fake.calls) == 2
+
+
+async def test_post_retried_only_when_never_sent():
+    fake = FakeDockhand(httpx.ConnectError("refused"), httpx.Response(200))
+    await _client(fake).stack_action("media", "restart")
+    assert len(fake.calls) == 2
+
+    for failure in (httpx.ReadTimeout("slow"), httpx.Response(503)):
+        fake = FakeDockhand(failure)
+        with pytest.raises(DockhandError):
+            await _client(fake).stack_action("media", "restart")
+        assert len(fake.calls) == 1
+
+
+async def test_client_errors_are_not_retried():
+    fake = FakeDockhand(httpx.Response(404, json={}))
+    with pytest.raises(DockhandError, match="404"):
+        await _client(fake).list_stacks()
+    assert len(fake.calls) == 1
+
+
+async def test_breaker_fails_fast_until_probe_succeeds():
+    fake = FakeDockhand(httpx.ConnectError("refused"))
+    breaker = CircuitBreaker(threshold=2, cooldown=0.01)
+    client = _client(fake, retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(DockhandError, match="unreachable"):
+            await client.list_stacks()
+    with pytest.raises(DockhandDown, match=r"Dockhand down since \d\d:\d\d"):
+        await client.for_env("2").list_stacks()  # views share the breaker
+    assert len(fake.calls) == 2
+
+    fake.responses = [httpx.Response(200, json=[_MEDIA])]
+    async with asyncio.timeout(1):
+        while not breaker.closed:
+            await asyncio.sleep(0.01)
+    probe = fake.calls[-1]
+    assert probe.method == "GET" and probe.url.path == "/api/stacks"
+    assert await client.list_stacks() == [_MEDIA]
+    await client.aclose()
+
+
+async def test_answers_reset_the_failure_count():
+    breaker = CircuitBreaker(threshold=2)
+    fake = FakeDockhand(
+        httpx.ConnectError("refused"),
+        httpx.Response(500, json={}),
+        httpx.ConnectError("refused"),
+    )
+    client = _client(fake, retries=0, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(DockhandError):
+            await client.list_stacks()
+    assert breaker.closed  # the 500 was an answer: Dockhand is up
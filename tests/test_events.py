@@ -0,0 +1,213 @@
+import asyncio
+import json
+
+import pytest
+
+from bot.dockhand import DockhandError, EventsUnsupported
+from bot.events import StackEvents
+from bot.metrics import STACK_RESYNCS
+from bot.sse import ServerEvent
+from bot.stacks import Container, Stack, StackStatus
+
+
+@pytest.fixture(autouse=True)
+def _no_reconnect_delay(monkeypatch):
+    monkeypatch.setattr(StackEvents, "RECONNECT", 0.0)
+
+
+def _event(seq, action, stack="media", name="media-app-1"):
+    payload = {
+        "Type": "container",
+        "Action": action,
+        "Actor": {
+            "ID": f"{name}-id",
+            "Attributes": {"name": name, "com.docker.compose.project": stack},
+        },
+    }
+    return ServerEvent(json.dumps(payload), id=str(seq))
+
+
+class FakeStream:
+    def __init__(self, *events):
+        self.queue = asyncio.Queue()
+        for event in events:
+            self.queue.put_nowait(event)
+        self.closed = False
+
+    def end(self):
+        self.queue.put_nowait(None)
+
+    async def __aiter__(self):
+        while (event := await self.queue.get()) is not None:
+            yield event
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeClient:
+    """events() hands out the given streams (or raises), then one that
+    never ends."""
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.last_ids = []
+
+    def for_env(self, env):
+        return self
+
+    async def events(self, last_id=None):
+        self.last_ids.append(last_id)
+        stream = self.streams.pop(0) if self.streams else FakeStream()
+        if isinstance(stream, Exception):
+            raise stream
+        return stream
+
+
+class Resync:
+    def __init__(self, *stacks):
+        self.stacks = {s.name: s for s in stacks}
+        self.calls = 0
+
+    async def __call__(self, env):
+        self.calls += 1
+        return dict(self.stacks)
+
+
+def _media(state="running"):
+    return Stack(
+        "media",
+        StackStatus.RUNNING if state == "running" else StackStatus.STOPPED,
+        (Container("media-app-1", state, "media-app-1-id"),),
+    )
+
+
+async def _until(check):
+    async with asyncio.timeout(2):
+        while not check():
+            await asyncio.sleep(0.001)
+
+
+@pytest.fixture
+async def started():
+    running = []
+
+    def start(client, resync, envs=None, on_change=None):
+        events = StackEvents(
+            client, envs or {"": ("media", "vpn")}, resync, on_change
+        )
+        events.start()
+        running.append(events)
+        return events
+
+    yield start
+    for events in running:
+        await events.stop()
+
+
+async def test_events_update_the_model_without_fetching(started):
+    stream = FakeStream()
+    resync = Resync(_media())
+    events = started(FakeClient(stream), resync)
+    await _until(lambda: events.index() is not None)
+    before = events.index()
+    stream.queue.put_nowait(_event(1, "die"))
+    stream.queue.put_nowait(_event(2, "create", name="media-db-1"))
+    await _until(lambda: len(events.index()["media"].containers) == 2)
+    media = events.index()["media"]
+    assert [(c.name, c.state) for c in media.containers] == [
+        ("media-app-1", "exited"),
+        ("media-db-1", "created"),
+    ]
+    assert media.status is StackStatus.STOPPED
+    assert before["media"] == _media()  # replaced, not mutated
+    assert resync.calls == 1
+    assert events.live == 1
+
+
+async def test_changes_reported_by_stack_key(started):
+    stream = FakeStream()
+    changes = []
+    events = started(FakeClient(stream), Resync(_media()), on_change=changes.append)
+    await _until(lambda: events.index() is not None)
+    stream.queue.put_nowait(_event(1, "die"))
+    await _until(lambda: len(changes) == 2)
+    assert changes == [{"media": _media()}, {"media": _media("exited")}]
+
+
+async def test_other_stacks_and_event_types_are_ignored(started):
+    stream = FakeStream(
+        _event(1, "die", stack="elsewhere"),
+        ServerEvent(json.dumps({"Type": "network", "Action": "connect"}), id="2"),
+        ServerEvent("not json", id="3"),
+        _event(4, "exec_start: sh"),
+    )
+    resync = Resync(_media())
+    events = started(FakeClient(stream), resync)
+    await _until(lambda: stream.queue.empty())
+    await asyncio.sleep(0.01)
+    assert events.index() == {"media": _media()}
+    assert resync.calls == 1
+
+
+async def test_gap_in_event_ids_resyncs(started):
+    stream = FakeStream(_event(1, "die"))
+    resync = Resync(_media())
+    events = started(FakeClient(stream), resync)
+    await _until(lambda: events.index() and events.index()["media"] != _media())
+    gaps = STACK_RESYNCS.value(reason="gap")
+    stream.queue.put_nowait(_event(5, "start"))
+    await _until(lambda: resync.calls == 2)
+    assert STACK_RESYNCS.value(reason="gap") == gaps + 1
+    await _until(lambda: events.index() is not None)
+    assert events.index()["media"] == _media()
+
+
+async def test_event_for_unknown_allowlisted_stack_resyncs(started):
+    stream = FakeStream(_event(1, "start", stack="vpn", name="vpn-1"))
+    resync = Resync(_media())
+    started(FakeClient(stream), resync)
+    await _until(lambda: resync.calls == 2)
+
+
+async def test_reconnects_and_resumes_after_the_stream_ends(started):
+    first = FakeStream(_event(7, "die"))
+    client = FakeClient(DockhandError("down"), first)
+    resync = Resync(_media())
+    events = started(client, resync)
+    await _until(lambda: events.index() and events.index()["media"] != _media())
+    first.end()
+    await _until(lambda: len(client.last_ids) == 3)
+    assert first.closed
+    assert client.last_ids == [None, None, "7"]
+    await _until(lambda: resync.calls == 2)
+
+
+async def test_model_dropped_while_resync_fails(started):
+    class Failing(Resync):
+        async def __call__(self, env):
+            self.calls += 1
+            raise DockhandError("down")
+
+    client = FakeClient()
+    resync = Failing()
+    events = started(client, resync)
+    await _until(lambda: resync.calls >= 2)
+    assert events.index() is None
+    assert events.live == 0
+
+
+async def test_stops_for_good_without_an_event_endpoint(started):
+    client = FakeClient(EventsUnsupported("no /api/events"))
+    events = started(client, Resync())
+    await asyncio.sleep(0.02)
+    assert client.last_ids == [None]
+    assert events.index() is None
+
+
+def test_reconnect_backoff_is_capped():
+    events = StackEvents(FakeClient(), {}, Resync())
+    events.RECONNECT = 1.0
+    events.JITTER = 0.0
+    assert [events.next_delay(n) for n in (1, 2, 3)] == [1.0, 2.0, 4.0]
+    assert events.next_delay(50) == StackEvents.MAX_BACKOFF
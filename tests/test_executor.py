@@ -0,0 +1,170 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from bot.dockhand import DockhandError
+from bot.executor import ActionConflict, ActionExecutor
+from bot.metrics import ACTION_LOCK_WAIT_SECONDS
+
+
+def _entry(status, *states):
+    return {
+        "name": "media",
+        "status": status,
+        "containerDetails": [
+            {"name": f"c{i}", "state": s} for i, s in enumerate(states)
+        ],
+    }
+
+
+async def test_reports_progress_until_settled():
+    client = AsyncMock()
+    client.get_stack.side_effect = [
+        _entry("partial", "running", "created"),
+        _entry("running", "running", "running"),
+    ]
+    gate = asyncio.Event()
+
+    async def action(name, verb):
+        await gate.wait()
+
+    client.stack_action.side_effect = action
+    seen = []
+
+    async def report(progress):
+        seen.append(progress)
+        if progress.stack is not None:
+            gate.set()  # let the POST finish after the first polled state
+
+    executor = ActionExecutor(client, timeout=5, poll_every=0.01)
+    final = await executor.submit("media", "start", report)
+    assert final.ok
+    assert [p.done for p in seen] == [False, False, True]
+    assert seen[0].stack is None  # submitted, nothing polled yet
+    assert seen[1].stack.status.value == "partially running"
+
+
+async def test_running_before_post_returns_is_not_settled():
+    # Restart of a running stack: it looks RUNNING while the POST is in flight.
+    client = AsyncMock()
+    client.get_stack.return_value = _entry("running", "running")
+    done = asyncio.Event()
+
+    async def action(name, verb):
+        await asyncio.sleep(0.05)
+        done.set()
+
+    client.stack_action.side_effect = action
+    final = await ActionExecutor(client, timeout=5, poll_every=0.01).run(
+        "media", "restart"
+    )
+    assert final.ok and done.is_set()
+
+
+async def test_post_failure_ends_run():
+    client = AsyncMock()
+    client.stack_action.side_effect = DockhandError("Dockhand returned HTTP 500")
+    final = await ActionExecutor(client, timeout=5, poll_every=0.01).run(
+        "media", "stop"
+    )
+    assert final.done and final.error == "Dockhand returned HTTP 500"
+
+
+async def test_times_out_when_never_settling():
+    client = AsyncMock()
+    client.get_stack.return_value = _entry("partial", "running", "exited")
+    final = await ActionExecutor(client, timeout=0.05, poll_every=0.01).run(
+        "media", "start"
+    )
+    assert final.error == "still partially running after 0.05s"
+
+
+async def test_poll_errors_are_tolerated():
+    client = AsyncMock()
+    client.get_stack.side_effect = [
+        DockhandError("Dockhand unreachable (x)"),
+        _entry("stopped"),
+    ]
+    final = await ActionExecutor(client, timeout=5, poll_every=0.01).run(
+        "media", "stop"
+    )
+    assert final.ok
+
+
+async def test_aclose_cancels_jobs():
+    client = AsyncMock()
+
+    async def hang(name, verb):
+        await asyncio.sleep(3600)
+
+    client.stack_action.side_effect = hang
+    executor = ActionExecutor(client, timeout=3600, poll_every=3600)
+    task = executor.submit("media", "start")
+    await asyncio.sleep(0)
+    await executor.aclose()
+    assert task.cancelled()
+
+
+def _blocked_client():
+    client = AsyncMock()
+    gate = asyncio.Event()
+
+    async def action(name, verb):
+        await gate.wait()
+
+    client.stack_action.side_effect = action
+    client.get_stack.side_effect = lambda name: _entry(
+        "running" if gate.is_set() else "partial", "running"
+    )
+    return client, gate
+
+
+async def test_identical_action_attaches_to_inflight():
+    client, gate = _blocked_client()
+    executor = ActionExecutor(client, timeout=5, poll_every=0.01)
+    first_seen, second_seen = [], []
+
+    async def first(p):
+        first_seen.append(p)
+
+    async def second(p):
+        second_seen.append(p)
+
+    first_task = executor.submit("media", "restart", first)
+    assert executor.submit("media", "restart", second) is first_task
+    gate.set()
+    final = await first_task
+    await executor.join()
+    assert final.ok
+    client.stack_action.assert_awaited_once()
+    assert executor.coalesced == 1
+    assert first_seen[-1] is final and second_seen[-1] is final
+
+
+async def test_conflicting_action_rejected():
+    client, _ = _blocked_client()
+    executor = ActionExecutor(client, timeout=5, poll_every=0.01)
+    executor.submit("media", "restart")
+    with pytest.raises(ActionConflict) as info:
+        executor.submit("media", "stop")
+    assert info.value.verb == "restart"
+    executor.submit("vpn", "stop")  # other stacks are independent
+    await executor.aclose()
+
+
+async def test_run_queues_behind_conflicting_action():
+    client, gate = _blocked_client()
+    executor = ActionExecutor(client, timeout=5, poll_every=0.01)
+    waits_before = ACTION_LOCK_WAIT_SECONDS.count()
+    executor.submit("media", "start")
+    queued = asyncio.create_task(executor.run("media", "restart"))
+    await asyncio.sleep(0.05)
+    assert not queued.done()
+    gate.set()
+    assert (await queued).ok
+    assert [c.args[1] for c in client.stack_action.await_args_list] == [
+        "start",
+        "restart",
+    ]
+    assert ACTION_LOCK_WAIT_SECONDS.count() == waits_before + 1
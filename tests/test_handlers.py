@@ -1,13 +1,53 @@
-from unittest.mock import AsyncMock, MagicMock
+import asyncio
+import datetime as dt
+import sqlite3
+from dataclasses import replace
+from unittest.mock import AsyncMock, MagicMock, call
 
+from telegram import Message
+
+from bot.cache import TTLCache
+from bot.cron import Cron
 from bot.dockhand import DockhandError
-from bot.handlers import on_callback, render_detail, render_list
-from bot.stacks import Container, Stack, StackStatus
+from bot.executor import ActionExecutor
+from bot.handlers import (
+    cmd_docker,
+    cmd_history,
+    cmd_logs,
+    cmd_schedule,
+    on_callback,
+    render_container,
+    render_detail,
+    render_history,
+    render_list,
+    render_schedules,
+    report_missed,
+    run_scheduled,
+)
+from bot.history import ActionRecord, HistoryStore, StateRecord
+from bot.keyboards import Action, Allowlist, ListView, StackFilter, encode
+from bot.metrics import CALLBACK_REJECTED, EDIT_SKIPPED
+from bot.outbox import Outbox
+from bot.render import RenderCache
+from bot.scheduler import Schedule, Scheduler, ScheduleStore
+from bot.stacks import Container, ContainerStats, Stack, StackStatus
 
 
 def _ctx(config, client):
     context = MagicMock()
-    context.bot_data = {"config": config, "client": client}
+    context.bot_data = {
+        "config": config,
+        "client": client,
+        "allowlist": Allowlist(config.stack_keys),
+        "cache": TTLCache(60),
+        "stats": TTLCache(60),
+        "renders": RenderCache(),
+        "outbox": Outbox(global_rate=1000, chat_rate=1000, chat_burst=1000),
+        "executor": ActionExecutor(client, timeout=1, poll_every=0.01),
+        "follows": {},
+    }
+    context.chat_data = {}
+    context.args = []
     return context
 
 
@@ -43,54 +83,850 @@ def test_render_detail_escapes_html():
     assert "&lt;b&gt;x&lt;/b&gt;" in text
 
 
+def test_render_container_stats():
+    stats = ContainerStats(
+        cpu_percent=12.345,
+        memory_used=200 * 2**20,
+        memory_limit=2 * 2**30,
+        restarts=1,
+        started_at=1000.0,
+        health="healthy",
+    )
+    stack = Stack("media", StackStatus.RUNNING)
+    text = render_container(stack, Container("media-app-1", "running"), stats, 94600)
+    assert "State: running, healthy" in text
+    assert "CPU: 12.3%" in text
+    assert "Memory: 200.0 MiB / 2.0 GiB (9.8%)" in text
+    assert "Restarts: 1" in text
+    assert "Up: 1d 2h" in text
+
+
+def test_render_container_without_stats():
+    stack = Stack("media", StackStatus.STOPPED)
+    text = render_container(stack, Container("a", "exited"), ContainerStats())
+    assert "CPU: —" in text
+    assert "Memory: —" in text
+    assert "Up:" not in text
+
+
 async def test_invalid_callback_rejected_without_action(config):
     update, q = _update("start|not-allowlisted")
     client = MagicMock()
+    rejected = CALLBACK_REJECTED.value()
     await on_callback(update, _ctx(config, client))
+    assert CALLBACK_REJECTED.value() == rejected + 1
     q.answer.assert_awaited_once()
     q.edit_message_text.assert_not_awaited()
     client.stack_action.assert_not_called()
 
 
 async def test_stop_asks_for_confirmation_without_calling_api(config):
-    update, q = _update("stop|media")
+    update, q = _update(encode(Action.STOP, "media"))
     client = MagicMock()
     await on_callback(update, _ctx(config, client))
     client.stack_action.assert_not_called()
     kb = q.edit_message_text.await_args.kwargs["reply_markup"]
-    assert kb.inline_keyboard[0][0].callback_data == "cstop|media"
+    confirm = encode(Action.CONFIRM_STOP, "media")
+    assert kb.inline_keyboard[0][0].callback_data == confirm
 
 
 async def test_confirmed_stop_calls_api_and_rerenders(config):
-    client = MagicMock()
-    client.list_stacks.return_value = [
-        {"name": "media", "status": "stopped", "containers": []}
-    ]
-    update, q = _update("cstop|media")
-    await on_callback(update, _ctx(config, client))
-    client.stack_action.assert_called_once_with("media", "stop")
+    client = AsyncMock()
+    client.get_stack.return_value = {
+        "name": "media",
+        "status": "stopped",
+        "containers": [],
+    }
+    update, q = _update(encode(Action.CONFIRM_STOP, "media"))
+    context = _ctx(config, client)
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    client.stack_action.assert_awaited_once_with("media", "stop")
     final_text = q.edit_message_text.await_args.args[0]
     assert "🔴" in final_text
 
 
-async def test_start_calls_api(config):
-    client = MagicMock()
+async def test_action_returns_before_it_finishes(config):
+    client = AsyncMock()
+    started = asyncio.Event()
+
+    async def slow_action(name, verb):
+        started.set()
+        await asyncio.sleep(3600)
+
+    client.stack_action.side_effect = slow_action
+    client.get_stack.return_value = {
+        "name": "media",
+        "status": "partial",
+        "containerDetails": [
+            {"name": "a", "state": "running"},
+            {"name": "b", "state": "created"},
+        ],
+    }
+    update, q = _update(encode(Action.START, "media"))
+    context = _ctx(config, client)
+    await on_callback(update, context)  # returns while the POST hangs
+    await started.wait()
+    async with asyncio.timeout(1):
+        while "1/2 running" not in q.edit_message_text.await_args.args[0]:
+            await asyncio.sleep(0.01)
+    await context.bot_data["executor"].aclose()
+
+
+async def test_conflicting_action_answers_with_alert(config):
+    client = AsyncMock()
+
+    async def hang(name, verb):
+        await asyncio.sleep(3600)
+
+    client.stack_action.side_effect = hang
+    context = _ctx(config, client)
+    update, _ = _update(encode(Action.RESTART, "media"))
+    await on_callback(update, context)
+    update, q = _update(encode(Action.CONFIRM_STOP, "media"))
+    await on_callback(update, context)
+    assert q.answer.await_args.kwargs == {"show_alert": True}
+    assert "busy" in q.answer.await_args.args[0]
+    await asyncio.sleep(0.01)
+    client.stack_action.assert_awaited_once_with("media", "restart")
+    await context.bot_data["executor"].aclose()
+
+
+async def test_action_failure_shown_with_detail(config):
+    client = AsyncMock()
+    client.stack_action.side_effect = DockhandError("Dockhand returned HTTP 500")
+    client.get_stack.return_value = _MEDIA_RUNNING[0]
+    update, q = _update(encode(Action.RESTART, "media"))
+    context = _ctx(config, client)
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    text = q.edit_message_text.await_args.args[0]
+    assert "HTTP 500" in text
+
+
+async def test_dockhand_error_reported_to_user(config):
+    client = AsyncMock()
+    client.list_stacks.side_effect = DockhandError("Dockhand unreachable (X)")
+    update, q = _update(encode(Action.SHOW, "media"))
+    await on_callback(update, _ctx(config, client))
+    text = q.edit_message_text.await_args.args[0]
+    assert "⚠" in text
+
+
+_MEDIA_RUNNING = [
+    {
+        "name": "media",
+        "status": "running",
+        "containerDetails": [{"name": "c", "state": "running"}],
+    }
+]
+
+
+async def test_show_reuses_cached_snapshot(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    context = _ctx(config, client)
+    for _ in range(3):
+        update, _ = _update(encode(Action.SHOW, "media"))
+        await on_callback(update, context)
+    client.list_stacks.assert_awaited_once()
+
+
+async def test_refresh_bypasses_cache(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    client.get_stack.return_value = _MEDIA_RUNNING[0]
+    context = _ctx(config, client)
+    for data in (encode(Action.SHOW, "media"), encode(Action.REFRESH)):
+        update, _ = _update(data)
+        await on_callback(update, context)
+    assert client.list_stacks.await_count == 2
+
+
+async def test_detail_refresh_fetches_only_that_stack(config):
+    client = AsyncMock()
+    client.get_stack.return_value = _MEDIA_RUNNING[0]
+    update, q = _update(encode(Action.REFRESH, "media"))
+    await on_callback(update, _ctx(config, client))
+    client.get_stack.assert_awaited_once_with("media")
+    client.list_stacks.assert_not_awaited()
+    assert "🟢" in q.edit_message_text.await_args.args[0]
+
+
+async def test_action_invalidates_cached_snapshot(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    stopped = {"name": "media", "status": "stopped", "containerDetails": []}
+    client.get_stack.return_value = stopped
+    context = _ctx(config, client)
+    update, _ = _update(encode(Action.SHOW, "media"))
+    await on_callback(update, context)
+    client.list_stacks.return_value = [stopped]
+    update, _ = _update(encode(Action.CONFIRM_STOP, "media"))
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    update, q = _update(encode(Action.SHOW, "media"))
+    await on_callback(update, context)
+    assert "🔴" in q.edit_message_text.await_args.args[0]
+
+
+def _command(args):
+    update = MagicMock()
+    update.effective_message = AsyncMock()
+    progress = AsyncMock(spec=Message)
+    update.effective_message.reply_text.return_value = progress
+    context_args = args.split()
+    return update, progress, context_args
+
+
+async def test_bulk_command_runs_allowlisted_stacks(config):
+    client = AsyncMock()
+    update, progress, args = _command("restart media,vpn")
+    context = _ctx(config, client)
+    context.args = args
+    client.get_stack.side_effect = lambda name: {"name": name, "status": "running"}
+    await cmd_docker(update, context)
+    await context.bot_data["executor"].join()
+    assert sorted(c.args for c in client.stack_action.await_args_list) == [
+        ("media", "restart"),
+        ("vpn", "restart"),
+    ]
+    summary = progress.edit_text.await_args.args[0]
+    assert "2/2 succeeded" in summary
+
+
+async def test_bulk_command_rejects_unknown_stack(config):
+    client = AsyncMock()
+    update, _, args = _command("stop media secret")
+    context = _ctx(config, client)
+    context.args = args
+    await cmd_docker(update, context)
+    client.stack_action.assert_not_awaited()
+    assert "secret" in update.effective_message.reply_text.await_args.args[0]
+
+
+async def test_start_all_stopped_only_starts_stopped(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = [
+        {"name": "media", "status": "running", "containers": []},
+        {"name": "vpn", "status": "stopped", "containers": []},
+    ]
+    client.get_stack.return_value = {"name": "vpn", "status": "running"}
+    update, q = _update(encode(Action.START_STOPPED))
+    context = _ctx(config, client)
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    client.stack_action.assert_awaited_once_with("vpn", "start")
+    assert "1/1 succeeded" in q.edit_message_text.await_args.args[0]
+
+
+async def test_restart_selected_uses_toggled_stacks(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = [
+        {"name": "media", "status": "running", "containers": []},
+        {"name": "vpn", "status": "running", "containers": []},
+    ]
+    client.get_stack.return_value = {"name": "vpn", "status": "running"}
+    context = _ctx(config, client)
+    for data in (
+        encode(Action.SELECT),
+        encode(Action.TOGGLE, "vpn"),
+        encode(Action.RESTART_SELECTED),
+    ):
+        update, q = _update(data)
+        q.message.message_id = 7
+        await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    client.stack_action.assert_awaited_once_with("vpn", "restart")
+
+
+async def test_restart_selection_pages_and_keeps_ticks(config):
+    names = tuple(f"s{i:03}" for i in range(300))
+    config = replace(config, allowed_stacks=names, list_page_size=90)
+    client = AsyncMock()
+    client.list_stacks.side_effect = lambda wanted: _entries(*wanted)
+    client.get_stack.side_effect = lambda name: _entries(name)[0]
+    context = _ctx(config, client)
+    steps = [
+        (encode(Action.SELECT, view=ListView(1)), [], 0),
+        (encode(Action.TOGGLE, "s100", ListView(1)), ["s100"], 1),
+        (encode(Action.SELECT_PAGE, view=ListView(3)), [], 1),
+        (encode(Action.TOGGLE, "s299", ListView(3)), ["s299"], 2),
+    ]
+    for data, ticked, count in steps:
+        update, q = _update(data)
+        q.message.message_id = 7
+        await on_callback(update, context)
+        kb = q.edit_message_text.await_args.kwargs["reply_markup"].inline_keyboard
+        assert sum(len(row) for row in kb) <= 100
+        texts = [row[0].text for row in kb]
+        assert [t.split()[-1] for t in texts if t.startswith("☑️")] == ticked
+        assert texts[-1] == f"🔁 Restart {count}"
+    # Only the shown pages, each fetched once.
+    assert [c.args[0] for c in client.list_stacks.await_args_list] == [
+        names[90:180],
+        names[270:],
+    ]
+    update, q = _update(encode(Action.RESTART_SELECTED, view=ListView(3)))
+    q.message.message_id = 7
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    assert sorted(c.args[0] for c in client.stack_action.await_args_list) == [
+        "s100",
+        "s299",
+    ]
+
+
+def _multi_env(config):
+    return replace(config, extra_envs=(("2", ("db",)),), env_timeout=0.05)
+
+
+async def test_list_fans_out_and_shows_partial_results(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    slow = AsyncMock()
+
+    async def hang(names):
+        await asyncio.sleep(3600)
+
+    slow.list_stacks.side_effect = hang
+    client.for_env = MagicMock(return_value=slow)
+    update, q = _update(encode(Action.LIST))
+    await on_callback(update, _ctx(_multi_env(config), client))
+    client.for_env.assert_called_with("2")
+    text = q.edit_message_text.await_args.args[0]
+    assert "env 2 unavailable" in text
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert kb.inline_keyboard[0][0].callback_data == encode(Action.SHOW, "media")
+
+
+async def test_action_in_other_env_uses_its_client(config):
+    client = AsyncMock()
+    env2 = AsyncMock()
+    env2.get_stack.return_value = {"name": "db", "status": "running"}
+    client.for_env = MagicMock(return_value=env2)
+    context = _ctx(_multi_env(config), client)
+    update, q = _update(encode(Action.RESTART, "db@2"))
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    env2.stack_action.assert_awaited_once_with("db", "restart")
+    client.stack_action.assert_not_awaited()
+    assert "db@2" in q.edit_message_text.await_args.args[0]
+
+
+def _paged(config):
+    names = ("a1", "a2", "b1", "b2", "c1")
+    return replace(config, allowed_stacks=names, list_page_size=2)
+
+
+def _entries(*names, status="running"):
+    return [{"name": n, "status": status, "containers": []} for n in names]
+
+
+async def test_list_page_fetches_only_its_stacks(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _entries("b1", "b2")
+    update, q = _update(encode(Action.LIST, view=ListView(1)))
+    await on_callback(update, _ctx(_paged(config), client))
+    client.list_stacks.assert_awaited_once_with(("b1", "b2"))
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert [row[0].text for row in kb.inline_keyboard[:2]] == ["🟢 b1", "🟢 b2"]
+    assert [b.text for b in kb.inline_keyboard[2]] == ["◀️ Prev", "2/3", "Next ▶️"]
+
+
+async def test_list_page_served_from_cached_snapshot(config):
+    config = _paged(config)
+    client = AsyncMock()
+    client.list_stacks.return_value = _entries(*config.allowed_stacks)
+    context = _ctx(config, client)
+    view = ListView(filter=StackFilter.PARTIAL)  # needs the full snapshot
+    await on_callback(_update(encode(Action.LIST, view=view))[0], context)
+    update, q = _update(encode(Action.LIST, view=ListView(9)))  # clamped
+    await on_callback(update, context)
+    client.list_stacks.assert_awaited_once_with(config.allowed_stacks)
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert kb.inline_keyboard[0][0].text == "🟢 c1"
+    assert [b.text for b in kb.inline_keyboard[1]] == ["◀️ Prev", "3/3"]
+
+
+async def test_action_refetches_cached_page(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _entries("b1", "b2")
+    client.get_stack.return_value = _entries("b1")[0]
+    context = _ctx(_paged(config), client)
+    await on_callback(_update(encode(Action.LIST, view=ListView(1)))[0], context)
+    await on_callback(_update(encode(Action.RESTART, "b1"))[0], context)
+    await context.bot_data["executor"].join()
+    await on_callback(_update(encode(Action.LIST, view=ListView(1)))[0], context)
+    assert client.list_stacks.await_args_list == [call(("b1", "b2"))] * 2
+
+
+async def test_views_read_the_event_streams_stacks(config):
+    config = _paged(config)
+    client = AsyncMock()
+    context = _ctx(config, client)
+    events = MagicMock()
+    events.index.return_value = {
+        n: Stack(n, StackStatus.STOPPED) for n in config.allowed_stacks
+    }
+    context.bot_data["events"] = events
+    view = ListView(filter=StackFilter.STOPPED)
+    update, q = _update(encode(Action.LIST, view=view))
+    await on_callback(update, context)
+    update, q = _update(encode(Action.LIST, view=ListView(1)))
+    await on_callback(update, context)
+    client.list_stacks.assert_not_awaited()
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert [row[0].text for row in kb.inline_keyboard[:2]] == ["🔴 b1", "🔴 b2"]
+    events.index.return_value = None  # stream down: fetched again
+    client.list_stacks.return_value = _entries("b1", "b2")
+    await on_callback(_update(encode(Action.LIST, view=ListView(1)))[0], context)
+    client.list_stacks.assert_awaited_once_with(("b1", "b2"))
+
+
+async def test_status_filter_pages_over_matching_stacks(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _entries("a1", "b1") + _entries(
+        "a2", "b2", "c1", status="stopped"
+    )
+    view = ListView(filter=StackFilter.STOPPED)
+    update, q = _update(encode(Action.LIST, view=view))
+    await on_callback(update, _ctx(_paged(config), client))
+    text = q.edit_message_text.await_args.args[0]
+    assert "Showing stopped stacks" in text
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert [row[0].text for row in kb.inline_keyboard[:2]] == ["🔴 a2", "🔴 b2"]
+    assert [b.text for b in kb.inline_keyboard[2]] == ["1/2", "Next ▶️"]
+
+
+async def test_docker_prefix_search_narrows_fetch(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _entries("b1", "b2")
+    update, _, args = _command("b")
+    context = _ctx(_paged(config), client)
+    context.args = args
+    await cmd_docker(update, context)
+    client.list_stacks.assert_awaited_once_with(("b1", "b2"))
+    reply = update.effective_message.reply_text.await_args
+    assert "starting with <code>b</code>" in reply.args[0]
+    refresh = reply.kwargs["reply_markup"].inline_keyboard[-1][0]
+    assert refresh.callback_data == encode(Action.REFRESH, view=ListView(prefix="b"))
+
+
+async def test_docker_prefix_search_rejects_long_prefix(config):
+    client = AsyncMock()
+    update, _, _ = _command("")
+    context = _ctx(config, client)
+    context.args = ["x" * 40]
+    await cmd_docker(update, context)
+    client.list_stacks.assert_not_awaited()
+    assert "at most 32 bytes" in update.effective_message.reply_text.await_args.args[0]
+
+
+async def test_unchanged_view_skips_telegram_edit(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    context = _ctx(config, client)
+    update, q = _update(encode(Action.SHOW, "media"))
+    skipped = EDIT_SKIPPED.value()
+    await on_callback(update, context)
+    await on_callback(update, context)
+    assert q.edit_message_text.await_count == 1
+    assert EDIT_SKIPPED.value() == skipped + 1
+    q.data = encode(Action.STOP, "media")  # message now shows the prompt
+    await on_callback(update, context)
+    q.data = encode(Action.SHOW, "media")
+    await on_callback(update, context)
+    assert q.edit_message_text.await_count == 3
+
+
+async def test_container_view_fetches_stats_once_per_ttl(config):
+    client = AsyncMock()
     client.list_stacks.return_value = [
         {
             "name": "media",
             "status": "running",
-            "containers": [{"name": "c", "state": "running"}],
+            "containerDetails": [{"id": "abc", "name": "c", "state": "running"}],
         }
     ]
-    update, _ = _update("start|media")
+    client.container_stats.return_value = ({"RestartCount": 3}, None)
+    context = _ctx(config, client)
+    update, q = _update(encode(Action.CONTAINER, "media", container="c"))
+    await on_callback(update, context)
+    await on_callback(update, context)  # Refresh within the TTL
+    client.container_stats.assert_awaited_once_with("abc")
+    assert "Restarts: 3" in q.edit_message_text.await_args.args[0]
+    back = q.edit_message_text.await_args.kwargs["reply_markup"].inline_keyboard[0][-1]
+    assert back.callback_data == encode(Action.SHOW, "media")
+
+
+async def test_gone_container_shows_stack_detail(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_RUNNING
+    update, q = _update(encode(Action.CONTAINER, "media", container="old"))
     await on_callback(update, _ctx(config, client))
-    client.stack_action.assert_called_once_with("media", "start")
+    client.container_stats.assert_not_awaited()
+    assert q.edit_message_text.await_args.args[0] == render_detail(
+        Stack("media", StackStatus.RUNNING, (Container("c", "running"),))
+    )
 
 
-async def test_dockhand_error_reported_to_user(config):
-    client = MagicMock()
+_MEDIA_TWO = [
+    {
+        "name": "media",
+        "status": "running",
+        "containerDetails": [
+            {"id": "a1", "name": "media-app-1", "state": "running"},
+            {"id": "d1", "name": "media-db-1", "state": "exited"},
+        ],
+    }
+]
+
+
+def _logs(lines, calls=None):
+    """A container_logs stand-in yielding ``lines``, then (when following)
+    waiting for more that never come."""
+
+    async def container_logs(ref, tail, *, follow=False):
+        if calls is not None:
+            calls.append((ref, tail, follow))
+        for line in lines:
+            yield line
+        if follow:
+            await asyncio.sleep(3600)
+
+    return container_logs
+
+
+async def test_logs_command_picks_container_and_line_count(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    calls = []
+    client.container_logs = _logs(["<boot>", "ready"], calls)
+    update, _, _ = _command("")
+    context = _ctx(config, client)
+    context.args = ["media", "app", "20"]
+    await cmd_logs(update, context)
+    assert calls == [("a1", 20, False)]
+    reply = update.effective_message.reply_text.await_args
+    assert reply.args[0] == (
+        "📜 <b>media</b> — <code>media-app-1</code>\n<pre>&lt;boot&gt;\nready</pre>"
+    )
+    follow = reply.kwargs["reply_markup"].inline_keyboard[0][0]
+    assert follow.callback_data == encode(
+        Action.FOLLOW, "media", container="media-app-1"
+    )
+
+
+async def test_logs_default_to_first_container_not_running(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    calls = []
+    client.container_logs = _logs([], calls)
+    update, _, _ = _command("")
+    context = _ctx(config, client)
+    context.args = ["media"]
+    await cmd_logs(update, context)
+    assert calls == [("d1", config.logs_tail, False)]
+    assert "<i>no output</i>" in update.effective_message.reply_text.await_args.args[0]
+
+
+async def test_logs_keep_only_newest_messages(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    client.container_logs = _logs([f"{i:04d} " + "x" * 500 for i in range(1000)])
+    update, _, _ = _command("")
+    context = _ctx(config, client)
+    context.args = ["media", "db"]
+    await cmd_logs(update, context)
+    replies = update.effective_message.reply_text.await_args_list
+    assert len(replies) == 5
+    assert all(len(r.args[0]) <= 4096 for r in replies)
+    assert "earlier output omitted" in replies[0].args[0]
+    assert "0999 " in replies[-1].args[0]
+
+
+async def test_logs_command_rejects_bad_input(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    context = _ctx(config, client)
+    for args, answer in [
+        ([], "Usage"),
+        (["media", "a", "b", "5"], "Usage"),
+        (["media", "0"], "Usage"),
+        (["secret"], "Not an allowed stack"),
+        (["media", "media"], "No container 'media'"),  # ambiguous
+    ]:
+        update, _, _ = _command("")
+        context.args = args
+        await cmd_logs(update, context)
+        assert answer in update.effective_message.reply_text.await_args.args[0]
+
+
+async def test_logs_button_replies_below_detail(config):
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    client.container_logs = _logs(["hello"])
+    update, q = _update(encode(Action.LOGS, "media"))
+    q.message = AsyncMock(spec=Message)
+    await on_callback(update, _ctx(config, client))
+    text = q.message.reply_text.await_args.args[0]
+    assert "<code>media-db-1</code>" in text
+    assert "hello" in text
+    q.edit_message_text.assert_not_awaited()
+
+
+async def test_follow_edits_until_stopped(config, monkeypatch):
+    monkeypatch.setattr("bot.handlers._FOLLOW_EVERY", 0.01)
+    client = AsyncMock()
+    client.list_stacks.return_value = _MEDIA_TWO
+    calls = []
+    client.container_logs = _logs(["started"], calls)
+    context = _ctx(config, client)
+    update, q = _update(encode(Action.FOLLOW, "media", container="media-app-1"))
+    await on_callback(update, context)
+    async with asyncio.timeout(1):
+        while "started" not in str(q.edit_message_text.await_args):
+            await asyncio.sleep(0.01)
+    assert calls == [("a1", 200, True)]
+    kb = q.edit_message_text.await_args.kwargs["reply_markup"]
+    assert kb.inline_keyboard[0][0].text == "⏹ Stop following"
+    await on_callback(update, context)  # same button again: stop
+    await context.bot_data["executor"].join()
+    assert context.bot_data["follows"] == {}
+    final = q.edit_message_text.await_args
+    assert "· stopped" in final.args[0]
+    assert final.kwargs["reply_markup"].inline_keyboard[0][0].text == "👁 Follow"
+
+
+async def test_follows_are_capped(config):
+    client = AsyncMock()
+    context = _ctx(config, client)
+    context.bot_data["follows"] = {i: MagicMock() for i in range(3)}
+    update, q = _update(encode(Action.FOLLOW, "media", container="media-app-1"))
+    await on_callback(update, context)
+    assert q.answer.await_args.kwargs == {"show_alert": True}
+    client.list_stacks.assert_not_awaited()
+
+
+async def test_follow_answers_when_dockhand_fails(config):
+    client = AsyncMock()
     client.list_stacks.side_effect = DockhandError("Dockhand unreachable (X)")
-    update, q = _update("show|media")
+    update, q = _update(encode(Action.FOLLOW, "media", container="media-app-1"))
     await on_callback(update, _ctx(config, client))
-    text = q.edit_message_text.await_args.args[0]
-    assert "⚠" in text
+    assert q.answer.await_args.kwargs == {"show_alert": True}
+    assert "unreachable" in q.answer.await_args.args[0]
+
+
+async def test_failed_action_is_audited(config):
+    client = AsyncMock()
+    client.stack_action.side_effect = DockhandError("Dockhand returned HTTP 500")
+    client.get_stack.return_value = _MEDIA_RUNNING[0]
+    update, q = _update(encode(Action.RESTART, "media"))
+    q.from_user.id, q.from_user.username = 42, "ann"
+    q.message.chat.id = 111
+    context = _ctx(config, client)
+    context.bot_data["history"] = history = MagicMock()
+    await on_callback(update, context)
+    await context.bot_data["executor"].join()
+    history.record_action.assert_called_once()
+    args, kwargs = history.record_action.call_args
+    assert args == ("media", "restart")
+    assert kwargs["user"] == "@ann"
+    assert (kwargs["user_id"], kwargs["chat_id"]) == (42, 111)
+    assert kwargs["error"] == "Dockhand returned HTTP 500"
+
+
+async def test_bulk_command_audits_the_requester(config):
+    client = AsyncMock()
+    client.get_stack.return_value = {"name": "media", "status": "running"}
+    update, _, _ = _command("")
+    update.effective_message.from_user.username = None
+    update.effective_message.from_user.full_name = "Ann Smith"
+    context = _ctx(config, client)
+    context.bot_data["history"] = history = MagicMock()
+    context.args = ["restart", "media"]
+    await cmd_docker(update, context)
+    await context.bot_data["executor"].join()
+    args, kwargs = history.record_action.call_args
+    assert args == ("media", "restart")
+    assert (kwargs["user"], kwargs["error"]) == ("Ann Smith", None)
+
+
+def test_render_history():
+    text = render_history(
+        "media",
+        [
+            ActionRecord(86400.0, "stop", "@ann", 3.2, "still running after 300s"),
+            ActionRecord(3600.0, "restart", "<bob>", 12.0, None),
+        ],
+        [StateRecord(90000.0, "stopped", 0, 2)],
+        tz=dt.UTC,
+    )
+    assert text.splitlines() == [
+        "🕓 <b>media</b> — history",
+        "",
+        "<b>Actions</b>",
+        "<code>01-02 00:00</code> stop ❌ still running after 300s · 3s · @ann",
+        "<code>01-01 01:00</code> restart ✅ · 12s · &lt;bob&gt;",
+        "",
+        "<b>Status changes</b>",
+        "<code>01-02 01:00</code> 🔴 stopped (0/2)",
+    ]
+    assert render_history("vpn", [], []).count("none recorded") == 2
+    assert "set POLL_INTERVAL" in render_history("vpn", [], [], recording=False)
+    unknown = render_history("vpn", [], [StateRecord(0.0, "paused", 0, 1)])
+    assert "⚪ paused (0/1)" in unknown
+
+
+async def test_history_command_reads_the_store(config, tmp_path):
+    history = HistoryStore(str(tmp_path / "h.db"), retention_days=1)
+    await history.start()
+    history.record_states({"media": Stack("media", StackStatus.RUNNING)})
+    await history.aclose()  # commits
+    await history.start()
+    context = _ctx(config, AsyncMock())
+    context.bot_data["history"] = history
+    context.args = ["media"]
+    update, _, _ = _command("")
+    await cmd_history(update, context)
+    await history.aclose()
+    text = update.effective_message.reply_text.await_args.args[0]
+    assert "🟢 running (0/0)" in text
+
+
+async def test_history_command_rejects_bad_input(config):
+    context = _ctx(config, AsyncMock())
+    for args, answer in [
+        ([], "Usage"),
+        (["media", "x"], "Usage"),
+        (["media", "0"], "Usage"),
+        (["secret"], "Not an allowed stack"),
+        (["media"], "History is off"),
+    ]:
+        update, _, _ = _command("")
+        context.args = args
+        await cmd_history(update, context)
+        assert answer in update.effective_message.reply_text.await_args.args[0]
+
+
+def test_render_schedules():
+    schedules = [
+        Schedule(3, "media", "restart", Cron.parse("0 4 * * *"), 14400.0, 1, "@ann"),
+        Schedule(5, "vpn", "stop", None, 86400.0, 1, "<bob>"),
+    ]
+    assert render_schedules(schedules, tz=dt.UTC).splitlines() == [
+        "⏰ <b>Schedules</b> (2), soonest first",
+        "#3 <code>01-01 04:00</code> restart <b>media</b> at "
+        "<code>0 4 * * *</code> · @ann",
+        "#5 <code>01-02 00:00</code> stop <b>vpn</b> once · &lt;bob&gt;",
+    ]
+    assert render_schedules(schedules, limit=1).endswith("… and 1 more")
+    assert "No schedules" in render_schedules([])
+
+
+async def test_schedule_command_adds_lists_and_cancels(config, tmp_path):
+    scheduler = Scheduler(ScheduleStore(str(tmp_path / "s.db")), print, print)
+    await scheduler.start()
+    context = _ctx(config, AsyncMock())
+    context.bot_data["scheduler"] = scheduler
+
+    async def command(*args):
+        update, _, _ = _command("")
+        update.effective_message.chat_id = 111
+        update.effective_message.from_user.username = "ann"
+        context.args = list(args)
+        await cmd_schedule(update, context)
+        return update.effective_message.reply_text.await_args.args[0]
+
+    try:
+        assert "Scheduled #1: restart <b>media</b> at <code>0 4 * * *</code>" in (
+            await command("add", "media", "restart", "0", "4", "*", "*", "*")
+        )
+        assert "Scheduled #2: stop <b>vpn</b> once" in (
+            await command("add", "vpn", "STOP", "in", "30m")
+        )
+        [cron, once] = sorted(scheduler.schedules(), key=lambda s: s.id)
+        assert (cron.chat_id, cron.user, once.chat_id) == (111, "@ann", 111)
+        listed = await command("list", "vpn")
+        assert "#2" in listed and "#1" not in listed
+        assert "Cancelled #1" in await command("cancel", "#1")
+        assert "No schedule 1" in await command("cancel", "1")
+        assert [s.id for s in scheduler.schedules()] == [2]
+    finally:
+        await scheduler.aclose()
+
+
+async def test_schedule_command_rejects_bad_input(config, tmp_path):
+    context = _ctx(config, AsyncMock())
+    update, _, _ = _command("")
+    context.args = ["list"]
+    await cmd_schedule(update, context)
+    assert "Scheduling is off" in update.effective_message.reply_text.await_args.args[0]
+    context.bot_data["scheduler"] = MagicMock()
+    for args, answer in [
+        ([], "Usage"),
+        (["add", "media", "restart"], "Usage"),
+        (["cancel", "x"], "Usage"),
+        (["add", "secret", "restart", "30m"], "Not an allowed stack"),
+        (["add", "media", "explode", "30m"], "Not an action"),
+        (["add", "media", "restart", "30x"], "not a delay"),
+        (["add", "media", "restart", "0", "25", "*", "*", "*"], "hour field"),
+    ]:
+        update, _, _ = _command("")
+        context.args = args
+        await cmd_schedule(update, context)
+        assert answer in update.effective_message.reply_text.await_args.args[0]
+    context.bot_data["scheduler"].add.assert_not_called()
+
+
+async def test_schedule_command_reports_store_errors(config):
+    context = _ctx(config, AsyncMock())
+    context.bot_data["scheduler"] = scheduler = AsyncMock()
+    scheduler.add.side_effect = sqlite3.OperationalError("database is locked")
+    scheduler.cancel.side_effect = sqlite3.OperationalError("disk I/O error")
+    for args, answer in [
+        (["add", "media", "restart", "30m"], "Could not save the schedule"),
+        (["cancel", "3"], "Could not cancel: disk I/O error"),
+    ]:
+        update, _, _ = _command("")
+        context.args = args
+        await cmd_schedule(update, context)
+        assert answer in update.effective_message.reply_text.await_args.args[0]
+
+
+async def test_scheduled_action_runs_audits_and_reports(config):
+    client = AsyncMock()
+    client.get_stack.return_value = {"name": "media", "status": "running"}
+    context = _ctx(config, client)
+    context.bot_data["history"] = history = MagicMock()
+    bot = AsyncMock()
+    schedule = Schedule(7, "media", "restart", None, 0.0, 111, "@ann")
+    await run_scheduled(context.bot_data, bot, schedule)
+    client.stack_action.assert_awaited_once_with("media", "restart")
+    args, kwargs = history.record_action.call_args
+    assert args == ("media", "restart")
+    assert (kwargs["user"], kwargs["chat_id"]) == ("schedule #7", 111)
+    chat_id, text = bot.send_message.await_args.args
+    assert chat_id == 111
+    assert text == "⏰ Schedule #7: restart <b>media</b> once — ✅ done"
+
+
+async def test_scheduled_action_skips_stacks_no_longer_allowed(config):
+    client = AsyncMock()
+    context = _ctx(config, client)
+    bot = AsyncMock()
+    schedule = Schedule(7, "gone", "stop", None, 0.0, 111, "@ann")
+    await run_scheduled(context.bot_data, bot, schedule)
+    client.stack_action.assert_not_awaited()
+    assert "no longer an allowed stack" in bot.send_message.await_args.args[1]
+
+
+async def test_missed_schedule_is_reported(config):
+    context = _ctx(config, AsyncMock())
+    bot = AsyncMock()
+    schedule = Schedule(7, "media", "restart", None, 0.0, 111, "@ann")
+    await report_missed(context.bot_data, bot, schedule, 7200.0)
+    text = bot.send_message.await_args.args[1]
+    assert text.startswith("⏭ Schedule #7: restart <b>media</b> once was due")
+    assert "2h 0m ago" in text
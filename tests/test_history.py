@@ -0,0 +1,159 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from bot.history import ActionRecord, HistoryStore, StateRecord
+from bot.metrics import HISTORY_DROPPED
+from bot.stacks import Container, Stack, StackStatus
+
+
+class _Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _stack(name, *states):
+    containers = tuple(Container(f"{name}-{i}", s) for i, s in enumerate(states))
+    running = sum(s == "running" for s in states)
+    status = (
+        StackStatus.STOPPED
+        if not running
+        else StackStatus.RUNNING
+        if running == len(states)
+        else StackStatus.PARTIAL
+    )
+    return Stack(name, status, containers)
+
+
+@pytest.fixture
+async def store(tmp_path):
+    clock = _Clock()
+    s = HistoryStore(str(tmp_path / "history.db"), retention_days=30, clock=clock)
+    s.clock = clock
+    await s.start()
+    yield s
+    await s.aclose()
+
+
+def _action(store, stack, verb, started, user="@ann", seconds=1.0, error=None):
+    store.record_action(
+        stack,
+        verb,
+        user=user,
+        user_id=1,
+        chat_id=111,
+        started=started,
+        seconds=seconds,
+        error=error,
+    )
+
+
+async def _flush(store):
+    """Restart the writer: everything queued is committed."""
+    await store.aclose()
+    await store.start()
+
+
+async def test_actions_newest_first(store):
+    _action(store, "media", "restart", 100.0, seconds=12.5)
+    _action(store, "media", "stop", 200.0, "bob", 300.0, "still running after 300s")
+    _action(store, "vpn", "start", 300.0)
+    await _flush(store)
+    assert await store.actions("media", 10) == [
+        ActionRecord(200.0, "stop", "bob", 300.0, "still running after 300s"),
+        ActionRecord(100.0, "restart", "@ann", 12.5, None),
+    ]
+    assert len(await store.actions("media", 1)) == 1
+
+
+async def test_states_record_changes_and_keyframes(store):
+    up = {"media": _stack("media", "running", "running")}
+    half = {"media": _stack("media", "running", "exited")}
+    store.record_states(up)
+    store.clock.now += 10
+    store.record_states(up)  # unchanged: nothing written
+    store.clock.now += 10
+    store.record_states(half)
+    store.clock.now += HistoryStore.KEYFRAME_EVERY
+    store.record_states(half)  # keyframe, not a change
+    await _flush(store)
+    start = 1_000_000.0
+    assert await store.changes("media", 10) == [
+        StateRecord(start + 20, "partially running", 1, 2),
+        StateRecord(start, "running", 2, 2),
+    ]
+    conn = sqlite3.connect(store._path)
+    assert conn.execute("SELECT count(*) FROM states").fetchone() == (3,)
+
+
+async def test_last_states_survive_a_restart(store):
+    store.record_states({"media": _stack("media", "running")})
+    await store.aclose()
+    again = HistoryStore(store._path, retention_days=30, clock=store.clock)
+    await again.start()
+    again.record_states({"media": _stack("media", "running")})
+    await again.aclose()
+    conn = sqlite3.connect(store._path)
+    assert conn.execute("SELECT count(*) FROM states").fetchone() == (1,)
+
+
+async def test_old_rows_pruned(store):
+    _action(store, "media", "start", store.clock.now - 31 * 86400)
+    _action(store, "media", "stop", store.clock.now)
+    await _flush(store)  # start() prunes
+    assert [a.verb for a in await store.actions("media", 10)] == ["stop"]
+
+
+async def test_history_uses_the_indexes(store):
+    conn = sqlite3.connect(store._path)
+    for sql in (
+        "SELECT at FROM actions WHERE stack = ? ORDER BY at DESC LIMIT 5",
+        "SELECT at FROM states WHERE stack = ? AND changed ORDER BY at DESC LIMIT 5",
+    ):
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", ("x",))
+        plan = " ".join(row[-1] for row in rows)
+        assert "INDEX" in plan
+        assert "TEMP B-TREE" not in plan  # no sort: the index gives the order
+
+
+def test_full_queue_drops_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "MAX_QUEUED", 1)
+    store = HistoryStore(str(tmp_path / "h.db"), retention_days=1)
+    before = HISTORY_DROPPED.value()
+    for _ in range(3):
+        _action(store, "media", "start", 0.0)
+    assert store.depth() == 1
+    assert HISTORY_DROPPED.value() == before + 2
+
+
+async def test_aclose_with_a_full_queue_leaves_the_loop_free(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "MAX_QUEUED", 1)
+    store = HistoryStore(str(tmp_path / "h.db"), retention_days=1)
+    await store.start()
+    release, writing = threading.Event(), threading.Event()
+    write = store._write
+
+    def slow_write(conn, batch):
+        writing.set()
+        release.wait(timeout=2)
+        write(conn, batch)
+
+    monkeypatch.setattr(store, "_write", slow_write)
+    _action(store, "media", "start", time.time())
+    await asyncio.to_thread(writing.wait)
+    _action(store, "media", "stop", time.time() + 1)  # the queue is full now
+    closing = asyncio.create_task(store.aclose())
+    start = time.monotonic()
+    await asyncio.sleep(0.01)
+    assert time.monotonic() - start < 1  # the loop was not blocked
+    release.set()
+    await closing
+    await store.start()
+    assert [a.verb for a in await store.actions("media", 5)] == ["stop", "start"]
+    await store.aclose()
@@ -0,0 +1,94 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from telegram import Update
+
+from bot.ingress import Admission, UpdateIngress
+from bot.metrics import WEBHOOK_UPDATES
+
+
+class _App:
+    """Processes nothing: every admitted update stays pending until
+    ``finish``."""
+
+    def __init__(self):
+        self.bot = MagicMock()
+        self.update_processor = self
+        self.done = asyncio.Event()
+        self.tasks = []
+
+    def create_task(self, coroutine, update=None, name=None):
+        self.tasks.append(asyncio.create_task(coroutine))
+
+    async def process_update(self, update, coroutine=None):
+        if coroutine is not None:  # the update processor's call
+            await coroutine
+        else:
+            await self.done.wait()
+
+    async def finish(self):
+        self.done.set()
+        await asyncio.gather(*self.tasks)
+
+
+def _tap(update_id, query_id):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "callback_query": {
+                "id": query_id,
+                "from": {"id": 111, "is_bot": False, "first_name": "Ann"},
+                "chat_instance": "1",
+                "data": "x",
+            },
+        },
+        None,
+    )
+
+
+async def test_same_callback_query_is_admitted_once():
+    app = _App()
+    ingress = UpdateIngress(app, max_pending=10)
+    before = WEBHOOK_UPDATES.value(result="duplicate")
+    assert ingress.offer(_tap(1, "q1")) is Admission.ACCEPTED
+    assert ingress.offer(_tap(1, "q1")) is Admission.DUPLICATE
+    # the same tap under another update id (e.g. after a webhook reset)
+    assert ingress.offer(_tap(2, "q1")) is Admission.DUPLICATE
+    assert WEBHOOK_UPDATES.value(result="duplicate") == before + 2
+    assert ingress.pending == 1
+    await app.finish()
+    assert ingress.pending == 0
+
+
+async def test_ids_are_forgotten_after_the_ttl():
+    now = [0.0]
+    app = _App()
+    ingress = UpdateIngress(app, max_pending=10, clock=lambda: now[0])
+    ingress.offer(_tap(1, "q1"))
+    now[0] = UpdateIngress.SEEN_TTL + 1
+    assert ingress.offer(_tap(1, "q1")) is Admission.ACCEPTED
+    await app.finish()
+
+
+async def test_full_backlog_sheds_without_remembering():
+    app = _App()
+    ingress = UpdateIngress(app, max_pending=2)
+    before = WEBHOOK_UPDATES.value(result="shed")
+    assert ingress.offer(_tap(1, "q1")) is Admission.ACCEPTED
+    assert ingress.offer(_tap(2, "q2")) is Admission.ACCEPTED
+    assert ingress.offer(_tap(3, "q3")) is Admission.SHED
+    assert WEBHOOK_UPDATES.value(result="shed") == before + 1
+    await app.finish()
+    assert ingress.offer(_tap(3, "q3")) is Admission.ACCEPTED
+    await app.finish()
+
+
+async def test_seen_ids_are_bounded(monkeypatch):
+    monkeypatch.setattr(UpdateIngress, "SEEN_SIZE", 4)
+    app = _App()
+    ingress = UpdateIngress(app, max_pending=10)
+    for n in range(3):
+        ingress.offer(_tap(n, f"q{n}"))
+    assert len(ingress._seen) == 4
+    assert ingress.offer(_tap(0, "q0")) is Admission.ACCEPTED  # evicted
+    await app.finish()
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from bot.jsonstream import ArraySplitter
+
+PAYLOAD = [
+    {
+        "name": "media",
+        "status": "running",
+        "containerDetails": [{"name": "media-app-1", "state": "running"}],
+    },
+    "junk",
+    {"no_name": 1, "containerDetails": [{"name": "decoy"}]},
+    # "name" after nested objects whose own "name" keys must not count
+    {"containerDetails": [{"name": "vpn-wg-1"}], "status": "stopped", "name": "vpn"},
+    {"name": 'we"ird \\ {[name]}', "status": "running"},
+    [1, 2, {"name": "in-array"}],
+    {"name": "secret", "containerDetails": [{"name": "x" * 100}]},
+]
+RAW = json.dumps(PAYLOAD, indent=1).encode()
+
+
+def _split(chunks, wanted=lambda name: True):
+    splitter = ArraySplitter(wanted)
+    out = [(name, json.loads(raw)) for c in chunks for name, raw in splitter.feed(c)]
+    splitter.close()
+    return out
+
+
+def _bytewise(raw):
+    return [raw[i : i + 1] for i in range(len(raw))]
+
+
+@pytest.mark.parametrize("chunks", [[RAW], _bytewise(RAW)], ids=["whole", "bytewise"])
+def test_yields_named_objects_only(chunks):
+    assert _split(chunks) == [
+        ("media", PAYLOAD[0]),
+        ("vpn", PAYLOAD[3]),
+        ('we"ird \\ {[name]}', PAYLOAD[4]),
+        ("secret", PAYLOAD[6]),
+    ]
+
+
+def test_filters_by_name():
+    assert [name for name, _ in _split(_bytewise(RAW), {"vpn"}.__contains__)] == [
+        "vpn"
+    ]
+
+
+def test_skipped_element_is_not_buffered():
+    splitter = ArraySplitter({"media"}.__contains__)
+    head = b'[{"name": "secret", "containerDetails": ['
+    assert list(splitter.feed(head)) == []
+    for _ in range(100):
+        assert list(splitter.feed(b'{"name": "c", "state": "running"},')) == []
+        assert len(splitter._buf) < 64
+    assert list(splitter.feed(b'{}]}, {"name": "media"}]')) == [
+        ("media", b'{"name": "media"}')
+    ]
+    splitter.close()
+
+
+def test_empty_array():
+    assert _split([b"  [", b"]  "]) == []
+
+
+def test_non_array_rejected():
+    with pytest.raises(ValueError, match="array"):
+        list(ArraySplitter().feed(b'{"error": "boom"}'))
+
+
+def test_truncated_rejected():
+    splitter = ArraySplitter()
+    list(splitter.feed(b'[{"name": "media"}, {"name": "v'))
+    with pytest.raises(ValueError, match="truncated"):
+        splitter.close()
@@ -1,23 +1,38 @@
 import pytest
 
 from bot.keyboards import (
+    FIRST_PAGE,
     Action,
+    Allowlist,
+    Callback,
     CallbackError,
+    ListView,
+    StackFilter,
+    bulk_select_keyboard,
     confirm_stop_keyboard,
+    container_id,
     decode,
     encode,
+    logs_keyboard,
     stack_detail_keyboard,
+    stack_id,
     stack_list_keyboard,
 )
-from bot.stacks import Stack, StackStatus
+from bot.stacks import Container, Stack, StackStatus
 
-ALLOWED = ("media", "vpn")
+ALLOWED = Allowlist(("media", "vpn"))
+
+
+def _round_trip(action, stack=""):
+    return decode(encode(action, stack), ALLOWED) == Callback(action, stack)
 
 
 def test_round_trip():
-    assert decode(encode(Action.START, "media"), ALLOWED) == (Action.START, "media")
-    assert decode(encode(Action.LIST), ALLOWED) == (Action.LIST, "")
-    assert decode(encode(Action.EXIT), ALLOWED) == (Action.EXIT, "")
+    assert _round_trip(Action.START, "media")
+    assert _round_trip(Action.LIST)
+    assert _round_trip(Action.EXIT)
+    assert _round_trip(Action.REFRESH)
+    assert _round_trip(Action.REFRESH, "vpn")
 
 
 def test_unknown_action_rejected():
@@ -28,14 +43,68 @@ def test_unknown_action_rejected():
 def test_forged_stack_rejected():
     with pytest.raises(CallbackError):
         decode("start|secret", ALLOWED)
+    with pytest.raises(CallbackError):
+        decode("refresh|secret", ALLOWED)
 
 
-@pytest.mark.parametrize("data", [None, "", "start", "||", "list|extra"])
+def test_bulk_actions_round_trip():
+    assert _round_trip(Action.TOGGLE, "vpn")
+    assert _round_trip(Action.SELECT)
+    assert _round_trip(Action.RESTART_SELECTED)
+    assert _round_trip(Action.SELECT_PAGE)
+    view = ListView(2, prefix="m")
+    toggle = encode(Action.TOGGLE, "vpn", view)
+    assert decode(toggle, ALLOWED) == Callback(Action.TOGGLE, "vpn", view)
+    with pytest.raises(CallbackError):
+        decode("toggle|secret", ALLOWED)
+    with pytest.raises(CallbackError):
+        decode("sall|media", ALLOWED)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [None, "", "start", "||", "list|extra", "2", "2?", "2s", "2lxxxxxxxx", "2sabc"],
+)
 def test_garbage_rejected(data):
     with pytest.raises(CallbackError):
         decode(data, ALLOWED)
 
 
+def test_compact_format():
+    data = encode(Action.CONFIRM_STOP, "media")
+    assert data == "2O" + stack_id("media")
+    assert len(data) == 10
+    assert encode(Action.LIST) == "2l"
+    long_name = "x" * 200 + "@2"
+    assert len(encode(Action.SHOW, long_name)) == 10
+    assert decode(encode(Action.SHOW, long_name), Allowlist((long_name,))) == Callback(
+        Action.SHOW,
+        long_name,
+        FIRST_PAGE,
+    )
+
+
+def test_stack_ids_are_stable():
+    # Pinned: buttons already sent must keep decoding after a restart.
+    assert stack_id("media") != stack_id("media@2")
+    assert len(stack_id("media")) == 8
+    assert stack_id("media") == "9OuXQJeA"
+
+
+def test_forged_stack_id_rejected():
+    with pytest.raises(CallbackError, match="unknown stack id"):
+        decode(encode(Action.START, "secret"), ALLOWED)
+
+
+def test_legacy_format_still_decodes():
+    assert decode("cstop|media", ALLOWED) == Callback(Action.CONFIRM_STOP, "media")
+    assert decode("list|", ALLOWED) == Callback(Action.LIST, "", FIRST_PAGE)
+
+
+def _data(row):
+    return [b.callback_data for b in row]
+
+
 def _stack(status):
     return Stack(name="media", status=status)
 
@@ -45,40 +114,216 @@ def test_list_keyboard_dots_and_refresh():
         [Stack("media", StackStatus.RUNNING), Stack("vpn", StackStatus.STOPPED)]
     )
     texts = [b.text for row in kb.inline_keyboard for b in row]
-    assert texts == ["🟢 media", "🔴 vpn", "🔄 Refresh", "🚪 Exit"]
-    assert kb.inline_keyboard[0][0].callback_data == "show|media"
-    assert [b.callback_data for b in kb.inline_keyboard[-1]] == ["list|", "exit|"]
+    assert texts == [
+        "🟢 media",
+        "🔴 vpn",
+        "▶️ Start all stopped",
+        "🔁 Restart…",
+        "🔄 Refresh",
+        "🚪 Exit",
+    ]
+    assert kb.inline_keyboard[0][0].callback_data == encode(Action.SHOW, "media")
+    assert _data(kb.inline_keyboard[2]) == [
+        encode(Action.START_STOPPED),
+        encode(Action.SELECT),
+    ]
+    assert _data(kb.inline_keyboard[-1]) == [
+        encode(Action.REFRESH),
+        encode(Action.EXIT),
+    ]
 
 
 def test_detail_keyboard_stopped_has_only_start():
     kb = stack_detail_keyboard(_stack(StackStatus.STOPPED))
-    assert [b.callback_data for b in kb.inline_keyboard[0]] == ["start|media"]
+    assert _data(kb.inline_keyboard[0]) == [encode(Action.START, "media")]
 
 
 def test_detail_keyboard_running_has_stop_and_restart():
     kb = stack_detail_keyboard(_stack(StackStatus.RUNNING))
     assert [b.callback_data for b in kb.inline_keyboard[0]] == [
-        "stop|media",
-        "restart|media",
+        encode(Action.STOP, "media"),
+        encode(Action.RESTART, "media"),
     ]
 
 
 def test_detail_keyboard_partial_has_all_three():
     kb = stack_detail_keyboard(_stack(StackStatus.PARTIAL))
     assert [b.callback_data for b in kb.inline_keyboard[0]] == [
-        "start|media",
-        "stop|media",
-        "restart|media",
+        encode(Action.START, "media"),
+        encode(Action.STOP, "media"),
+        encode(Action.RESTART, "media"),
     ]
 
 
 def test_detail_keyboard_always_has_refresh_and_back():
     kb = stack_detail_keyboard(_stack(StackStatus.RUNNING))
-    assert [b.callback_data for b in kb.inline_keyboard[1]] == ["show|media", "list|"]
+    assert [b.callback_data for b in kb.inline_keyboard[1]] == [
+        encode(Action.REFRESH, "media"),
+        encode(Action.LIST),
+    ]
 
 
 def test_confirm_keyboard():
     kb = confirm_stop_keyboard("media")
     yes, cancel = kb.inline_keyboard[0]
-    assert yes.callback_data == "cstop|media"
-    assert cancel.callback_data == "show|media"
+    assert yes.callback_data == encode(Action.CONFIRM_STOP, "media")
+    assert cancel.callback_data == encode(Action.SHOW, "media")
+
+
+def test_list_keyboard_bulk_row_only_when_useful():
+    kb = stack_list_keyboard([Stack("media", StackStatus.RUNNING)])
+    texts = [b.text for row in kb.inline_keyboard for b in row]
+    assert texts == ["🟢 media", "🔄 Refresh", "🚪 Exit"]
+
+
+def test_bulk_select_keyboard_marks_selection():
+    kb = bulk_select_keyboard(
+        [Stack("media", StackStatus.RUNNING), Stack("vpn", StackStatus.RUNNING)],
+        {"vpn"},
+    )
+    assert [row[0].text for row in kb.inline_keyboard[:2]] == ["⬜ media", "☑️ vpn"]
+    assert kb.inline_keyboard[1][0].callback_data == encode(Action.TOGGLE, "vpn")
+    assert _data(kb.inline_keyboard[-1]) == [
+        encode(Action.RESTART_SELECTED),
+        encode(Action.LIST),
+    ]
+
+
+def test_bulk_select_keyboard_pages_like_the_list():
+    view = ListView(1, prefix="m")
+    kb = bulk_select_keyboard([Stack("media", StackStatus.RUNNING)], set(), view, 3)
+    assert kb.inline_keyboard[0][0].callback_data == encode(
+        Action.TOGGLE, "media", view
+    )
+    assert _data(kb.inline_keyboard[1]) == [
+        encode(Action.SELECT_PAGE, view=ListView(0, prefix="m")),
+        encode(Action.SELECT_PAGE, view=view),
+        encode(Action.SELECT_PAGE, view=ListView(2, prefix="m")),
+    ]
+    assert _data(kb.inline_keyboard[-1]) == [
+        encode(Action.RESTART_SELECTED, view=view),
+        encode(Action.LIST, view=view),
+    ]
+
+
+def test_other_env_stacks_use_keys():
+    stack = Stack("media", StackStatus.RUNNING, env="2")
+    kb = stack_detail_keyboard(stack)
+    assert kb.inline_keyboard[0][0].callback_data == encode(Action.STOP, "media@2")
+    allowed = Allowlist(("media", "media@2"))
+    assert decode(encode(Action.STOP, "media@2"), allowed) == Callback(
+        Action.STOP,
+        "media@2",
+        FIRST_PAGE,
+    )
+    assert decode("stop|media@2", allowed) == Callback(Action.STOP, "media@2")
+    with pytest.raises(CallbackError):
+        decode(encode(Action.STOP, "media@3"), allowed)
+
+
+def test_container_round_trip():
+    data = encode(Action.CONTAINER, "media", container="media-app-1")
+    assert data == f"2c{stack_id('media')}:{container_id('media-app-1')}"
+    assert decode(data, ALLOWED) == Callback(
+        Action.CONTAINER, "media", container=container_id("media-app-1")
+    )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        f"2c{stack_id('media')}",  # no container
+        f"2c{stack_id('media')}:short",
+        f"2c{stack_id('media')}:a0",  # a list view, not a container
+        f"2s{stack_id('media')}:{container_id('x')}",  # only CONTAINER has one
+    ],
+)
+def test_malformed_container_rejected(data):
+    with pytest.raises(CallbackError):
+        decode(data, ALLOWED)
+
+
+def test_detail_keyboard_has_container_buttons():
+    containers = tuple(Container(f"media-{i}", "running") for i in range(3))
+    kb = stack_detail_keyboard(Stack("media", StackStatus.RUNNING, containers))
+    rows = [[b.text for b in row] for row in kb.inline_keyboard]
+    assert rows[1:3] == [["📊 media-0", "📊 media-1"], ["📊 media-2"]]
+    data = kb.inline_keyboard[2][0].callback_data
+    assert data == encode(Action.CONTAINER, "media", container="media-2")
+
+
+def test_logs_round_trip():
+    assert decode(encode(Action.LOGS, "media"), ALLOWED) == Callback(
+        Action.LOGS, "media"
+    )
+    follow = encode(Action.FOLLOW, "media", container="media-app-1")
+    assert decode(follow, ALLOWED) == Callback(
+        Action.FOLLOW, "media", container=container_id("media-app-1")
+    )
+    with pytest.raises(CallbackError):
+        decode(encode(Action.FOLLOW, "media"), ALLOWED)  # needs a container
+
+
+def test_logs_buttons():
+    stack = Stack("media", StackStatus.RUNNING, (Container("media-1", "running"),))
+    footer = stack_detail_keyboard(stack).inline_keyboard[-1]
+    assert footer[1].callback_data == encode(Action.LOGS, "media")
+    empty = stack_detail_keyboard(Stack("media", StackStatus.STOPPED))
+    assert "📜 Logs" not in [b.text for b in empty.inline_keyboard[-1]]
+    kb = logs_keyboard("media", "media-1", following=True)
+    assert kb.inline_keyboard[0][0].text == "⏹ Stop following"
+
+
+def test_list_view_round_trip():
+    view = ListView(3, StackFilter.STOPPED, "med")
+    data = encode(Action.LIST, view=view)
+    assert data == "2l:s3,med"
+    assert decode(data, ALLOWED) == Callback(Action.LIST, "", view)
+    refresh = encode(Action.REFRESH, view=ListView(1))
+    assert decode(refresh, ALLOWED) == Callback(Action.REFRESH, "", ListView(1))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "2l:",
+        "2l:x0",
+        "2l:a",
+        "2l:a99999",
+        "2l:a0,",
+        "2l:a0," + "x" * 33,
+        "2x:a1",
+        "2f" + stack_id("media") + ":a1",
+    ],
+)
+def test_bad_list_view_rejected(data):
+    with pytest.raises(CallbackError):
+        decode(data, ALLOWED)
+
+
+def test_single_page_list_has_no_navigation():
+    stacks = [Stack("media", StackStatus.RUNNING), Stack("vpn", StackStatus.RUNNING)]
+    kb = stack_list_keyboard(stacks)
+    assert len(kb.inline_keyboard) == 4  # two stacks, bulk, refresh/exit
+
+
+def test_pagination_and_filter_rows():
+    view = ListView(1, StackFilter.ALL, "m")
+    kb = stack_list_keyboard([Stack("media", StackStatus.STOPPED)], view, pages=3)
+    nav, filters = kb.inline_keyboard[1], kb.inline_keyboard[2]
+    assert [b.text for b in nav] == ["◀️ Prev", "2/3", "Next ▶️"]
+    assert _data(nav) == [
+        encode(Action.LIST, view=ListView(0, prefix="m")),
+        encode(Action.LIST, view=view),
+        encode(Action.LIST, view=ListView(2, prefix="m")),
+    ]
+    assert [b.text for b in filters] == ["✓ All", "🔴 Stopped", "🟡 Partial"]
+    assert filters[1].callback_data == encode(
+        Action.LIST, view=ListView(0, StackFilter.STOPPED, "m")
+    )
+    assert kb.inline_keyboard[-1][0].callback_data == encode(Action.REFRESH, view=view)
+
+
+def test_last_page_has_no_next():
+    kb = stack_list_keyboard([], ListView(2), pages=3)
+    assert [b.text for b in kb.inline_keyboard[0]] == ["◀️ Prev", "3/3"]
@@ -0,0 +1,63 @@
+import pytest
+
+from bot.logs import LogTail, chunk_lines, split_lines, text_length
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+async def test_split_lines_across_chunks():
+    lines = await _collect(split_lines(_stream("a\nb", "c\r\n", "\nd")))
+    assert lines == ["a", "bc", "", "d"]
+
+
+async def test_split_lines_cuts_long_lines():
+    lines = await _collect(split_lines(_stream("x" * 6, "y" * 6, "\nok\n"), 8))
+    assert lines == ["xxxxxxyy…", "ok"]
+
+
+async def test_split_lines_strips_docker_frame_headers():
+    header = "\x01\x00\x00\x00\x00\x00\x00\x06"
+    assert await _collect(split_lines(_stream(f"{header}hello\n"))) == ["hello"]
+
+
+async def test_chunks_fit_limit_and_keep_lines_whole():
+    lines = [f"line {i} <tag> & more" for i in range(200)]
+    chunks = await _collect(chunk_lines(_stream(*lines), 500))
+    assert all(text_length(c) <= 500 for c in chunks)
+    assert all(c.startswith("<pre>") and c.endswith("</pre>") for c in chunks)
+    body = "\n".join(c.removeprefix("<pre>").removesuffix("</pre>") for c in chunks)
+    assert body.split("\n") == [
+        line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        for line in lines
+    ]
+
+
+@pytest.mark.parametrize("line", ["&" * 300, "🐳" * 300, "x" * 300])
+async def test_overlong_escaped_line_is_cut_to_fit(line):
+    chunks = await _collect(chunk_lines(_stream(line), 200))
+    assert len(chunks) == 1
+    assert text_length(chunks[0]) <= 200
+    assert chunks[0].endswith("…</pre>")
+
+
+async def test_no_lines_no_chunks():
+    assert await _collect(chunk_lines(_stream())) == []
+
+
+def test_log_tail_keeps_newest_lines_that_fit():
+    tail = LogTail(max_lines=5, limit=40)
+    assert tail.render() == ""
+    for i in range(10):
+        tail.add(f"line {i}")
+    assert tail.version == 10
+    assert len(tail._lines) == 5
+    rendered = tail.render()
+    assert text_length(rendered) <= 40
+    assert rendered == "<pre>line 6\nline 7\nline 8\nline 9</pre>"
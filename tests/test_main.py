@@ -1,16 +1,56 @@
-from unittest.mock import MagicMock
+import subprocess
+import sys
 
-from telegram.ext import CallbackQueryHandler, CommandHandler, TypeHandler
+import pytest
 
-from bot.main import build_application
+from bot import main as entrypoint
 
+# Whether the Telegram stack got imported, printed after main() returns.
+_PROBE = """
+import sys
+from bot.main import main
+code = main(sys.argv[1:])
+print(sorted({m.partition(".")[0] for m in sys.modules} & {"telegram", "tornado"}))
+sys.exit(code)
+"""
 
-def test_build_application_wires_everything(config):
-    app = build_application(config, MagicMock())
-    assert app.bot_data["config"] is config
-    # auth gate runs first, in its own group before all others
-    assert min(app.handlers) == -1
-    assert isinstance(app.handlers[-1][0], TypeHandler)
-    default_group = [type(h) for h in app.handlers[0]]
-    assert CommandHandler in default_group
-    assert CallbackQueryHandler in default_group
+
+def _run(args, env):
+    return subprocess.run(
+        [sys.executable, "-c", _PROBE, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def test_config_error_fails_before_telegram_is_imported():
+    proc = _run([], {})
+    assert proc.returncode == 1
+    assert "missing required environment variables" in proc.stderr
+    assert proc.stdout.strip() == "[]"
+
+
+def test_check_config_never_imports_telegram(base_env):
+    # Nothing listens there: the check fails, but only after config passed.
+    env = base_env | {"DOCKHAND_URL": "http://127.0.0.1:9"}
+    proc = _run(["--check-config"], env)
+    assert proc.returncode == 1
+    assert proc.stdout.splitlines()[0].startswith("config: ok")
+    assert "env 1: Dockhand unreachable" in proc.stdout
+    assert proc.stdout.splitlines()[-1] == "[]"
+
+
+def test_modes_are_exclusive():
+    with pytest.raises(SystemExit):
+        entrypoint.main(["--check-config", "--profile-startup"])
+
+
+def test_valid_config_runs_the_application(monkeypatch, base_env):
+    for name, value in base_env.items():
+        monkeypatch.setenv(name, value)
+    started = []
+    monkeypatch.setattr("bot.app.run", started.append)
+    assert entrypoint.main([]) == 0
+    assert [c.allowed_stacks for c in started] == [("media", "vpn")]
@@ -0,0 +1,44 @@
+import pytest
+
+from bot.metrics import Registry
+
+
+def test_counter_renders_with_labels():
+    reg = Registry()
+    c = reg.counter("x_total", "Things.", ("kind",))
+    c.inc(kind="a")
+    c.inc(2, kind='q"uote')
+    text = reg.render()
+    assert "# TYPE x_total counter" in text
+    assert 'x_total{kind="a"} 1' in text
+    assert 'x_total{kind="q\\"uote"} 2' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    h = reg.histogram("lat_seconds", "Latency.", ("op",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        h.observe(value, op="get")
+    lines = reg.render().splitlines()
+    assert 'lat_seconds_bucket{op="get",le="0.1"} 2' in lines
+    assert 'lat_seconds_bucket{op="get",le="1"} 3' in lines
+    assert 'lat_seconds_bucket{op="get",le="+Inf"} 4' in lines
+    assert 'lat_seconds_count{op="get"} 4' in lines
+    assert 'lat_seconds_sum{op="get"} 5.65' in lines
+    assert h.count(op="get") == 4
+
+
+def test_wrong_labels_rejected():
+    reg = Registry()
+    c = reg.counter("x_total", "Things.", ("kind",))
+    with pytest.raises(ValueError):
+        c.inc(other="a")
+    with pytest.raises(ValueError):
+        reg.counter("x_total", "Again.")
+
+
+def test_sampled_reads_at_render_and_rebinds():
+    reg = Registry()
+    reg.sampled("hits_total", "Hits.", "counter", lambda: {(): 1})
+    reg.sampled("hits_total", "Hits.", "counter", lambda: {(): 7})
+    assert "hits_total 7" in reg.render().splitlines()
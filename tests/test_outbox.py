@@ -0,0 +1,134 @@
+import asyncio
+import datetime as dtm
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from bot.metrics import OUTBOX_COLLAPSED, OUTBOX_RETRY_AFTER
+from bot.outbox import Outbox, Superseded
+
+# RetryAfter itself reads the deprecated int-valued retry_after.
+pytestmark = pytest.mark.filterwarnings(
+    "ignore::telegram.warnings.PTBDeprecationWarning"
+)
+
+
+def _fast():
+    return Outbox(global_rate=1000, chat_rate=1000, chat_burst=1000)
+
+
+class Gate:
+    """A call that blocks its lane until released."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        await self.release.wait()
+        return "gate"
+
+
+def _returning(value, calls=None):
+    async def call():
+        if calls is not None:
+            calls.append(value)
+        return value
+
+    return call
+
+
+async def test_send_returns_result_and_raises_errors():
+    outbox = _fast()
+    assert await outbox.send(1, _returning("ok")) == "ok"
+
+    async def fail():
+        raise BadRequest("boom")
+
+    with pytest.raises(BadRequest):
+        await outbox.send(1, fail)
+
+
+async def test_per_chat_pacing_does_not_hold_other_chats():
+    outbox = Outbox(global_rate=1000, chat_rate=20, chat_burst=1)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(outbox.send(1, _returning(1)), outbox.send(2, _returning(2)))
+    assert loop.time() - start < 0.04
+    await outbox.send(1, _returning(3))
+    assert loop.time() - start >= 0.04
+
+
+async def test_queued_edits_of_one_message_collapse():
+    outbox = _fast()
+    gate, calls = Gate(), []
+    blocker = asyncio.create_task(outbox.send(1, gate))
+    await asyncio.sleep(0)
+    collapsed = OUTBOX_COLLAPSED.value(kind="edit")
+    first = asyncio.create_task(
+        outbox.send(1, _returning("a", calls), kind="edit", collapse=(1, 7))
+    )
+    other = asyncio.create_task(
+        outbox.send(1, _returning("x", calls), kind="edit", collapse=(1, 8))
+    )
+    second = asyncio.create_task(
+        outbox.send(1, _returning("b", calls), kind="edit", collapse=(1, 7))
+    )
+    await asyncio.sleep(0)
+    assert outbox.depth() == 2
+    gate.release.set()
+    with pytest.raises(Superseded):
+        await first
+    assert await second == "b"
+    assert await other == "x"
+    assert await blocker == "gate"
+    assert calls == ["b", "x"]  # the replacement kept its place in line
+    assert OUTBOX_COLLAPSED.value(kind="edit") == collapsed + 1
+
+
+async def test_retry_after_pauses_lane_and_retries():
+    outbox = _fast()
+    attempts = []
+
+    async def flaky():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise RetryAfter(dtm.timedelta(seconds=0.05))
+        return "sent"
+
+    before = OUTBOX_RETRY_AFTER.value(kind="send")
+    assert await outbox.send(1, flaky) == "sent"
+    assert attempts[1] - attempts[0] >= 0.05
+    assert OUTBOX_RETRY_AFTER.value(kind="send") == before + 1
+
+
+async def test_retry_after_gives_up_eventually():
+    outbox = _fast()
+    outbox.MAX_RETRIES = 1
+
+    async def flooded():
+        raise RetryAfter(dtm.timedelta(seconds=0.001))
+
+    with pytest.raises(RetryAfter):
+        await outbox.send(1, flooded)
+
+
+async def test_answers_skip_the_queue():
+    outbox = Outbox(global_rate=1000, chat_rate=1, chat_burst=1)
+    await outbox.send(1, _returning("first"))  # chat bucket now empty
+    queued = asyncio.create_task(outbox.send(1, _returning("second")))
+    await asyncio.sleep(0)
+    async with asyncio.timeout(0.1):
+        assert await outbox.answer(_returning("answered")) == "answered"
+    assert not queued.done()
+    await outbox.aclose()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+
+async def test_aclose_cancels_the_call_in_flight():
+    outbox = _fast()
+    sending = asyncio.create_task(outbox.send(1, Gate()))
+    await asyncio.sleep(0.01)  # taken by the worker, blocked in the call
+    await outbox.aclose()
+    await asyncio.wait([sending], timeout=0.1)
+    assert sending.cancelled()
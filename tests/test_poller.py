@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from bot.dockhand import DockhandError
+from bot.poller import StackPoller
+
+
+class Refresh:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(StackPoller, "JITTER", 0.0)
+
+
+def test_jitter_stays_within_bounds():
+    poller = StackPoller(Refresh(), 10)
+    delays = [poller.next_delay() for _ in range(200)]
+    assert all(10 <= d <= 11 for d in delays)  # never under the interval
+    assert len(set(delays)) > 1
+
+
+async def test_backs_off_on_errors_and_resets_on_success(no_jitter):
+    poller = StackPoller(
+        Refresh(DockhandError("down"), DockhandError("down"), ValueError("junk")), 10
+    )
+    delays = []
+    for _ in range(4):
+        await poller.poll_once()
+        delays.append(poller.next_delay())
+    assert delays == [20, 40, 80, 10]
+
+
+async def test_backoff_is_capped(no_jitter):
+    poller = StackPoller(Refresh(*[DockhandError("down")] * 20), 10)
+    for _ in range(20):
+        await poller.poll_once()
+    assert poller.next_delay() == StackPoller.MAX_BACKOFF
+
+
+async def test_unexpected_error_does_not_stop_polling(no_jitter):
+    poller = StackPoller(Refresh(RuntimeError("bug")), 10)
+    await poller.poll_once()
+    assert poller.next_delay() == 20
+
+
+async def test_start_polls_until_stopped(no_jitter):
+    refresh = Refresh()
+    poller = StackPoller(refresh, 0.001)
+    poller.start()
+    await asyncio.sleep(0.05)
+    await poller.stop()
+    calls = refresh.calls
+    assert calls > 1
+    await asyncio.sleep(0.01)
+    assert refresh.calls == calls
+
+
+async def test_snapshots_passed_to_listener():
+    seen = []
+
+    async def refresh():
+        return {"media": "stack"}
+
+    poller = StackPoller(refresh, 10, on_snapshot=seen.append)
+    await poller.poll_once()
+    assert seen == [{"media": "stack"}]
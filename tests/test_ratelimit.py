@@ -0,0 +1,39 @@
+import asyncio
+
+from bot.ratelimit import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_up_to_capacity_then_refill():
+    clock = Clock()
+    bucket = TokenBucket(2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay() == 0.5
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_refill_never_exceeds_capacity():
+    clock = Clock()
+    bucket = TokenBucket(1, clock=clock)
+    clock.now = 100
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+async def test_acquire_waits_for_a_token():
+    bucket = TokenBucket(100)
+    for _ in range(100):
+        await bucket.acquire()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await bucket.acquire()
+    assert loop.time() - start >= 0.005
@@ -0,0 +1,50 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.render import RenderCache, Rendered
+
+
+def _kb(data):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("x", callback_data=data)]])
+
+
+def test_digest_covers_text_and_keyboard():
+    base = Rendered.of("hello", _kb("a"))
+    assert base.digest == Rendered.of("hello", _kb("a")).digest
+    assert base.digest != Rendered.of("hello", _kb("b")).digest
+    assert base.digest != Rendered.of("hello!", _kb("a")).digest
+    assert base.digest != Rendered.of("hello", None).digest
+
+
+def test_identical_states_render_once():
+    renders = RenderCache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return "text", None
+
+    first = renders.view(("detail", "media"), build)
+    assert renders.view(("detail", "media"), build) is first
+    assert len(calls) == 1
+    assert (renders.hits, renders.misses) == (1, 1)
+
+
+def test_views_are_bounded():
+    renders = RenderCache(views=2)
+    for i in range(3):
+        renders.view(i, lambda i=i: (str(i), None))
+    renders.view(0, lambda: ("0", None))
+    assert renders.misses == 4
+
+
+def test_message_digests():
+    renders = RenderCache()
+    view = Rendered.of("a", None)
+    message = (111, 7)
+    assert not renders.shows(message, view)
+    renders.record(message, view)
+    assert renders.shows(message, view)
+    assert not renders.shows(message, Rendered.of("b", None))
+    assert not renders.shows(None, view)
+    renders.forget(message)
+    assert not renders.shows(message, view)
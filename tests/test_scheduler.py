@@ -0,0 +1,202 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from bot.cron import Cron
+from bot.metrics import SCHEDULE_RUNS
+from bot.scheduler import (
+    ScheduleError,
+    Scheduler,
+    ScheduleStore,
+    parse_delay,
+    parse_when,
+)
+
+
+class _Calls:
+    """on_due/on_missed recorder that can be awaited for a count."""
+
+    def __init__(self):
+        self.due = []
+        self.missed = []
+        self.changed = asyncio.Event()
+
+    def on_due(self, schedule):
+        self.due.append(schedule)
+        self.changed.set()
+
+    def on_missed(self, schedule, late):
+        self.missed.append((schedule, late))
+        self.changed.set()
+
+    async def wait(self, count):
+        async with asyncio.timeout(2):
+            while len(self.due) + len(self.missed) < count:
+                self.changed.clear()
+                await self.changed.wait()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "schedules.db")
+
+
+@pytest.fixture
+async def started(db):
+    schedulers = []
+
+    async def start(calls, **kwargs):
+        scheduler = Scheduler(
+            ScheduleStore(db), calls.on_due, calls.on_missed, **kwargs
+        )
+        await scheduler.start()
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield start
+    for scheduler in schedulers:
+        await scheduler.aclose()
+
+
+@pytest.mark.parametrize(
+    ("text", "seconds"),
+    [("30m", 1800), ("2h", 7200), ("1h30m", 5400), ("1D", 86400), ("45s", 45)],
+)
+def test_parse_delay(text, seconds):
+    assert parse_delay(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "30", "m", "0m", "1h 30m", "400d", "-5m"])
+def test_parse_delay_rejects(text):
+    with pytest.raises(ScheduleError):
+        parse_delay(text)
+
+
+def test_parse_when():
+    assert parse_when(["in", "1h", "30m"]) == 5400
+    assert parse_when(["15m"]) == 900
+    assert parse_when(["@daily"]).hours == (0,)
+    assert parse_when(["0", "4", "*", "*", "*"]).expr == "0 4 * * *"
+
+
+async def test_one_shot_runs_once_and_is_forgotten(db, started):
+    calls = _Calls()
+    scheduler = await started(calls)
+    schedule = await scheduler.add("media", "restart", 0.05, chat_id=111, user="@ann")
+    await calls.wait(1)
+    assert calls.due == [schedule]
+    assert len(scheduler) == 0
+    await asyncio.sleep(0.05)  # the store update follows the callback
+    assert await ScheduleStore(db).load() == []
+
+
+async def test_schedules_survive_a_restart(started):
+    scheduler = await started(_Calls())
+    cron = Cron.parse("0 4 * * *")
+    added = await scheduler.add("media", "restart", cron, chat_id=111, user="@ann")
+    await scheduler.aclose()
+    again = await started(_Calls())
+    assert again.schedules() == [added]
+
+
+async def test_earlier_schedule_wakes_the_loop(started):
+    calls = _Calls()
+    scheduler = await started(calls)
+    await scheduler.add("vpn", "stop", 3600.0, chat_id=111, user="@ann")
+    soon = await scheduler.add("media", "start", 0.05, chat_id=111, user="@ann")
+    await calls.wait(1)
+    assert calls.due == [soon]
+
+
+async def test_cancelled_schedule_never_runs(started):
+    calls = _Calls()
+    scheduler = await started(calls)
+    gone = await scheduler.add("media", "stop", 0.05, chat_id=111, user="@ann")
+    kept = await scheduler.add("vpn", "stop", 0.1, chat_id=111, user="@ann")
+    assert await scheduler.cancel(gone.id) == gone
+    assert await scheduler.cancel(gone.id) is None
+    await calls.wait(1)
+    await asyncio.sleep(0.1)
+    assert calls.due == [kept]
+
+
+async def test_failed_cancel_keeps_the_schedule(started, monkeypatch):
+    scheduler = await started(_Calls())
+    kept = await scheduler.add("media", "stop", 3600, chat_id=111, user="@ann")
+
+    async def locked(dues, gone):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(scheduler._store, "update", locked)
+    with pytest.raises(sqlite3.Error):
+        await scheduler.cancel(kept.id)
+    assert scheduler.schedules() == [kept]
+
+
+async def test_missed_runs_after_downtime(db, started):
+    now = time.time()
+    store = ScheduleStore(db)
+    daily = Cron.parse("0 4 * * *")
+    # down for two days: the daily run is reported missed once, not twice
+    await store.insert("media", "restart", daily, now - 2 * 86400, 111, "@ann")
+    await store.insert("vpn", "stop", None, now - 3600, 111, "@ann")  # missed
+    await store.insert("web", "start", None, now - 60, 111, "@ann")  # in grace
+    store.close()
+    before = SCHEDULE_RUNS.value(result="missed")
+    calls = _Calls()
+    scheduler = await started(calls, grace=300)
+    await calls.wait(3)
+    assert [s.stack for s in calls.due] == ["web"]
+    assert sorted(s.stack for s, _ in calls.missed) == ["media", "vpn"]
+    assert all(late > 300 for _, late in calls.missed)
+    assert SCHEDULE_RUNS.value(result="missed") == before + 2
+    [media] = scheduler.schedules()
+    assert media.due == daily.next_after(media.due - 1) > now
+
+
+async def test_thousands_due_at_once_fire_in_one_pass(db, started):
+    now = time.time()
+    store = ScheduleStore(db)
+    for i in range(2000):
+        await store.insert(f"s{i}", "restart", None, now - 1, 111, "@ann")
+    store.close()
+    writes = 0
+    update = ScheduleStore.update
+
+    async def counted(self, dues, gone):
+        nonlocal writes
+        writes += 1
+        await update(self, dues, gone)
+
+    calls = _Calls()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(ScheduleStore, "update", counted)
+        scheduler = await started(calls)
+        await calls.wait(2000)
+        await asyncio.sleep(0.05)
+    assert len(scheduler) == 0
+    assert writes == 1
+
+
+async def test_cancelled_entries_are_compacted(started):
+    scheduler = await started(_Calls())
+    added = [
+        await scheduler.add("media", "stop", 3600.0 + i, chat_id=1, user="@ann")
+        for i in range(200)
+    ]
+    for schedule in added[:150]:
+        await scheduler.cancel(schedule.id)
+    # rebuilt once the stale entries outnumbered the live ones
+    assert len(scheduler._heap) == 50 + scheduler._stale < 150
+    live = {sid for _, sid in scheduler._heap} & {s.id for s in added[150:]}
+    assert len(live) == 50
+
+
+async def test_schedule_limit(started, monkeypatch):
+    monkeypatch.setattr(Scheduler, "MAX_SCHEDULES", 1)
+    scheduler = await started(_Calls())
+    await scheduler.add("media", "stop", 3600.0, chat_id=1, user="@ann")
+    with pytest.raises(ScheduleError, match="already 1 schedules"):
+        await scheduler.add("media", "stop", 3600.0, chat_id=1, user="@ann")
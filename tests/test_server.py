@@ -0,0 +1,128 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from bot.config import Webhook
+from bot.ingress import UpdateIngress
+from bot.server import SECRET_HEADER, make_web_app
+
+_WEBHOOK = Webhook(url="https://bot.example.com/telegram", secret="s3cret")
+_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 111, "type": "private"},
+    },
+}
+
+
+@pytest.fixture
+async def served():
+    async def serve(web_app):
+        sock, port = bind_unused_port()
+        server = HTTPServer(web_app)
+        server.add_sockets([sock])
+        servers.append(server)
+        return httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}")
+
+    servers: list[HTTPServer] = []
+    yield serve
+    for server in servers:
+        server.stop()
+
+
+class _Processor:
+    async def process_update(self, update, coroutine):
+        await coroutine
+
+
+class FakeApp:
+    """What UpdateIngress uses of a PTB Application; processing an update
+    waits for ``gate`` and records its id."""
+
+    def __init__(self):
+        self.bot = MagicMock()
+        self.update_processor = _Processor()
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.processed = []
+        self.tasks = []
+
+    def create_task(self, coroutine, update=None, name=None):
+        task = asyncio.create_task(coroutine)
+        self.tasks.append(task)
+        return task
+
+    async def process_update(self, update):
+        await self.gate.wait()
+        self.processed.append(update.update_id)
+
+
+def _ingress(max_pending=10):
+    return UpdateIngress(FakeApp(), max_pending)
+
+
+async def test_metrics_route(served):
+    client = await served(make_web_app(metrics=True))
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "tgops_dockhand_request_seconds" in resp.text
+
+
+async def test_metrics_off_means_404(served):
+    client = await served(make_web_app(_ingress(), _WEBHOOK))
+    assert (await client.get("/metrics")).status_code == 404
+
+
+async def test_webhook_requires_secret(served):
+    ingress = _ingress()
+    client = await served(make_web_app(ingress, _WEBHOOK, metrics=True))
+    resp = await client.post("/telegram", json=_UPDATE, headers={SECRET_HEADER: "x"})
+    assert resp.status_code == 403
+    assert ingress.pending == 0
+
+
+async def test_webhook_processes_update_once(served):
+    ingress = _ingress()
+    client = await served(make_web_app(ingress, _WEBHOOK))
+    for _ in range(2):  # a redelivery
+        resp = await client.post(
+            "/telegram", json=_UPDATE, headers={SECRET_HEADER: "s3cret"}
+        )
+        assert resp.status_code == 200
+    await asyncio.gather(*ingress._app.tasks)
+    assert ingress._app.processed == [1]
+
+
+async def test_webhook_sheds_when_backlog_full(served):
+    ingress = _ingress(max_pending=1)
+    ingress._app.gate.clear()
+    client = await served(make_web_app(ingress, _WEBHOOK))
+
+    async def deliver(update_id):
+        update = _UPDATE | {"update_id": update_id}
+        return await client.post(
+            "/telegram", json=update, headers={SECRET_HEADER: "s3cret"}
+        )
+
+    assert (await deliver(1)).status_code == 200  # answered while it waits
+    assert (await deliver(2)).status_code == 503
+    ingress._app.gate.set()
+    await asyncio.gather(*ingress._app.tasks)
+    assert (await deliver(2)).status_code == 200  # Telegram's redelivery
+    await asyncio.gather(*ingress._app.tasks)
+    assert ingress._app.processed == [1, 2]
+
+
+async def test_webhook_rejects_garbage(served):
+    client = await served(make_web_app(_ingress(), _WEBHOOK))
+    resp = await client.post(
+        "/telegram", content=b"{nope", headers={SECRET_HEADER: "s3cret"}
+    )
+    assert resp.status_code == 400
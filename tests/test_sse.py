@@ -0,0 +1,22 @@
+from bot.sse import ServerEvent, parse_events
+
+
+async def _parse(text):
+    async def lines():
+        for line in text.split("\n"):
+            yield line
+
+    return [event async for event in parse_events(lines())]
+
+
+async def test_events_split_on_blank_lines():
+    text = "id: 1\ndata: {\"a\": 1}\n\nevent: ping\ndata:x\ndata: y\n\n"
+    assert await _parse(text) == [
+        ServerEvent('{"a": 1}', id="1"),
+        ServerEvent("x\ny", event="ping", id="1"),  # the id persists
+    ]
+
+
+async def test_comments_and_empty_events_are_skipped():
+    text = ": keep-alive\n\nid: 2\n\nretry: 500\ndata: z\n\ndata: cut off"
+    assert await _parse(text) == [ServerEvent("z", id="2")]
@@ -1,6 +1,22 @@
+import sys
+from datetime import UTC, datetime
+
 import pytest
 
-from bot.stacks import Container, StackStatus, compute_status, parse_stacks
+from bot.stacks import (
+    Container,
+    ContainerEvent,
+    ContainerStats,
+    Stack,
+    StackStatus,
+    apply_container_event,
+    compute_status,
+    parse_container_event,
+    parse_container_stats,
+    parse_stack_entry,
+    parse_stack_index,
+    parse_stacks,
+)
 
 
 def test_all_running():
@@ -47,7 +63,8 @@ def test_parse_filters_and_orders_by_allowlist():
     assert [s.name for s in stacks] == ["vpn", "media"]
     assert stacks[0].status is StackStatus.STOPPED
     assert stacks[1].status is StackStatus.RUNNING
-    assert stacks[1].containers == (Container("media-jellyfin-1", "running"),)
+    jellyfin = Container("media-jellyfin-1", "running", "7a06218096")
+    assert stacks[1].containers == (jellyfin,)
 
 
 def test_parse_skips_allowed_stack_missing_from_api():
@@ -92,3 +109,122 @@ def test_parse_reads_partial_state_from_container_details():
         "media-jellyfin-1",
         "media-sonarr-1",
     ]
+
+
+def test_index_keyed_by_name_in_allowlist_order():
+    index = parse_stack_index(PAYLOAD, ["vpn", "media", "nope"])
+    assert list(index) == ["vpn", "media"]
+    jellyfin = Container("media-jellyfin-1", "running", "7a06218096")
+    assert index["media"].containers == (jellyfin,)
+
+
+# Docker Engine payloads as Dockhand relays them (trimmed).
+INSPECT = {
+    "RestartCount": 2,
+    "State": {
+        "Running": True,
+        "StartedAt": "2026-10-18T10:00:00.123456789Z",
+        "Health": {"Status": "healthy"},
+    },
+}
+STATS = {
+    "cpu_stats": {
+        "cpu_usage": {"total_usage": 2_000_000},
+        "system_cpu_usage": 110_000_000,
+        "online_cpus": 4,
+    },
+    "precpu_stats": {
+        "cpu_usage": {"total_usage": 1_000_000},
+        "system_cpu_usage": 100_000_000,
+    },
+    "memory_stats": {
+        "usage": 300 * 2**20,
+        "limit": 2 * 2**30,
+        "stats": {"inactive_file": 100 * 2**20},
+    },
+}
+
+
+def test_parse_container_stats():
+    stats = parse_container_stats(INSPECT, STATS)
+    assert stats.cpu_percent == 40.0  # 10% of the host's time on 4 CPUs
+    assert stats.memory_used == 200 * 2**20  # page cache left out
+    assert stats.memory_limit == 2 * 2**30
+    assert stats.restarts == 2
+    assert stats.health == "healthy"
+    started = datetime(2026, 10, 18, 10, 0, 0, 123456, tzinfo=UTC)
+    assert stats.started_at == started.timestamp()
+
+
+def test_parse_stopped_container_stats():
+    inspect = {
+        "RestartCount": 0,
+        "State": {"Running": False, "StartedAt": "0001-01-01T00:00:00Z"},
+    }
+    assert parse_container_stats(inspect, None) == ContainerStats(restarts=0)
+
+
+def test_parse_container_stats_tolerates_odd_payloads():
+    assert parse_container_stats({"State": "x", "RestartCount": "2"}, {}) == (
+        ContainerStats()
+    )
+    with pytest.raises(ValueError):
+        parse_container_stats([], None)
+
+
+def test_container_states_interned():
+    state = "".join(["run", "ning"])  # built at runtime, so not interned
+    entry = {"name": "s", "containerDetails": [{"name": "a", "state": state}]}
+    assert parse_stack_entry(entry).containers[0].state is sys.intern("running")
+
+
+def _docker_event(action, name="media-app-1", project="media"):
+    attributes = {"name": name}
+    if project is not None:
+        attributes["com.docker.compose.project"] = project
+    return {
+        "Type": "container",
+        "Action": action,
+        "Actor": {"ID": "0123456789abcdef", "Attributes": attributes},
+    }
+
+
+def test_parse_container_event():
+    assert parse_container_event(_docker_event("die")) == ContainerEvent(
+        "media", "0123456789abcdef", "media-app-1", "exited"
+    )
+    destroyed = parse_container_event(_docker_event("destroy"))
+    assert destroyed is not None and destroyed.state is None
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        _docker_event("start", project=None),  # not compose-managed
+        _docker_event("health_status: healthy"),
+        {"Type": "network", "Action": "connect"},
+        {"Type": "container", "Action": "start", "Actor": None},
+        "junk",
+    ],
+)
+def test_parse_container_event_ignores(payload):
+    assert parse_container_event(payload) is None
+
+
+def test_apply_container_event():
+    app = Container("media-app-1", "running", "0123456789ab")
+    stack = Stack("media", StackStatus.RUNNING, (app, Container("db", "running")))
+    # matched by (short) id, then by name; unknown containers are added
+    stopped = apply_container_event(
+        stack, ContainerEvent("media", "0123456789abcdef", "renamed", "exited")
+    )
+    assert stopped.status is StackStatus.PARTIAL
+    assert stopped.containers[0] == Container("media-app-1", "exited", "0123456789ab")
+    db = apply_container_event(stopped, ContainerEvent("media", "ff", "db", "exited"))
+    assert db.containers[1] == Container("db", "exited", "ff")
+    assert db.status is StackStatus.STOPPED
+    added = apply_container_event(db, ContainerEvent("media", "ee", "new", "running"))
+    assert added.containers[-1] == Container("new", "running", "ee")
+    gone = apply_container_event(added, ContainerEvent("media", "ee", "new", None))
+    assert gone == db
+    assert apply_container_event(db, ContainerEvent("media", "x", "y", None)) is db
@@ -0,0 +1,56 @@
+import io
+
+import httpx
+
+from bot.startup import ImportTime, check_config, format_profile, parse_importtime
+
+_IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      3000 |       3500 |     telegram._bot
+import time:      1000 |       4500 |   telegram
+import time:       500 |       5120 | bot.app
+"""
+
+
+def test_parse_importtime():
+    assert parse_importtime(_IMPORTTIME + "some warning\n") == [
+        ImportTime("_io", 120, 120),
+        ImportTime("telegram._bot", 3000, 3500),
+        ImportTime("telegram", 1000, 4500),
+        ImportTime("bot.app", 500, 5120),
+    ]
+
+
+def test_format_profile_totals_packages():
+    report = format_profile(parse_importtime(_IMPORTTIME), "bot.app", top=2)
+    lines = report.splitlines()
+    assert lines[0] == "import bot.app: 4.6 ms, 4 modules"
+    assert "       4.0 ms  telegram" in lines
+    assert lines[-2:] == ["       5.1 ms  bot.app", "       4.5 ms  telegram"]
+
+
+async def _check(config, handle):
+    out = io.StringIO()
+    ok = await check_config(config, out=out, transport=httpx.MockTransport(handle))
+    return ok, out.getvalue().splitlines()
+
+
+async def test_check_config_reports_missing_stacks(config):
+    ok, lines = await _check(
+        config, lambda request: httpx.Response(200, json=[{"name": "media"}])
+    )
+    assert ok
+    assert lines == [
+        "config: ok, 2 chat(s), 2 stack(s) in 1 env(s)",
+        "env 1: reachable, 1 stack(s); not in Dockhand: vpn",
+    ]
+
+
+async def test_check_config_fails_on_empty_env_or_error(config):
+    ok, lines = await _check(config, lambda request: httpx.Response(200, json=[]))
+    assert not ok
+    assert lines[-1] == "env 1: no stacks (is DOCKHAND_ENV right?)"
+    ok, lines = await _check(config, lambda request: httpx.Response(401))
+    assert not ok
+    assert lines[-1] == "env 1: Dockhand rejected the API token (401)"
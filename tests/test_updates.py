@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+from bot.auth import make_auth_gate
+from bot.updates import ChatOrderedProcessor, update_key
+
+
+class _BotAPI(BaseRequest):
+    """Just enough Bot API for Application.initialize()."""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        me = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+        return 200, json.dumps({"ok": True, "result": me}).encode()
+
+
+def _message(update_id, chat_id):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "/docker",
+            },
+        },
+        None,
+    )
+
+
+def _inline_tap(update_id, inline_message_id):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": {"id": 1, "is_bot": False, "first_name": "a"},
+                "chat_instance": "ci",
+                "inline_message_id": inline_message_id,
+                "data": "x",
+            },
+        },
+        None,
+    )
+
+
+def test_update_key():
+    assert update_key(_message(1, 111)) == 111
+    assert update_key(_inline_tap(2, "im1")) == "im1"
+    assert update_key(Update(3)) is None
+    assert update_key(object()) is None
+
+
+async def _step(log, label, gate=None, delay=0.0):
+    log.append(("start", label))
+    if gate is not None:
+        await gate.wait()
+    await asyncio.sleep(delay)
+    log.append(("end", label))
+
+
+async def test_same_chat_runs_in_arrival_order():
+    processor = ChatOrderedProcessor(workers=4)
+    log = []
+    first_may_finish = asyncio.Event()
+    tasks = [
+        asyncio.create_task(
+            processor.process_update(_message(1, 111), _step(log, 1, first_may_finish))
+        ),
+        asyncio.create_task(processor.process_update(_message(2, 111), _step(log, 2))),
+    ]
+    await asyncio.sleep(0.01)
+    assert log == [("start", 1)]  # 2 waits although workers are free
+    first_may_finish.set()
+    await asyncio.gather(*tasks)
+    assert log == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert processor._chats == {}  # idle chats are forgotten
+
+
+async def test_other_chats_run_while_one_is_busy():
+    processor = ChatOrderedProcessor(workers=2)
+    log = []
+    stuck = asyncio.Event()
+    busy = asyncio.create_task(
+        processor.process_update(_message(1, 111), _step(log, "slow", stuck))
+    )
+    # A burst in the busy chat waits for its lock without taking workers...
+    queued = [
+        asyncio.create_task(
+            processor.process_update(_message(i, 111), _step(log, f"queued{i}"))
+        )
+        for i in range(2, 6)
+    ]
+    await asyncio.sleep(0.01)
+    assert processor.running == 1
+    assert processor.waiting() == 4
+    # ...so another chat still gets the second one.
+    await asyncio.wait_for(
+        processor.process_update(_message(9, -222), _step(log, "other")), 1
+    )
+    assert ("end", "other") in log
+    stuck.set()
+    await asyncio.gather(busy, *queued)
+    order = [label for event, label in log if event == "start" and label != "other"]
+    assert order == ["slow", "queued2", "queued3", "queued4", "queued5"]
+
+
+async def test_workers_bound_parallelism():
+    processor = ChatOrderedProcessor(workers=2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        peak = max(peak, processor.running)
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(
+        *(processor.process_update(_message(i, i), work()) for i in range(6))
+    )
+    assert peak == 2
+
+
+async def test_auth_gate_still_runs_first():
+    processor = ChatOrderedProcessor(workers=4)
+    app = (
+        Application.builder()
+        .token("1:a")
+        .request(_BotAPI())
+        .concurrent_updates(processor)
+        .build()
+    )
+    reached = []
+
+    async def handler(update, context):
+        reached.append(update.effective_chat.id)
+
+    app.add_handler(TypeHandler(Update, make_auth_gate(frozenset({111}))), group=-1)
+    app.add_handler(TypeHandler(Update, handler))
+    updates = [_message(1, 999), _message(2, 111), _message(3, 999)]
+    async with app:
+        await asyncio.gather(
+            *(processor.process_update(u, app.process_update(u)) for u in updates)
+        )
+    assert reached == [111]
@@ -0,0 +1,119 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from bot.stacks import Container, Stack, StackStatus
+from bot.watcher import StatusWatcher, _shown, render_changes
+
+RUNNING = Stack("media", StackStatus.RUNNING, (Container("media-db-1", "running"),))
+PARTIAL = Stack(
+    "media",
+    StackStatus.PARTIAL,
+    (Container("media-db-1", "exited"), Container("media-app-1", "running")),
+)
+VPN = Stack("vpn", StackStatus.STOPPED)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _watcher(debounce=0.0):
+    clock = Clock()
+    return StatusWatcher(AsyncMock(), [111, -222], debounce, clock), clock
+
+
+def test_first_snapshot_is_baseline():
+    watcher, _ = _watcher()
+    assert watcher.diff({"media": RUNNING}) == []
+    assert watcher.diff({"media": RUNNING}) == []
+
+
+def test_change_reported_once():
+    watcher, _ = _watcher()
+    watcher.diff({"media": RUNNING, "vpn": VPN})
+    assert watcher.diff({"media": PARTIAL, "vpn": VPN}) == [(RUNNING, PARTIAL)]
+    assert watcher.diff({"media": PARTIAL, "vpn": VPN}) == []
+
+
+def test_change_must_hold_for_debounce():
+    watcher, clock = _watcher(debounce=60)
+    watcher.diff({"media": RUNNING})
+    assert watcher.diff({"media": PARTIAL}) == []
+    clock.now = 59
+    assert watcher.diff({"media": PARTIAL}) == []
+    clock.now = 60
+    assert watcher.diff({"media": PARTIAL}) == [(RUNNING, PARTIAL)]
+
+
+def test_flapping_back_is_never_reported():
+    watcher, clock = _watcher(debounce=60)
+    watcher.diff({"media": RUNNING})
+    for t in range(0, 600, 30):
+        clock.now = t
+        assert watcher.diff({"media": PARTIAL if t % 60 else RUNNING}) == []
+
+
+def test_vanished_and_reappeared_stack():
+    watcher, _ = _watcher()
+    watcher.diff({"media": RUNNING})
+    assert watcher.diff({}) == [(RUNNING, None)]
+    assert watcher.diff({}) == []
+    assert watcher.diff({"media": RUNNING}) == [(None, RUNNING)]
+
+
+def test_render_lists_stack_and_container_flips():
+    text = render_changes([(RUNNING, PARTIAL), (VPN, None)])
+    assert "🟡 <b>media</b>: running → partially running" in text
+    assert "<code>media-db-1</code>: running → exited" in text
+    assert "media-app-1" not in text  # new container, nothing flipped
+    assert "<b>vpn</b>: no longer in Dockhand" in text
+
+
+def test_recreated_containers_are_no_change():
+    watcher, _ = _watcher()
+    before = Stack(
+        "media", StackStatus.RUNNING, (Container("media-db-1", "running", "aaa"),)
+    )
+    watcher.diff({"media": before})
+    recreated = Stack(
+        "media", StackStatus.RUNNING, (Container("media-db-1", "running", "bbb"),)
+    )
+    assert watcher.diff({"media": recreated}) == []
+    scaled = Stack(
+        "media",
+        StackStatus.RUNNING,
+        (*recreated.containers, Container("media-db-2", "running", "ccc")),
+    )
+    # counted as a change, but with nothing to show no message goes out
+    assert render_changes(watcher.diff({"media": scaled})) == ""
+
+
+def test_unchanged_stacks_skip_the_shown_state(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        "bot.watcher._shown", lambda stack: calls.append(stack) or _shown(stack)
+    )
+    watcher, _ = _watcher()
+    watcher.diff({"media": RUNNING, "vpn": VPN})
+    calls.clear()
+    copy = Stack("vpn", StackStatus.STOPPED)  # equal, not the same object
+    watcher.diff({"media": PARTIAL, "vpn": copy})
+    assert calls == [PARTIAL]
+
+
+async def test_one_batched_message_per_chat():
+    bot = AsyncMock()
+    watcher = StatusWatcher(bot, [111, -222], 0)
+    watcher.observe({"media": RUNNING, "vpn": VPN})
+    watcher.observe({"media": PARTIAL, "vpn": Stack("vpn", StackStatus.RUNNING)})
+    async with asyncio.timeout(1):
+        while bot.send_message.await_count < 2:
+            await asyncio.sleep(0)
+    sent = bot.send_message.await_args_list
+    assert [c.args[0] for c in sent] == [111, -222]
+    assert "media" in sent[0].args[1]
+    assert "vpn" in sent[0].args[1]